@@ -1,21 +1,143 @@
-from fastapi import FastAPI
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
+from config import REQUEST_DEADLINE, WARMUP_ON_STARTUP
 from rag import qa_chain
+from rag.deadline import Deadline
+from rag.index_manager import index_manager
+from rag.query_log import log_query
+from rag.tracing import profile_call
+from rag.warmup import WarmupState
+from vector_store.ingest import ingest_jobs
 
-app = FastAPI(title="Building Code RAG API")
+# 缓存预热状态（完成前/ready返回503）
+warmup_state = WarmupState()
+
+@asynccontextmanager
+async def lifespan(app):
+    # 启动时加载当前版本索引及chunk向量内存矩阵（MMR使用），避免首个请求承担加载耗时
+    index_manager.current().embedding_matrix.get()
+    # 后台回放高频历史问题和示例问题预热缓存；索引切换后回答缓存清空，重新预热
+    if WARMUP_ON_STARTUP:
+        warmup_state.start()
+        index_manager.add_swap_listener(lambda old_version, new_version: warmup_state.start())
+    else:
+        warmup_state.ready.set()
+    # 后台监听版本指针，新版本发布后在请求之间热切换
+    index_manager.start_watcher()
+    yield
+    index_manager.stop_watcher()
+
+app = FastAPI(title="Building Code RAG API", lifespan=lifespan)
 
 class QuestionRequest(BaseModel):
     question: str
+    debug: bool = False  # 返回检索/生成各阶段的调试信息
+    profile: bool = False  # 额外返回cProfile统计摘要（隐含debug）
+    retrieve_mode: Optional[str] = None  # 检索模式：single / multi（默认使用配置）
+    mmr: Optional[bool] = None  # 是否启用MMR去冗余重排（默认使用配置）
+    mmr_lambda: Optional[float] = None  # MMR相关度权重（默认使用配置）
+    full_tables: Optional[bool] = None  # 命中表格行时是否返回完整表格（默认只返回命中的行）
+    routing: Optional[bool] = None  # 是否先按规范/章质心路由后再检索（默认使用配置）
+    deadline_ms: Optional[int] = None  # 端到端延迟预算（毫秒，默认使用配置REQUEST_DEADLINE）
 
 class QuestionResponse(BaseModel):
     answer: str
     references: list
+    degradations: list = []  # 因延迟预算不足而采取的降级措施（按发生顺序）
+    trace: Optional[dict] = None
+
+def _retrieve_options(request):
+    """请求中按次覆盖的检索参数（None表示使用配置中的默认值）"""
+    return {
+        "mode": request.retrieve_mode,
+        "mmr": request.mmr,
+        "mmr_lambda": request.mmr_lambda,
+        "full_tables": request.full_tables,
+        "routing": request.routing
+    }
+
+class SpecUploadRequest(BaseModel):
+    spec_name: str  # 规范全称，如 GB50016_2014_建筑设计防火规范
+    spec_abbr: str  # 规范缩写（小写字母/数字/下划线），用作chunk_id前缀
+    content: str  # 规范原始文本（与data/raw_docs中的格式一致）
+    chapter_titles: Optional[Dict[str, str]] = None  # 章标题映射，如 {"5": "===== 第5章 民用建筑 ====="}
 
 @app.post("/ask", response_model=QuestionResponse)
 def ask_question(request: QuestionRequest):
-    answer, docs = qa_chain(request.question)
+    start = time.perf_counter()
+    try:
+        result = _answer(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    log_query(
+        request.question,
+        _retrieve_options(request),
+        round((time.perf_counter() - start) * 1000, 2),
+        result["degradations"],
+        len(result["references"])
+    )
+    return result
+
+@app.get("/health")
+def health():
+    """存活检查"""
+    return {"status": "ok"}
+
+@app.get("/ready")
+def ready():
+    """就绪检查：缓存预热完成前返回503，负载均衡据此在预热完成后再转发流量"""
+    if not warmup_state.ready.is_set():
+        raise HTTPException(status_code=503, detail="缓存预热中")
+    return {"status": "ready", "index_version": index_manager.current().version, "warmup": warmup_state.last_summary}
+
+def _answer(request):
+    options = _retrieve_options(request)
+    budget = request.deadline_ms / 1000 if request.deadline_ms is not None else REQUEST_DEADLINE
+    deadline = Deadline(budget)
+    if not (request.debug or request.profile):
+        answer, docs = qa_chain(request.question, deadline=deadline, **options)
+        return {
+            "answer": answer,
+            "references": docs,
+            "degradations": deadline.degradations
+        }
+
+    trace = {}
+    start = time.perf_counter()
+    if request.profile:
+        (answer, docs), trace["profile"] = profile_call(
+            qa_chain, request.question, trace, deadline=deadline, **options
+        )
+    else:
+        answer, docs = qa_chain(request.question, trace, deadline=deadline, **options)
+    trace["total_ms"] = round((time.perf_counter() - start) * 1000, 2)
 
     return {
         "answer": answer,
-        "references": docs
-    }
\ No newline at end of file
+        "references": docs,
+        "degradations": deadline.degradations,
+        "trace": trace
+    }
+
+@app.post("/specs", status_code=202)
+def upload_spec(request: SpecUploadRequest):
+    """提交规范入库后台任务（clean → chunk → sanitize → embed → upsert），立即返回任务状态"""
+    try:
+        return ingest_jobs.submit(request.spec_name, request.spec_abbr, request.content, request.chapter_titles)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/specs/jobs")
+def list_spec_jobs():
+    return ingest_jobs.list_jobs()
+
+@app.get("/specs/jobs/{job_id}")
+def get_spec_job(job_id: str):
+    """任务状态：当前阶段、各阶段状态与耗时（毫秒）、embedding进度、生成的索引版本"""
+    job = ingest_jobs.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在：{job_id}")
+    return job
@@ -1,28 +1,96 @@
+import time
 import streamlit as st
-from rag import qa_chain
+from config import APP_ANSWER_CACHE_TTL, APP_HISTORY_MAX_ITEMS
+from rag.index_manager import index_manager
+
+# ========================= 资源与回答缓存 =========================
+@st.cache_resource(show_spinner="正在加载向量库...")
+def load_rag():
+    """每个进程只初始化一次：检索索引、DashScope配置和chunk向量内存矩阵；并监听索引版本热切换"""
+    import rag
+    index_manager.current().embedding_matrix.get()
+    # 索引切换后旧版本的回答全部失效
+    index_manager.add_swap_listener(lambda old_version, new_version: cached_qa.clear())
+    index_manager.start_watcher()
+    return rag
+
+@st.cache_data(ttl=APP_ANSWER_CACHE_TTL, show_spinner=False)
+def cached_qa(normalized_question, index_version, _question):
+    """
+    按（归一化问题, 索引版本）缓存回答（TTL过期后重新计算），同时返回首次计算时的各阶段耗时和计算时间
+    _question为用户输入的原文（不参与缓存key），用于检索和生成
+    """
+    trace = {}
+    answer, docs = load_rag().qa_chain(_question, trace)
+    return answer, docs, trace.get("timings", {}), time.time()
+
+def render_references(docs):
+    for item in docs:
+        st.write(
+            f"""
+            **📘 规范名称：** {item['spec_name']}  
+            **📌 条文编号：** {item['article_id']}  
+            **📊 相似度：** {item['similarity']:.2%}
+            """
+        )
+
+def render_timings(record):
+    with st.expander(f"⏱️ 耗时：{record['elapsed_ms']:.0f} ms" + ("（缓存命中）" if record["cached"] else "")):
+        st.caption("首次计算各阶段耗时（毫秒）：")
+        st.json(record["timings"])
+
+rag = load_rag()
+if "history" not in st.session_state:
+    st.session_state.history = []
 
 # ========================= 页面UI（核心逻辑完全不变） =========================
 st.title("📘 建筑规范智能问答系统")
 
 question = st.text_input("请输入问题：")
+answered = False
 
 if st.button("查询"):
     if not question:
         st.warning("请输入问题")
     else:
         with st.spinner("正在检索与生成回答..."):
-            # 调用封装后的RAG主流程
-            answer, docs = qa_chain(question)
+            # 调用封装后的RAG主流程（归一化后相同的问题直接命中缓存）
+            requested_at = time.time()
+            start = time.perf_counter()
+            answer, docs, timings, computed_at = cached_qa(
+                rag.normalize_question(question), index_manager.current().version, question
+            )
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            rag.log_query(question, latency_ms=round(elapsed_ms, 2), reference_count=len(docs))
+
+            record = {
+                "question": question,
+                "answer": answer,
+                "docs": docs,
+                "timings": timings,
+                "elapsed_ms": elapsed_ms,
+                # 计算时间早于本次请求，说明命中缓存
+                "cached": computed_at < requested_at
+            }
+            st.session_state.history.insert(0, record)
+            del st.session_state.history[APP_HISTORY_MAX_ITEMS:]
             
             st.subheader("📌 回答")
             st.write(answer)
 
             st.subheader("📚 参考条文")
-            for item in docs:
-                st.write(
-                    f"""
-                    **📘 规范名称：** {item['spec_name']}  
-                    **📌 条文编号：** {item['article_id']}  
-                    **📊 相似度：** {item['similarity']:.2%}
-                    """
-                )
\ No newline at end of file
+            render_references(docs)
+            render_timings(record)
+            answered = True
+
+# ========================= 会话历史（仅展示，不触发重新计算） =========================
+# 本轮刚回答的问题已在上方展示，历史中不再重复
+past_records = st.session_state.history[1:] if answered else st.session_state.history
+if past_records:
+    st.divider()
+    st.subheader("🕘 本次会话历史")
+    for record in past_records:
+        with st.expander(record["question"]):
+            st.write(record["answer"])
+            render_references(record["docs"])
+            st.caption(f"耗时：{record['elapsed_ms']:.0f} ms" + ("（缓存命中）" if record["cached"] else ""))
@@ -0,0 +1,45 @@
+"""
+公共工具函数：只依赖标准库，不导入rag/vector_store
+（rag包导入时会加载DashScope SDK，压测工具和模拟DashScope服务需在只有标准库的环境中单独运行）
+"""
+import math
+import re
+import unicodedata
+
+# 检索词：连续的中文按字二元组切分，字母数字串（条文编号、规范编号等）整体作为一个词
+CJK_PATTERN = re.compile(r'[一-鿿]+')
+ALNUM_PATTERN = re.compile(r'[A-Za-z0-9.]+')
+
+# 零宽字符（复制粘贴的问题中常见，如examples.md中的问题末尾）
+ZERO_WIDTH_PATTERN = re.compile(r'[\u200b\u200c\u200d\ufeff]')
+# 句末标点（不影响问题语义）
+TRAILING_PUNCT_PATTERN = re.compile(r'[\s?？。!！.]+$')
+
+def tokenize(text):
+    """将文本切分为检索词集合（无需分词词典，适合规范条文的关键词匹配）"""
+    terms = set()
+    for run in CJK_PATTERN.findall(text):
+        if len(run) == 1:
+            terms.add(run)
+        terms.update(run[i:i + 2] for i in range(len(run) - 1))
+    terms.update(token.lower() for token in ALNUM_PATTERN.findall(text) if token.strip("."))
+    return terms
+
+def normalize_question(question):
+    """
+    问题归一化：全角转半角（NFKC）、去除零宽字符、合并空白、去除句末标点
+    用于判断两个问题是否“归一化后相同”
+    """
+    text = unicodedata.normalize("NFKC", question or "")
+    text = ZERO_WIDTH_PATTERN.sub("", text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    text = TRAILING_PUNCT_PATTERN.sub("", text)
+    return text
+
+def percentile(values, pct):
+    """最近秩法计算百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
@@ -1,6 +1,4 @@
 import os
-import chromadb
-from chromadb.config import Settings
 
 # ========================= 路径配置 =========================
 # 项目根路径（自动获取，避免绝对路径）
@@ -25,8 +23,10 @@ CHAPTER_TITLES = {
 
 # 文本切分配置
 MAX_CHUNK_LENGTH = 400  # 每个chunk最大字符数
-# CHUNKS_OUTPUT_JSON = os.path.join(PROJECT_ROOT, "data", "chunks.json")  # 切分后输出文件
-# CHUNKS_CLEANED_JSON = os.path.join(PROJECT_ROOT, "data", "chunks_cleaned.json")  # 清洗后chunk文件
+TABLE_ROW_CHUNKING = True  # 表格按行分组切分（每组重复表号、标题和表头），关闭时按普通文本切分
+TABLE_MAX_ROWS_PER_CHUNK = 3  # 每个表格chunk最多包含的数据行数
+CHUNKS_OUTPUT_JSON = os.path.join(PROJECT_ROOT, "data", "chunks.json")  # 切分后输出文件
+CHUNKS_CLEANED_JSON = os.path.join(PROJECT_ROOT, "data", "chunks_cleaned.json")  # 清洗后chunk文件
 CHUNKS_JSON_PATH = os.path.join(PROJECT_ROOT, "data", "chunks.json")
 CHROMA_DB_PATH = os.path.join(PROJECT_ROOT, "vector_store", "chroma_db_new")  # 用新目录名
 VECTOR_DB_LOG_PATH = os.path.join(PROJECT_ROOT, "vector_db.log")
@@ -56,6 +56,13 @@ SPEC_FILES = {
     )
 }
 
+# 通过/specs接口上传的规范：清洗后文本目录与登记表（格式同SPEC_FILES）
+PROCESSED_SPECS_DIR = os.path.join(PROJECT_ROOT, "data", "processed")
+INGESTED_SPECS_PATH = os.path.join(PROJECT_ROOT, "data", "ingested_specs.json")
+
+# 流水线各阶段的输入/配置哈希记录（python -m data_pipeline，输入未变化的阶段跳过）
+PIPELINE_STATE_PATH = os.path.join(PROJECT_ROOT, "data", "pipeline_state.json")
+
 # 清洗示例文件路径（替换原硬编码绝对路径）
 CLEAN_INPUT_FILE = os.path.join(PROJECT_ROOT, "data", "raw_docs", "GB50016_2014_建筑设计防火规范.txt")
 CLEAN_OUTPUT_FILE = os.path.join(PROJECT_ROOT, "data", "processed", "clean_text_example_GB50016_2014_建筑设计防火规范.txt")
@@ -67,23 +74,133 @@ EMBEDDING_DIMENSION = 1536  # 向量维度
 
 # ========================= Chroma配置 =========================
 CHROMA_COLLECTION_NAME = "chroma_collection_name"
-CHROMA_SETTINGS = Settings(
-    persist_directory=CHROMA_DB_PATH,  # 和CHROMA_DB_PATH完全一致
-    anonymized_telemetry=False,
-    allow_reset=True
-)
 CHROMA_COLLECTION_METADATA = {"hnsw:space": "cosine"}
 
+def __getattr__(name):
+    """CHROMA_SETTINGS按需创建：文本清洗/切分等阶段导入config时不加载chromadb"""
+    if name == "CHROMA_SETTINGS":
+        from chromadb.config import Settings
+        return Settings(
+            persist_directory=CHROMA_DB_PATH,  # 和CHROMA_DB_PATH完全一致
+            anonymized_telemetry=False,
+            allow_reset=True
+        )
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# ========================= 索引快照配置 =========================
+# 以RAG_开头的环境变量可覆盖对应的索引/日志/缓存路径（压测等场景将服务指向临时目录，不读写线上数据）
+INDEX_BACKEND = os.getenv("RAG_INDEX_BACKEND", "chroma")  # 检索索引后端：chroma（持久化目录）/ snapshot（mmap只读快照）
+SNAPSHOT_PATH = os.getenv("RAG_SNAPSHOT_PATH", os.path.join(PROJECT_ROOT, "vector_store", "snapshot"))  # 快照目录
+SNAPSHOT_VERIFY_ON_LOAD = False  # 加载快照时校验sha256（需读取全部文件；默认只在verify/import命令和切换版本时校验）
+
+# ========================= 索引版本配置 =========================
+INDEX_VERSIONS_PATH = os.getenv("RAG_INDEX_VERSIONS_PATH", os.path.join(PROJECT_ROOT, "vector_store", "versions"))  # 已发布的不可变索引版本
+ACTIVE_INDEX_POINTER = os.getenv("RAG_ACTIVE_INDEX_POINTER", os.path.join(PROJECT_ROOT, "vector_store", "ACTIVE.json"))  # 当前生效版本指针
+INDEX_WATCH_INTERVAL = 5  # worker检查版本指针的间隔（秒）
+INDEX_KEEP_VERSIONS = 3  # 清理时保留的最近版本数
+
+# ========================= 索引分片配置 =========================
+INDEX_SHARDED = os.getenv("RAG_INDEX_SHARDED", "false").lower() == "true"  # 按spec_abbr分片：每个规范一个独立集合/快照，可单独重建和加载
+SHARD_BACKEND = "snapshot"  # 分片存储：chroma（每个分片一个集合）/ snapshot（每个分片一个mmap快照）
+SHARDS_PATH = os.path.join(PROJECT_ROOT, "vector_store", "shards")  # 分片快照及分片登记表目录
+SHARD_QUERY_MAX_WORKERS = 8  # 查询时并行检索分片的线程数
+
+# ========================= 延迟预算配置 =========================
+REQUEST_DEADLINE = 20  # API单次问答的端到端延迟预算（秒），None表示不限制
+# 各阶段开始前剩余时间不足以下秒数时依次降级
+DEADLINE_MIN_EXPANSION = 12  # 跳过查询扩展
+DEADLINE_MIN_EMBEDDING = 2  # 不再调用embedding接口：使用缓存的问题向量检索，或退化为关键词检索
+DEADLINE_SHORT_CONTEXT = 8  # 缩短上下文：Prompt中只保留前DEADLINE_SHORT_CONTEXT_TOP_K条
+DEADLINE_SHORT_CONTEXT_TOP_K = 2
+DEADLINE_MIN_GENERATION = 3  # 不生成回答，只返回检索到的条文
+
 # ========================= 批量处理配置 =========================
 BATCH_SIZE = 100
 RETRY_MAX_ATTEMPTS = 3
 RETRY_WAIT_MULTIPLIER = 1
 RETRY_WAIT_MIN = 2
 RETRY_WAIT_MAX = 10
+EMBEDDING_BATCH_SIZE = 25  # 单次TextEmbedding调用的文本条数（text-embedding-v2上限25）
+
+# ========================= DashScope客户端配置 =========================
+DASHSCOPE_MAX_CONCURRENCY = 8  # 全局并发调用上限（所有模型共享）
+DASHSCOPE_POOL_SIZE = 8  # 每个线程的HTTP连接池大小
+DASHSCOPE_RATE_LIMITS = {  # 每个模型的令牌桶：(每秒请求数, 突发容量)，按账号配额调整
+    EMBEDDING_MODEL: (20, 20),
+    GENERATION_MODEL: (5, 10)
+}
+DASHSCOPE_DEFAULT_RATE_LIMIT = (5, 10)  # 未单独配置的模型
+DASHSCOPE_RETRYABLE_STATUS = {429, 500, 502, 503, 504}  # 可重试的HTTP状态码
+EMBEDDING_TIMEOUT = 10  # 嵌入调用超时（秒）
+GENERATION_TIMEOUT = 60  # 生成调用超时（秒）
+DASHSCOPE_HEDGE_ENABLED = False  # 对冲请求：调用超过近期延迟的分位数仍未返回时再发一份相同请求，先成功者为准
+DASHSCOPE_HEDGE_PERCENTILE = 95  # 对冲延迟取该模型近期成功调用延迟的分位数
+DASHSCOPE_HEDGE_MIN_DELAY = 0.2  # 对冲延迟下限（秒）
+DASHSCOPE_HEDGE_WINDOW = 200  # 每个模型保留的近期延迟样本数
+DASHSCOPE_HEDGE_MIN_SAMPLES = 20  # 样本不足时不对冲
+DASHSCOPE_HEDGE_BUDGET = 0.05  # 全局对冲预算：对冲请求数不超过调用数的该比例
+DASHSCOPE_HEDGE_BURST = 5  # 对冲预算的突发容量
 
 # ========================= RAG配置 =========================
 QUERY_EXPAND_TEMPERATURE = 0.3  # 查询扩展温度
+QUERY_EXPANSION_ENABLED = True  # 是否在embedding前进行查询扩展
 ANSWER_GENERATE_TEMPERATURE = 0.2  # 回答生成温度
+RETRIEVE_MODE = "single"  # 检索模式：single（扩展后单向量）/ multi（多子查询批量embedding + 融合排序）
+MULTI_QUERY_FUSION = "rrf"  # 多查询融合方式：rrf（倒数排名融合）/ max（最大相似度）
+RRF_K = 60  # RRF平滑常数
 RETRIEVE_N_RESULTS = 5  # 初始检索条数
 RETRIEVE_TOP_K = 3  # 最终返回条数
-SIMILARITY_THRESHOLD = 0.6  # 相似度阈值
\ No newline at end of file
+SIMILARITY_THRESHOLD = 0.6  # 相似度阈值
+MMR_ENABLED = False  # 是否启用MMR去冗余重排（可按请求覆盖）
+MMR_LAMBDA = 0.7  # MMR相关度权重（1为纯相关度，越小越强调多样性）
+MMR_FETCH_MULTIPLIER = 4  # 启用MMR时初始检索条数的放大倍数
+RETRIEVE_FULL_TABLES = False  # 命中表格行时是否还原为完整表格放入上下文（默认只保留命中的行）
+ROUTING_ENABLED = False  # 是否先按规范/章质心路由，只在选中章内检索（可按请求覆盖）
+ROUTING_TOP_SPECS = 2  # 路由选中的规范数
+ROUTING_TOP_CHAPTERS = 6  # 路由选中的章数（章内chunk不足初始检索条数时继续补充）
+QA_SINGLE_FLIGHT_ENABLED = True  # 合并归一化后相同的并发问答请求（共享一次上游调用）
+ANSWER_CACHE_ENABLED = True  # 按（归一化问题, 检索参数, 索引版本）缓存回答（降级的回答不缓存）
+ANSWER_CACHE_MAX_ITEMS = 1000  # 回答缓存最多条数（LRU淘汰）
+KEYWORD_CACHE_MAX_ITEMS = 10000  # 查询扩展关键词的进程内缓存最多条数（LRU淘汰）
+LLM_CACHE_ENABLED = True  # 查询扩展和回答生成调用按（模型, 温度, 完整Prompt）持久化缓存，重启后仍然有效
+LLM_CACHE_PATH = os.getenv("RAG_LLM_CACHE_PATH", os.path.join(PROJECT_ROOT, "data", "cache", "llm_cache.sqlite3"))  # 同一主机上的worker共享
+LLM_CACHE_MAX_ENTRIES = 20000  # LLM缓存最多条数（按最近使用时间淘汰）
+
+# ========================= 规范入库任务配置 =========================
+INGEST_MAX_WORKERS = 2  # 后台入库任务并发数
+INGEST_MAX_JOBS_KEPT = 100  # 内存中保留的任务记录数
+
+# ========================= 查询日志与缓存预热配置 =========================
+QUERY_LOG_ENABLED = True  # 记录问答请求（归一化问题、检索参数、耗时），用于预热和分析
+QUERY_LOG_PATH = os.getenv("RAG_QUERY_LOG_PATH", os.path.join(PROJECT_ROOT, "data", "logs", "query_log.jsonl"))
+QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024  # 查询日志超过该大小时轮转（query_log.jsonl → query_log.jsonl.1 …）
+QUERY_LOG_BACKUPS = 3  # 保留的轮转文件数（预热统计高频问题时一并读取）
+EXAMPLES_PATH = os.path.join(PROJECT_ROOT, "examples.md")  # 示例问题（每行一个），预热时一并回放
+WARMUP_ON_STARTUP = True  # API启动及索引切换后在后台预热缓存，完成前/ready返回503
+WARMUP_TOP_N = 50  # 回放查询日志中出现次数最多的前N个问题
+WARMUP_CONCURRENCY = 4  # 预热并发数（与线上请求共享DashScope限流和并发上限）
+
+# ========================= Streamlit UI配置 =========================
+APP_ANSWER_CACHE_TTL = 3600  # 回答缓存有效期（秒），按归一化问题缓存
+APP_HISTORY_MAX_ITEMS = 50  # 会话历史最多保留条数
+
+# ========================= 检索评估配置 =========================
+EVAL_DATASET_PATH = os.path.join(PROJECT_ROOT, "data", "eval", "golden_questions.json")  # 黄金问题集
+EVAL_REPORT_PATH = os.path.join(PROJECT_ROOT, "data", "eval", "sweep_report.json")  # 参数扫描报告
+EVAL_SWEEP_N_RESULTS = [5, 10, 20]  # 扫描的初始检索条数
+EVAL_SWEEP_TOP_K = [3, 5]  # 扫描的最终返回条数
+EVAL_SWEEP_THRESHOLDS = [0.5, 0.6, 0.7]  # 扫描的相似度阈值
+EVAL_SWEEP_EXPANSION = [True, False]  # 扫描查询扩展开/关
+EVAL_SWEEP_MODES = ["single", "multi"]  # 扫描检索模式
+EVAL_ROUTER_REPORT_PATH = os.path.join(PROJECT_ROOT, "data", "eval", "router_report.json")  # 质心路由评估报告
+EVAL_ROUTER_TOP_CHAPTERS = [1, 2, 4, 8]  # 评估的路由章数
+
+# ========================= 压测配置 =========================
+LOAD_TEST_REPORT_PATH = os.path.join(PROJECT_ROOT, "data", "eval", "load_report.json")  # 压测报告
+LOAD_TEST_CONCURRENCY = [1, 2, 4, 8, 16, 32]  # 逐级提升的并发数
+LOAD_TEST_STAGE_SECONDS = 20  # 每级并发持续时间（秒）
+LOAD_TEST_REQUEST_TIMEOUT = 60  # 单个请求超时（秒），超时计为错误
+# 模拟DashScope服务的延迟分布（秒）：const:固定值 / uniform:最小,最大 / lognormal:中位数,sigma / tail:常规,慢请求,慢请求比例
+FAKE_EMBEDDING_LATENCY = "lognormal:0.08,0.3"
+FAKE_GENERATION_LATENCY = "lognormal:1.2,0.4"
+FAKE_ERROR_RATE = 0.0  # 模拟服务返回429限流错误的比例
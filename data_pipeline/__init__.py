@@ -6,6 +6,7 @@ Data Pipeline 模块：数据清洗与拆分。
 from .clean_text import clean_text
 from .chunker import chunker
 from .metadata_builder import find_abnormal_unicode
+from .pipeline import run_pipeline
 
 # 明确对外暴露的接口
-__all__ = ["clean_text", "chunker", "find_abnormal_unicode"]
\ No newline at end of file
+__all__ = ["clean_text", "chunker", "find_abnormal_unicode", "run_pipeline"]
\ No newline at end of file
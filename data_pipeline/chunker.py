@@ -1,8 +1,13 @@
 import json
 import re
 import os
+import threading
 from collections import Counter
-from config import MAX_CHUNK_LENGTH, SPEC_FILES, CHUNKS_OUTPUT_JSON
+from config import MAX_CHUNK_LENGTH, SPEC_FILES, CHUNKS_OUTPUT_JSON, INGESTED_SPECS_PATH, TABLE_ROW_CHUNKING
+from .table_chunker import table_to_row_chunks
+
+# 同一进程内串行修改上传规范登记表
+_registry_lock = threading.Lock()
 
 def split_text_to_chunks(text, max_length=None):
     """
@@ -77,7 +82,7 @@ def parse_construction_code(file_path):
     
     # 正则表达式模式（仅匹配三位小数的条款ID）
     article_pattern = r'^(\d+\.\d+\.\d+[A-Z]?)'  
-    table_pattern = r'^===== 表格：表([\d\.]+)'      
+    table_pattern = r'^===== 表格：表([\d\.]+(?:-\d+)?)'  # 含分表后缀（如表5.5.20-1）
     note_pattern = r'^注：'                          
     
     for para in paragraphs:
@@ -149,8 +154,14 @@ def articles_to_chunks(articles_list, spec_name, spec_abbr, max_chunk_length=Non
             related_num = item['related_to']
             chapter = related_num.split('.')[0] if '.' in related_num else ""
         
-        # 切分文本为chunks
-        content_chunks = split_text_to_chunks(content, max_chunk_length)
+        # 切分文本为chunks（表格按行分组切分，每组重复表头；无法解析的表格按普通文本切分）
+        row_groups = None
+        if item_type == "table" and TABLE_ROW_CHUNKING:
+            row_groups = table_to_row_chunks(content, max_chunk_length)
+        if row_groups:
+            content_chunks = [group["content"] for group in row_groups]
+        else:
+            content_chunks = split_text_to_chunks(content, max_chunk_length)
         
         # 为每个chunk生成完整信息
         for idx, chunk_content in enumerate(content_chunks, 1):
@@ -171,18 +182,44 @@ def articles_to_chunks(articles_list, spec_name, spec_abbr, max_chunk_length=Non
             # 表格/注释补充related_to字段
             if item_type in ["table", "note"] and "related_to" in item:
                 chunk["related_to"] = item["related_to"]
+            # 表格行分组记录行号范围，用于还原完整表格
+            if row_groups:
+                chunk["row_start"] = row_groups[idx - 1]["row_start"]
+                chunk["row_end"] = row_groups[idx - 1]["row_end"]
             
             chunks_list.append(chunk)
     
     return chunks_list
 
+def load_ingested_specs(registry_path=None):
+    """读取通过/specs接口上传的规范登记表（格式同SPEC_FILES：{规范名: [文件路径, 规范缩写]}）"""
+    if registry_path is None:
+        registry_path = INGESTED_SPECS_PATH
+    if not os.path.exists(registry_path):
+        return {}
+    with open(registry_path, 'r', encoding='utf-8') as f:
+        return {name: tuple(entry) for name, entry in json.load(f).items()}
+
+def register_ingested_spec(spec_name, file_path, spec_abbr, registry_path=None):
+    """登记上传的规范，使后续批量处理（batch_process_specs）自动包含该规范"""
+    if registry_path is None:
+        registry_path = INGESTED_SPECS_PATH
+    # 读-改-写需串行；临时文件名按进程/线程区分，并发写入不会互相覆盖临时文件
+    with _registry_lock:
+        registry = load_ingested_specs(registry_path)
+        registry[spec_name] = (file_path, spec_abbr)
+        tmp_path = f"{registry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(registry, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, registry_path)
+
 def batch_process_specs(spec_files=None, max_chunk_length=None, output_file=None):
     """
     批量处理多份规范文件，生成统一的chunk列表并导出JSON
     """
-    # 使用配置中的默认值
+    # 使用配置中的默认值（含通过接口上传的规范）
     if spec_files is None:
-        spec_files = SPEC_FILES
+        spec_files = {**SPEC_FILES, **load_ingested_specs()}
     if max_chunk_length is None:
         max_chunk_length = MAX_CHUNK_LENGTH
     if output_file is None:
@@ -178,6 +178,12 @@ def add_chapter_titles(text, chapter_titles=None):
 
     return result
 
+def clean_spec_text(raw_content, chapter_titles=None):
+    """完整清洗流程：标准化 → 统一表格间距 → 添加章标题"""
+    standardized_content = standardize_construction_code(raw_content)
+    new_content = normalize_table_spacing(standardized_content)
+    return add_chapter_titles(new_content, chapter_titles)
+
 # 集成以上函数
 def clean_text():
     # 读取原始文件
@@ -185,9 +191,7 @@ def clean_text():
         raw_content = f.read()
 
     # 标准化处理
-    standardized_content = standardize_construction_code(raw_content)
-    new_content = normalize_table_spacing(standardized_content)
-    final_text = add_chapter_titles(new_content)
+    final_text = clean_spec_text(raw_content)
 
     # 保存结果
     with open(CLEAN_OUTPUT_FILE, 'w', encoding='utf-8') as f:
@@ -3,6 +3,20 @@ import json
 import re
 from config import CHUNKS_OUTPUT_JSON, CHUNKS_CLEANED_JSON
 
+# 优化正则：修复单双引号转义问题，补充常见符号
+ABNORMAL_UNICODE_PATTERN = r'[^\u4e00-\u9fa5a-zA-Z0-9\s。，；：！？"（）【】《》、·%@#￥&*+-=<>|—～_\.\-]'
+abnormal_re = re.compile(ABNORMAL_UNICODE_PATTERN)
+
+def sanitize_content(content):
+    """
+    清理单段文本中的异常unicode字符
+    :return: (清理后的文本, 发现的异常字符列表)
+    """
+    abnormal_chars = abnormal_re.findall(content)
+    if not abnormal_chars:
+        return content, []
+    return abnormal_re.sub("", content), abnormal_chars
+
 def find_abnormal_unicode(json_file_path=None, raw_data_path=None):
     """
     定位并清理JSON文件中的异常unicode字符
@@ -16,10 +30,6 @@ def find_abnormal_unicode(json_file_path=None, raw_data_path=None):
     if raw_data_path is None:
         raw_data_path = CHUNKS_OUTPUT_JSON
 
-    # 优化正则：修复单双引号转义问题，补充常见符号
-    abnormal_pattern = r'[^\u4e00-\u9fa5a-zA-Z0-9\s。，；：！？"（）【】《》、·%@#￥&*+-=<>|—～_\.\-]'
-    abnormal_re = re.compile(abnormal_pattern)
-
     # ========================
     # 步骤1：读取原始待清理数据（增强调试）
     # ========================
@@ -84,8 +94,8 @@ def find_abnormal_unicode(json_file_path=None, raw_data_path=None):
         chunk_id = chunk.get("chunk_id", f"第{idx+1}个chunk")
         content = str(chunk.get("content", ""))  # 确保是字符串
         
-        # 查找异常字符
-        abnormal_chars = abnormal_re.findall(content)
+        # 查找并清理异常字符
+        cleaned_content, abnormal_chars = sanitize_content(content)
         ablist.extend(abnormal_chars)  # 修复：用extend而不是append，避免嵌套列表
         
         if abnormal_chars:
@@ -94,12 +104,7 @@ def find_abnormal_unicode(json_file_path=None, raw_data_path=None):
             char_codes = [f"{c} (\\u{ord(c):04x})" for c in unique_chars]
             print(f"\n{chunk_id} 包含异常字符：{char_codes}")
             print(f"清理前内容片段：{content[:200]}...")
-            
-            # 清理异常字符（核心：移除所有匹配的异常字符）
-            cleaned_content = abnormal_re.sub("", content)
             print(f"清理后内容片段：{cleaned_content[:200]}...")
-        else:
-            cleaned_content = content  # 无异常字符，直接保留
         
         # 保存清理后的chunk
         cleaned_chunks.append({
@@ -0,0 +1,211 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from config import (
+    CLEAN_INPUT_FILE,
+    CLEAN_OUTPUT_FILE,
+    CHAPTER_TITLES,
+    SPEC_FILES,
+    MAX_CHUNK_LENGTH,
+    TABLE_ROW_CHUNKING,
+    TABLE_MAX_ROWS_PER_CHUNK,
+    CHUNKS_OUTPUT_JSON,
+    CHUNKS_CLEANED_JSON,
+    PIPELINE_STATE_PATH,
+    EMBEDDING_MODEL,
+    EMBEDDING_DIMENSION,
+    INDEX_SHARDED
+)
+from .clean_text import clean_text
+from .chunker import batch_process_specs, load_ingested_specs, validate_embedding_chunks, print_validate_report
+from .metadata_builder import find_abnormal_unicode
+
+# 各阶段代码所在文件（代码变更同样使阶段失效）
+PIPELINE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(PIPELINE_DIR)
+
+def _spec_files():
+    return {**SPEC_FILES, **load_ingested_specs()}
+
+def _run_index():
+    """构建向量库（仅在运行该阶段时才导入vector_store/DashScope等重依赖）"""
+    if INDEX_SHARDED:
+        from vector_store.shards import build_shards
+        build_shards()
+    else:
+        from vector_store.build_index import build_index
+        build_index()
+
+def _run_validate():
+    report = validate_embedding_chunks()
+    print_validate_report(report)
+    if report["error_count"]:
+        raise ValueError(f"chunk校验发现{report['error_count']}个错误")
+
+# 阶段DAG：deps为上游阶段，inputs/params/code决定阶段是否需要重跑，outputs为阶段产出的文件
+# index阶段调用embedding接口，只有显式指定时才运行
+STAGES = {
+    "clean": {
+        "deps": [],
+        "inputs": lambda: [CLEAN_INPUT_FILE],
+        "params": lambda: {"chapter_titles": CHAPTER_TITLES},
+        "code": ["data_pipeline/clean_text.py"],
+        "outputs": lambda: [CLEAN_OUTPUT_FILE],
+        "run": clean_text
+    },
+    "chunk": {
+        "deps": [],
+        "inputs": lambda: sorted(path for path, _ in _spec_files().values()),
+        "params": lambda: {
+            "spec_files": {name: abbr for name, (_, abbr) in _spec_files().items()},
+            "max_chunk_length": MAX_CHUNK_LENGTH,
+            "table_row_chunking": TABLE_ROW_CHUNKING,
+            "table_max_rows_per_chunk": TABLE_MAX_ROWS_PER_CHUNK
+        },
+        "code": ["data_pipeline/chunker.py", "data_pipeline/table_chunker.py"],
+        "outputs": lambda: [CHUNKS_OUTPUT_JSON],
+        "run": batch_process_specs
+    },
+    "sanitize": {
+        "deps": ["chunk"],
+        "inputs": lambda: [CHUNKS_OUTPUT_JSON],
+        "params": lambda: {},
+        "code": ["data_pipeline/metadata_builder.py"],
+        "outputs": lambda: [CHUNKS_CLEANED_JSON],
+        "run": find_abnormal_unicode
+    },
+    "validate": {
+        "deps": ["chunk"],
+        "inputs": lambda: [CHUNKS_OUTPUT_JSON],
+        "params": lambda: {"max_chunk_length": MAX_CHUNK_LENGTH},
+        "code": ["data_pipeline/chunker.py"],
+        "outputs": lambda: [],
+        "run": _run_validate
+    },
+    "index": {
+        "deps": ["sanitize", "validate"],
+        "inputs": lambda: [CHUNKS_OUTPUT_JSON, CHUNKS_CLEANED_JSON],
+        "params": lambda: {
+            "embedding_model": EMBEDDING_MODEL,
+            "embedding_dimension": EMBEDDING_DIMENSION,
+            "sharded": INDEX_SHARDED
+        },
+        "code": ["vector_store/build_index.py", "vector_store/shards.py"],
+        "outputs": lambda: [],
+        "run": _run_index
+    }
+}
+
+# 未指定阶段时运行的目标（不含index）
+DEFAULT_TARGETS = ["clean", "chunk", "sanitize", "validate"]
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def stage_fingerprint(name):
+    """阶段的输入指纹：输入文件内容 + 配置参数 + 代码文件内容（缺失的输入文件记为missing）"""
+    stage = STAGES[name]
+    digest = hashlib.sha256()
+    for path in stage["inputs"]():
+        digest.update(path.encode("utf-8"))
+        digest.update((_file_hash(path) if os.path.exists(path) else "missing").encode("utf-8"))
+    digest.update(json.dumps(stage["params"](), sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    for rel_path in stage["code"]:
+        digest.update(_file_hash(os.path.join(PROJECT_DIR, rel_path)).encode("utf-8"))
+    return digest.hexdigest()
+
+def load_state(state_path=None):
+    if state_path is None:
+        state_path = PIPELINE_STATE_PATH
+    if not os.path.exists(state_path):
+        return {}
+    with open(state_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _save_state(state, state_path=None):
+    if state_path is None:
+        state_path = PIPELINE_STATE_PATH
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, state_path)
+
+def is_up_to_date(name, state):
+    """输入指纹与上次运行一致，且产出文件存在且未被改动时，阶段无需重跑"""
+    record = state.get(name)
+    if not record or record["fingerprint"] != stage_fingerprint(name):
+        return False
+    for path, file_hash in record["outputs"].items():
+        if not os.path.exists(path) or _file_hash(path) != file_hash:
+            return False
+    return True
+
+def resolve_order(targets):
+    """按依赖关系展开目标阶段，返回拓扑序"""
+    order, visiting = [], set()
+
+    def visit(name):
+        if name not in STAGES:
+            raise ValueError(f"未知阶段：{name}（可选{list(STAGES)}）")
+        if name in order:
+            return
+        if name in visiting:
+            raise ValueError(f"阶段依赖存在环：{name}")
+        visiting.add(name)
+        for dep in STAGES[name]["deps"]:
+            visit(dep)
+        visiting.discard(name)
+        order.append(name)
+
+    for target in targets:
+        visit(target)
+    return order
+
+def run_pipeline(targets=None, force=False, dry_run=False, state_path=None):
+    """
+    按DAG运行目标阶段及其上游：输入未变化的阶段跳过；阶段运行失败时停止（已完成阶段的记录保留）
+    Returns:
+        dict: {阶段名: "ran" / "skipped" / "pending"（dry_run）}
+    """
+    state = load_state(state_path)
+    results = {}
+    for name in resolve_order(targets or DEFAULT_TARGETS):
+        if not force and is_up_to_date(name, state):
+            results[name] = "skipped"
+            print(f"[skip] {name}（输入未变化）")
+            continue
+        if dry_run:
+            results[name] = "pending"
+            print(f"[todo] {name}")
+            continue
+
+        print(f"[run]  {name}")
+        start = time.perf_counter()
+        STAGES[name]["run"]()
+        state[name] = {
+            "fingerprint": stage_fingerprint(name),
+            "outputs": {path: _file_hash(path) for path in STAGES[name]["outputs"]() if os.path.exists(path)},
+            "finished_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 2)
+        }
+        _save_state(state, state_path)
+        results[name] = "ran"
+        print(f"[done] {name}（耗时{state[name]['elapsed_ms']:.0f} ms）")
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m data_pipeline",
+        description="数据流水线：按阶段依赖运行，输入/配置/代码未变化的阶段自动跳过"
+    )
+    parser.add_argument("stages", nargs="*", help=f"目标阶段（默认{DEFAULT_TARGETS}；可选{list(STAGES)}）")
+    parser.add_argument("--force", action="store_true", help="忽略记录，重跑全部目标阶段")
+    parser.add_argument("--dry-run", action="store_true", help="只列出需要运行的阶段")
+    args = parser.parse_args(argv)
+    run_pipeline(args.stages, force=args.force, dry_run=args.dry_run)
@@ -0,0 +1,91 @@
+import re
+from config import MAX_CHUNK_LENGTH, TABLE_MAX_ROWS_PER_CHUNK
+
+# 表格块格式（standardize_construction_code保留的原始格式）：
+# ===== 表格：表5.1.2 标题 =====
+# 表头 | 表头 | ...
+# --- | --- | ...
+# [多级表头的第二行（首列与第一行表头相同）]
+# 数据行 | ... | ...
+TABLE_TITLE_PATTERN = re.compile(r'^===== 表格：表([\d\.]+(?:-\d+)?)\s*(.*?)\s*=====$')
+SEPARATOR_PATTERN = re.compile(r'^\s*-{3,}\s*(\|\s*-{3,}\s*)*$')
+
+def _split_row(line):
+    return [cell.strip() for cell in line.split('|')]
+
+def parse_table(content):
+    """
+    解析表格块
+    Returns:
+        dict: {"table_num", "title", "columns"（合并多级表头后的列名）, "rows"（数据行的单元格列表）}
+              不是可识别的表格格式时返回None
+    """
+    lines = [line.strip() for line in content.strip().split('\n') if line.strip()]
+    if not lines:
+        return None
+    title_match = TABLE_TITLE_PATTERN.match(lines[0])
+    if not title_match or len(lines) < 3 or not SEPARATOR_PATTERN.match(lines[2]):
+        return None
+
+    header_rows = [_split_row(lines[1])]
+    body = lines[3:]
+    # 多级表头：分隔线后首列与表头首列相同的行仍属于表头
+    while body and _split_row(body[0])[0] == header_rows[0][0]:
+        header_rows.append(_split_row(body.pop(0)))
+
+    columns = []
+    for col in range(len(header_rows[0])):
+        parts = [row[col] for row in header_rows if col < len(row) and row[col]]
+        columns.append("/".join(dict.fromkeys(parts)))
+
+    return {
+        "table_num": title_match.group(1),
+        "title": title_match.group(2),
+        "columns": columns,
+        "rows": [_split_row(line) for line in body]
+    }
+
+def _table_heading(table):
+    return f"表{table['table_num']} {table['title']}".strip() + "\n" + " | ".join(table["columns"])
+
+def table_to_row_chunks(content, max_length=None, max_rows=None):
+    """
+    将表格按行分组切分：每组重复表号、标题和表头，按行累加直到超过max_length或max_rows行
+    行是最小单位（单行超过max_length时单独成组，不截断）
+    Returns:
+        list: [{"content", "row_start", "row_end"}]（行号从1开始，含两端）；不是可识别的表格时返回None
+    """
+    if max_length is None:
+        max_length = MAX_CHUNK_LENGTH
+    if max_rows is None:
+        max_rows = TABLE_MAX_ROWS_PER_CHUNK
+
+    table = parse_table(content)
+    if table is None or not table["rows"]:
+        return None
+
+    heading = _table_heading(table)
+    groups, current, start = [], [], 1
+    for row_num, row in enumerate(table["rows"], 1):
+        line = " | ".join(row)
+        current_length = len(heading) + sum(len(l) + 1 for l in current)
+        if current and (len(current) >= max_rows or current_length + len(line) + 1 > max_length):
+            groups.append({"content": "\n".join([heading] + current), "row_start": start, "row_end": row_num - 1})
+            current, start = [], row_num
+        current.append(line)
+    groups.append({"content": "\n".join([heading] + current), "row_start": start, "row_end": len(table["rows"])})
+    return groups
+
+def reassemble_table(row_chunks):
+    """
+    由同一表格的行分组chunk还原完整表格（按row_start排序，表头只保留一份）
+    Args:
+        row_chunks: [{"content", "row_start"}]
+    """
+    ordered = sorted(row_chunks, key=lambda c: c["row_start"])
+    if not ordered:
+        return ""
+    title, header = ordered[0]["content"].split("\n")[:2]
+    rows = [line for chunk in ordered for line in chunk["content"].split("\n")[2:]]
+    separator = " | ".join(["---"] * len(header.split("|")))
+    return "\n".join([title, header, separator] + rows)
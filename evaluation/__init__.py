@@ -0,0 +1,21 @@
+# evaluation/__init__.py
+"""
+Evaluation 模块：检索效果评估与参数扫描、服务压测。
+"""
+import importlib
+
+# 对外暴露的接口及其所在子模块（按需导入：压测工具和模拟服务可在未配置DashScope的环境中单独运行）
+_EXPORTS = {
+    "load_golden_dataset": "retrieval_eval",
+    "run_parameter_sweep": "retrieval_eval",
+    "run_load_test": "load_test",
+    "FakeDashScopeServer": "fake_dashscope"
+}
+
+# 明确对外暴露的接口
+__all__ = list(_EXPORTS)
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
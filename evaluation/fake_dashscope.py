@@ -0,0 +1,162 @@
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import EMBEDDING_DIMENSION, FAKE_EMBEDDING_LATENCY, FAKE_GENERATION_LATENCY, FAKE_ERROR_RATE
+from common import tokenize
+
+# 模拟生成接口返回的回答
+FAKE_ANSWER = "根据检索到的规范条文，该问题的要求如下（压测模拟回答）。"
+
+# 模拟向量中每个检索词映射到的维度数
+FAKE_EMBEDDING_HASHES = 4
+
+class LatencyModel:
+    """
+    延迟分布（秒），由字符串描述：
+    const:0.05 / uniform:0.05,0.2 / lognormal:中位数,sigma / tail:常规延迟,慢请求延迟,慢请求比例
+    """
+    def __init__(self, spec):
+        kind, _, args = spec.partition(":")
+        self.spec = spec
+        self.kind = kind
+        self.args = [float(x) for x in args.split(",") if x]
+        expected_args = {"const": 1, "uniform": 2, "lognormal": 2, "tail": 3}
+        if expected_args.get(kind) != len(self.args):
+            raise ValueError(f"无法识别的延迟分布：{spec}（可选{list(expected_args)}）")
+
+    def sample(self):
+        if self.kind == "const":
+            return self.args[0]
+        if self.kind == "uniform":
+            return random.uniform(*self.args)
+        if self.kind == "lognormal":
+            median, sigma = self.args
+            return random.lognormvariate(math.log(median), sigma)
+        base, slow, ratio = self.args
+        return slow if random.random() < ratio else base
+
+def fake_embedding(text, dimension=None):
+    """
+    由文本的检索词（中文二元组、字母数字串）哈希生成确定性的向量：每个检索词固定映射到几个维度上的±1
+    共享检索词越多的两段文本余弦相似度越高，用同一函数生成向量的索引可以正常检索到相关条文
+    """
+    if dimension is None:
+        dimension = EMBEDDING_DIMENSION
+    vector = [0.0] * dimension
+    for term in tokenize(text) or {text}:
+        digest = hashlib.sha1(term.encode("utf-8")).digest()
+        for k in range(FAKE_EMBEDDING_HASHES):
+            index = int.from_bytes(digest[4 * k:4 * k + 3], "big") % dimension
+            vector[index] += 1.0 if digest[4 * k + 3] & 1 else -1.0
+    return vector
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # 高并发压测时避免连接排队被拒
+    request_queue_size = 1024
+
+class FakeDashScopeServer:
+    """
+    本地模拟的DashScope HTTP服务（文本嵌入 + 文本生成），按配置的延迟分布返回结果
+    服务进程设置环境变量 DASHSCOPE_HTTP_BASE_URL=<base_url> 后，所有DashScope调用都发往此服务，不消耗真实配额
+    """
+    def __init__(self, host="127.0.0.1", port=0, embedding_latency=None,
+                 generation_latency=None, error_rate=None):
+        self.embedding_latency = LatencyModel(embedding_latency or FAKE_EMBEDDING_LATENCY)
+        self.generation_latency = LatencyModel(generation_latency or FAKE_GENERATION_LATENCY)
+        self.error_rate = FAKE_ERROR_RATE if error_rate is None else error_rate
+        self.stats = {"embedding": 0, "generation": 0, "throttled": 0}
+        self._lock = threading.Lock()
+        self._httpd = _HTTPServer((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/api/v1"
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _respond(self, path, body):
+        """返回(HTTP状态码, 响应体)"""
+        if random.random() < self.error_rate:
+            self._count("throttled")
+            return 429, {"code": "Throttling.RateQuota", "message": "Requests rate limit exceeded.", "request_id": "fake"}
+
+        if "embedding" in path:
+            self._count("embedding")
+            time.sleep(self.embedding_latency.sample())
+            texts = body.get("input", {}).get("texts", [])
+            return 200, {
+                "output": {"embeddings": [{"text_index": i, "embedding": fake_embedding(t)} for i, t in enumerate(texts)]},
+                "usage": {"total_tokens": sum(len(t) for t in texts)},
+                "request_id": "fake"
+            }
+
+        self._count("generation")
+        time.sleep(self.generation_latency.sample())
+        prompt = body.get("input", {}).get("prompt", "")
+        return 200, {
+            "output": {"text": FAKE_ANSWER, "finish_reason": "stop"},
+            "usage": {"input_tokens": len(prompt), "output_tokens": len(FAKE_ANSWER)},
+            "request_id": "fake"
+        }
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                status, payload = server._respond(self.path, json.loads(raw or b"{}"))
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def start(self):
+        """在后台线程中启动服务"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-dashscope", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地模拟DashScope服务（压测用）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--embedding-latency", default=FAKE_EMBEDDING_LATENCY)
+    parser.add_argument("--generation-latency", default=FAKE_GENERATION_LATENCY)
+    parser.add_argument("--error-rate", type=float, default=FAKE_ERROR_RATE)
+    args = parser.parse_args(argv)
+
+    server = FakeDashScopeServer(args.host, args.port, args.embedding_latency,
+                                 args.generation_latency, args.error_rate)
+    print(f"模拟DashScope服务已启动：DASHSCOPE_HTTP_BASE_URL={server.base_url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n调用统计：{server.stats}")
+
+if __name__ == "__main__":
+    main()
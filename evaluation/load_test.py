@@ -0,0 +1,414 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlsplit
+from config import (
+    PROJECT_ROOT,
+    CHUNKS_OUTPUT_JSON,
+    EXAMPLES_PATH,
+    LOAD_TEST_REPORT_PATH,
+    LOAD_TEST_CONCURRENCY,
+    LOAD_TEST_STAGE_SECONDS,
+    LOAD_TEST_REQUEST_TIMEOUT
+)
+from common import normalize_question, percentile
+from .fake_dashscope import FakeDashScopeServer, fake_embedding
+
+# 可选依赖：psutil不可用时在Linux上读取/proc，均不可用时不统计资源占用
+try:
+    import psutil
+    SAMPLE_ERRORS = (psutil.Error,)
+except ImportError:
+    psutil = None
+    SAMPLE_ERRORS = (OSError, IndexError, ValueError)
+
+# 请求体模板中的问题占位符
+QUESTION_PLACEHOLDER = '"{question}"'
+DEFAULT_PAYLOAD = '{"question": "{question}"}'
+
+def load_questions(examples_path=None):
+    """压测使用的问题（examples.md中每行一个）"""
+    if examples_path is None:
+        examples_path = EXAMPLES_PATH
+    with open(examples_path, 'r', encoding='utf-8') as f:
+        questions = [line for line in (normalize_question(line) for line in f) if line]
+    if not questions:
+        raise ValueError(f"{examples_path}中没有问题")
+    return questions
+
+# ========================= 资源占用采样 =========================
+class ProcessSampler:
+    """采样服务进程及其子进程（uvicorn worker）的CPU占用（%，多核可超过100）和RSS（MB）"""
+    def __init__(self, pid):
+        self.pid = pid
+        self._last = None
+
+    def _pids(self):
+        if psutil is not None:
+            try:
+                process = psutil.Process(self.pid)
+                return [self.pid] + [child.pid for child in process.children(recursive=True)]
+            except psutil.NoSuchProcess:
+                return []
+        try:
+            with open(f"/proc/{self.pid}/task/{self.pid}/children") as f:
+                return [self.pid] + [int(pid) for pid in f.read().split()]
+        except OSError:
+            return [self.pid]
+
+    def _cpu_seconds_and_rss(self):
+        cpu, rss = 0.0, 0
+        for pid in self._pids():
+            try:
+                if psutil is not None:
+                    process = psutil.Process(pid)
+                    times = process.cpu_times()
+                    cpu += times.user + times.system
+                    rss += process.memory_info().rss
+                else:
+                    with open(f"/proc/{pid}/stat") as f:
+                        fields = f.read().rsplit(")", 1)[1].split()
+                    cpu += (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+                    with open(f"/proc/{pid}/statm") as f:
+                        rss += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+            except SAMPLE_ERRORS:
+                continue
+        return cpu, rss
+
+    def available(self):
+        return psutil is not None or os.path.exists(f"/proc/{self.pid}/stat")
+
+    def sample(self):
+        """返回自上次采样以来的平均CPU占用和当前RSS"""
+        cpu, rss = self._cpu_seconds_and_rss()
+        now = time.perf_counter()
+        cpu_percent = None
+        if self._last is not None and now > self._last[0]:
+            cpu_percent = (cpu - self._last[1]) / (now - self._last[0]) * 100
+        self._last = (now, cpu)
+        return cpu_percent, rss / 1024 / 1024
+
+# ========================= 异步HTTP客户端 =========================
+async def _read_response(reader):
+    """读取一个HTTP/1.1响应，返回(状态码, 首字节时间, 响应体, 服务端是否关闭连接)；支持Content-Length和chunked（流式接口）"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("连接已关闭")
+    first_byte_at = time.perf_counter()
+    status = int(status_line.split()[1])
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    elif headers.get("transfer-encoding", "").lower() == "chunked":
+        parts = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                await reader.readline()
+                break
+            parts.append(await reader.readexactly(size))
+            await reader.readline()
+        body = b"".join(parts)
+    else:
+        body = await reader.read()
+    return status, first_byte_at, body, headers.get("connection", "").lower() == "close"
+
+class Connection:
+    """每个虚拟用户一个keep-alive连接，出错或服务端关闭后重连"""
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, body):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n")
+        self.writer.write(head.encode("latin-1") + body)
+        await self.writer.drain()
+        status, first_byte_at, data, closed = await _read_response(self.reader)
+        if closed:
+            await self.close()
+        return status, first_byte_at, data
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+# ========================= 压测 =========================
+async def _virtual_user(url, payload, questions, end_at, timeout, results, counter):
+    """循环发送请求直到本级结束（闭环：上一个请求完成后立即发送下一个）"""
+    parts = urlsplit(url)
+    conn = Connection(parts.hostname, parts.port or 80)
+    path = parts.path or "/"
+    try:
+        while time.perf_counter() < end_at:
+            question = next(questions)
+            if counter is not None:
+                # 每个请求的问题都不同，避免全部命中回答缓存
+                question = f"{question} [压测{next(counter)}]"
+            body = payload.replace(QUESTION_PLACEHOLDER, json.dumps(question, ensure_ascii=False)).encode("utf-8")
+
+            start = time.perf_counter()
+            try:
+                status, first_byte_at, _ = await asyncio.wait_for(conn.request("POST", path, body), timeout)
+                error = None if status < 400 else f"HTTP {status}"
+                ttfb_ms = (first_byte_at - start) * 1000
+            except asyncio.TimeoutError:
+                error, ttfb_ms = "timeout", None
+                await conn.close()
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+                error, ttfb_ms = type(e).__name__, None
+                await conn.close()
+            results.append({
+                "latency_ms": (time.perf_counter() - start) * 1000,
+                "ttfb_ms": ttfb_ms,
+                "error": error
+            })
+    finally:
+        await conn.close()
+
+async def _sample_resources(sampler, end_at, samples, interval=0.5):
+    sampler.sample()
+    while time.perf_counter() < end_at:
+        await asyncio.sleep(interval)
+        samples.append(sampler.sample())
+
+async def run_stage(url, concurrency, duration, payload=DEFAULT_PAYLOAD, questions=None,
+                    unique=True, timeout=None, sampler=None):
+    """
+    以固定并发压测一级，返回该级的吞吐、延迟百分位、错误率和资源占用
+    只统计本级结束前发出的请求（结束时在途的请求继续完成并计入）
+    """
+    if questions is None:
+        questions = load_questions()
+    if timeout is None:
+        timeout = LOAD_TEST_REQUEST_TIMEOUT
+
+    results, samples = [], []
+    question_cycle = itertools.cycle(questions)
+    counter = itertools.count(int(time.time())) if unique else None
+    start = time.perf_counter()
+    end_at = start + duration
+    tasks = [_virtual_user(url, payload, question_cycle, end_at, timeout, results, counter)
+             for _ in range(concurrency)]
+    if sampler is not None:
+        tasks.append(_sample_resources(sampler, end_at, samples))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    ok = [r["latency_ms"] for r in results if r["error"] is None]
+    errors = {}
+    for r in results:
+        if r["error"] is not None:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+    ttfb = [r["ttfb_ms"] for r in results if r["ttfb_ms"] is not None]
+    cpu = [c for c, _ in samples if c is not None]
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "throughput_rps": round(len(ok) / elapsed, 2),
+        "error_rate": round((len(results) - len(ok)) / len(results), 4) if results else 0.0,
+        "errors": errors,
+        "p50_ms": round(percentile(ok, 50), 2),
+        "p90_ms": round(percentile(ok, 90), 2),
+        "p95_ms": round(percentile(ok, 95), 2),
+        "p99_ms": round(percentile(ok, 99), 2),
+        "avg_ttfb_ms": round(sum(ttfb) / len(ttfb), 2) if ttfb else None,
+        "cpu_percent": round(sum(cpu) / len(cpu), 1) if cpu else None,
+        "max_rss_mb": round(max(rss for _, rss in samples), 1) if samples else None
+    }
+
+def find_saturation(stages, min_gain=0.1):
+    """饱和点：继续提升并发后吞吐增幅不足min_gain（或错误率上升）前的最后一级"""
+    for prev, cur in zip(stages, stages[1:]):
+        if cur["throughput_rps"] < prev["throughput_rps"] * (1 + min_gain) or cur["error_rate"] > prev["error_rate"] + 0.01:
+            return prev["concurrency"]
+    return None
+
+def build_fixture_index(data_dir, questions=None):
+    """
+    在data_dir中构建压测用的快照索引，向量由模拟嵌入（fake_embedding）生成，与模拟服务返回的查询向量可比：
+    包含现有的全部chunk（CHUNKS_OUTPUT_JSON存在时），以及每个压测问题各一条样例条文，保证请求能通过相似度阈值走到生成阶段
+    Returns:
+        str: 快照目录
+    """
+    from vector_store.build_index import load_chunks, chunk_metadata
+    from vector_store.snapshot import write_snapshot
+
+    if questions is None:
+        questions = load_questions()
+    chunks = load_chunks() if os.path.exists(CHUNKS_OUTPUT_JSON) else []
+    chunks = chunks + [
+        {"chunk_id": f"load_test_{i}", "content": question, "article_id": str(i), "type": "article",
+         "chapter": "1", "spec_name": "压测样例条文", "spec_abbr": "load_test"}
+        for i, question in enumerate(questions, 1)
+    ]
+
+    snapshot_dir = os.path.join(data_dir, "snapshot")
+    write_snapshot(
+        snapshot_dir,
+        [c["chunk_id"] for c in chunks],
+        [fake_embedding(c["content"]) for c in chunks],
+        [c["content"] for c in chunks],
+        [chunk_metadata(c) for c in chunks],
+        source="load_test"
+    )
+    return snapshot_dir
+
+def spawn_service(port, dashscope_base_url, data_dir, workers=1, app="api:app"):
+    """
+    启动uvicorn服务进程，所有DashScope调用发往模拟服务
+    索引、版本指针、查询日志和LLM缓存均指向data_dir（先由build_fixture_index构建索引），
+    预热和压测产生的模拟回答不会写入线上的LLM缓存
+    """
+    env = dict(
+        os.environ,
+        DASHSCOPE_HTTP_BASE_URL=dashscope_base_url,
+        DASHSCOPE_API_KEY="fake-key-for-load-test",
+        RAG_INDEX_BACKEND="snapshot",
+        RAG_INDEX_SHARDED="false",
+        RAG_SNAPSHOT_PATH=os.path.join(data_dir, "snapshot"),
+        RAG_INDEX_VERSIONS_PATH=os.path.join(data_dir, "versions"),
+        RAG_ACTIVE_INDEX_POINTER=os.path.join(data_dir, "ACTIVE.json"),
+        RAG_QUERY_LOG_PATH=os.path.join(data_dir, "query_log.jsonl"),
+        RAG_LLM_CACHE_PATH=os.path.join(data_dir, "llm_cache.sqlite3")
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=PROJECT_ROOT, env=env
+    )
+
+def wait_until_ready(base_url, timeout=180, process=None):
+    """轮询/ready直到服务就绪（缓存预热完成）"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"服务进程已退出（返回码{process.returncode}）")
+        try:
+            with urllib.request.urlopen(f"{base_url}/ready", timeout=2) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"服务在{timeout}秒内未就绪：{base_url}")
+
+def run_load_test(url, concurrency_levels=None, duration=None, payload=DEFAULT_PAYLOAD,
+                  unique=True, pid=None, report_path=None):
+    """逐级提升并发压测，输出每级结果和饱和点，报告保存到report_path"""
+    if concurrency_levels is None:
+        concurrency_levels = LOAD_TEST_CONCURRENCY
+    if duration is None:
+        duration = LOAD_TEST_STAGE_SECONDS
+    if report_path is None:
+        report_path = LOAD_TEST_REPORT_PATH
+
+    questions = load_questions()
+    sampler = ProcessSampler(pid) if pid else None
+    if sampler is not None and not sampler.available():
+        print("未安装psutil且无法读取/proc，不统计服务资源占用")
+        sampler = None
+
+    stages = []
+    for concurrency in concurrency_levels:
+        print(f"并发 {concurrency}：压测 {duration} 秒...")
+        stage = asyncio.run(run_stage(url, concurrency, duration, payload, questions, unique, sampler=sampler))
+        stages.append(stage)
+        print(f"  {stage['throughput_rps']} req/s，P95 {stage['p95_ms']} ms，错误率 {stage['error_rate']:.2%}")
+
+    report = {"url": url, "stage_seconds": duration, "unique_questions": unique,
+              "saturation_concurrency": find_saturation(stages), "stages": stages}
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+
+    print_load_report(report)
+    print(f"\n压测报告已导出到：{report_path}")
+    return report
+
+def print_load_report(report):
+    """格式化打印各级压测结果"""
+    print("="*112)
+    print(f"{'并发':>6}{'请求数':>8}{'吞吐req/s':>11}{'错误率':>9}{'P50ms':>10}{'P90ms':>10}{'P95ms':>10}"
+          f"{'P99ms':>10}{'首字节ms':>10}{'CPU%':>8}{'RSS MB':>9}")
+    print("-"*112)
+    for s in report["stages"]:
+        cpu = f"{s['cpu_percent']:.1f}" if s["cpu_percent"] is not None else "-"
+        rss = f"{s['max_rss_mb']:.1f}" if s["max_rss_mb"] is not None else "-"
+        ttfb = f"{s['avg_ttfb_ms']:.1f}" if s["avg_ttfb_ms"] is not None else "-"
+        print(f"{s['concurrency']:>6}{s['requests']:>8}{s['throughput_rps']:>11.2f}{s['error_rate']:>9.2%}"
+              f"{s['p50_ms']:>10.1f}{s['p90_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}"
+              f"{ttfb:>10}{cpu:>8}{rss:>9}")
+    print("="*112)
+    saturation = report["saturation_concurrency"]
+    print(f"饱和点：并发 {saturation}" if saturation else "饱和点：未在测试的并发范围内出现")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m evaluation.load_test",
+        description="逐级提升并发压测问答服务（DashScope调用由本地模拟服务承接，不消耗真实配额）"
+    )
+    parser.add_argument("--url", help="压测已运行的服务，如 http://127.0.0.1:8001/ask（不指定时自动启动服务）")
+    parser.add_argument("--pid", type=int, help="--url模式下统计资源占用的服务进程号")
+    parser.add_argument("--endpoint", default="/ask", help="自动启动服务时压测的接口")
+    parser.add_argument("--payload", default=DEFAULT_PAYLOAD, help=f"请求体模板，{QUESTION_PLACEHOLDER}替换为问题")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=LOAD_TEST_CONCURRENCY)
+    parser.add_argument("--duration", type=float, default=LOAD_TEST_STAGE_SECONDS, help="每级并发持续秒数")
+    parser.add_argument("--repeat", action="store_true", help="原样重复示例问题（测试缓存命中时的容量）")
+    parser.add_argument("--workers", type=int, default=1, help="自动启动服务时的uvicorn worker数")
+    parser.add_argument("--port", type=int, default=18001, help="自动启动服务时的端口")
+    parser.add_argument("--embedding-latency", help="模拟嵌入接口的延迟分布，如 lognormal:0.08,0.3")
+    parser.add_argument("--generation-latency", help="模拟生成接口的延迟分布，如 tail:1.0,6.0,0.05")
+    parser.add_argument("--error-rate", type=float, help="模拟服务返回429的比例")
+    args = parser.parse_args(argv)
+
+    if args.url:
+        run_load_test(args.url, args.concurrency, args.duration, args.payload, not args.repeat, args.pid)
+        return
+
+    fake = FakeDashScopeServer(embedding_latency=args.embedding_latency,
+                               generation_latency=args.generation_latency,
+                               error_rate=args.error_rate).start()
+    print(f"模拟DashScope服务：{fake.base_url}")
+    data_dir = tempfile.TemporaryDirectory(prefix="load_test_")
+    build_fixture_index(data_dir.name)
+    service = spawn_service(args.port, fake.base_url, data_dir.name, args.workers)
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        wait_until_ready(base_url, process=service)
+        run_load_test(base_url + args.endpoint, args.concurrency, args.duration,
+                      args.payload, not args.repeat, service.pid)
+        print(f"模拟DashScope调用统计：{fake.stats}")
+    finally:
+        service.terminate()
+        service.wait(timeout=30)
+        fake.stop()
+        data_dir.cleanup()
+
+if __name__ == "__main__":
+    main()
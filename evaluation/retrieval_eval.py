@@ -0,0 +1,280 @@
+import argparse
+import itertools
+import json
+import os
+import time
+from config import (
+    EVAL_DATASET_PATH,
+    EVAL_REPORT_PATH,
+    EVAL_SWEEP_N_RESULTS,
+    EVAL_SWEEP_TOP_K,
+    EVAL_SWEEP_THRESHOLDS,
+    EVAL_SWEEP_EXPANSION,
+    EVAL_SWEEP_MODES,
+    EVAL_ROUTER_REPORT_PATH,
+    EVAL_ROUTER_TOP_CHAPTERS,
+    RETRIEVE_N_RESULTS,
+    RETRIEVE_TOP_K,
+    SIMILARITY_THRESHOLD,
+    QUERY_EXPANSION_ENABLED,
+    ROUTING_TOP_SPECS
+)
+from common import percentile
+from rag.dashscope_client import call_embedding
+from rag.index_manager import index_manager
+from rag.retriever import (
+    generate_keywords,
+    build_sub_queries,
+    vector_search,
+    vector_search_multi,
+    _parse_query_results,
+    fuse_candidates,
+    filter_candidates
+)
+
+def load_golden_dataset(dataset_path=None):
+    """
+    读取黄金问题集，格式为：
+    [{"question": "...", "expected": [{"spec_abbr": "jzsj", "article_id": "5.5.30"}, ...]}, ...]
+    """
+    if dataset_path is None:
+        dataset_path = EVAL_DATASET_PATH
+
+    with open(dataset_path, 'r', encoding='utf-8') as f:
+        dataset = json.load(f)
+
+    for idx, item in enumerate(dataset):
+        if not item.get("question") or not item.get("expected"):
+            raise ValueError(f"第{idx+1}条评估数据缺少question或expected字段")
+    return dataset
+
+def _score(docs, expected):
+    """计算单个问题的recall与reciprocal rank（按(spec_abbr, article_id)匹配）"""
+    expected_keys = {(e["spec_abbr"], e["article_id"]) for e in expected}
+    returned_keys = [(d["spec_abbr"], d["article_id"]) for d in docs]
+
+    recall = len(expected_keys & set(returned_keys)) / len(expected_keys)
+    reciprocal_rank = 0.0
+    for rank, key in enumerate(returned_keys, 1):
+        if key in expected_keys:
+            reciprocal_rank = 1 / rank
+            break
+    return recall, reciprocal_rank
+
+def _embed_uncached(texts):
+    """绕过embedding缓存直接调用嵌入模型，保证每组参数测得的都是真实调用耗时"""
+    response = call_embedding(texts)
+    embeddings = sorted(response.output["embeddings"], key=lambda x: x["text_index"])
+    return [item["embedding"] for item in embeddings]
+
+def _prepare_queries(dataset, use_expansion, mode_grid, keywords_by_question):
+    """
+    对每个问题生成各检索模式（单查询/多查询）的查询向量并记录耗时，供各参数组合复用
+    关键词（查询扩展）每个问题只生成一次，两种模式共用，其耗时计入两种模式
+    """
+    prepared = []
+    for item in dataset:
+        question = item["question"]
+        keyword_ms = 0.0
+        keywords = ""
+        if use_expansion:
+            if question not in keywords_by_question:
+                start = time.perf_counter()
+                keywords_by_question[question] = (generate_keywords(question, cache=False), (time.perf_counter() - start) * 1000)
+            keywords, keyword_ms = keywords_by_question[question]
+
+        queries = {
+            "single": [f"{question} {keywords}" if use_expansion else question],
+            "multi": build_sub_queries(question, keywords)
+        }
+        for mode in mode_grid:
+            texts = queries[mode]
+            start = time.perf_counter()
+            query_embeddings = _embed_uncached(texts)
+            prepared.append({
+                "mode": mode,
+                "question": question,
+                "expected": item["expected"],
+                "query_embeddings": query_embeddings,
+                "prepare_ms": keyword_ms + (time.perf_counter() - start) * 1000
+            })
+    return prepared
+
+def _search(item, n_results):
+    """按模式执行向量检索：单查询直接检索，多查询一次检索全部子查询后融合"""
+    if item["mode"] == "single":
+        return vector_search(item["query_embeddings"][0], n_results)
+    return fuse_candidates(vector_search_multi(item["query_embeddings"], n_results))
+
+def run_parameter_sweep(dataset=None, n_results_grid=None, top_k_grid=None,
+                        threshold_grid=None, expansion_grid=None, mode_grid=None, report_path=None):
+    """
+    扫描检索参数组合，输出每组参数的recall@k、MRR、上下文大小和检索耗时
+    说明：同一问题的查询扩展只执行一次，每种模式的embedding只执行一次，同一n_results的向量检索只执行一次，
+    阈值/top_k在候选结果上离线筛选；单次检索耗时 = 扩展耗时 + embedding耗时 + 向量检索（及融合）耗时
+    """
+    if dataset is None:
+        dataset = load_golden_dataset()
+    if n_results_grid is None:
+        n_results_grid = EVAL_SWEEP_N_RESULTS
+    if top_k_grid is None:
+        top_k_grid = EVAL_SWEEP_TOP_K
+    if threshold_grid is None:
+        threshold_grid = EVAL_SWEEP_THRESHOLDS
+    if expansion_grid is None:
+        expansion_grid = EVAL_SWEEP_EXPANSION
+    if mode_grid is None:
+        mode_grid = EVAL_SWEEP_MODES
+    if report_path is None:
+        report_path = EVAL_REPORT_PATH
+
+    rows = []
+    keywords_by_question = {}
+    for use_expansion in expansion_grid:
+        print(f"准备查询向量（查询扩展：{'开' if use_expansion else '关'}）...")
+        prepared = _prepare_queries(dataset, use_expansion, mode_grid, keywords_by_question)
+
+        for mode, n_results in itertools.product(mode_grid, n_results_grid):
+            searched = []
+            for item in prepared:
+                if item["mode"] != mode:
+                    continue
+                start = time.perf_counter()
+                candidates = _search(item, n_results)
+                search_ms = (time.perf_counter() - start) * 1000
+                searched.append((item, candidates, item["prepare_ms"] + search_ms))
+
+            for top_k, threshold in itertools.product(top_k_grid, threshold_grid):
+                if top_k > n_results:
+                    continue
+                recalls, reciprocal_ranks, context_sizes, latencies = [], [], [], []
+                for item, candidates, latency_ms in searched:
+                    docs = filter_candidates(candidates, threshold, top_k)
+                    recall, reciprocal_rank = _score(docs, item["expected"])
+                    recalls.append(recall)
+                    reciprocal_ranks.append(reciprocal_rank)
+                    context_sizes.append(sum(len(d["content"]) for d in docs))
+                    latencies.append(latency_ms)
+
+                count = len(searched)
+                rows.append({
+                    "mode": mode,
+                    "use_expansion": use_expansion,
+                    "n_results": n_results,
+                    "top_k": top_k,
+                    "similarity_threshold": threshold,
+                    "recall_at_k": round(sum(recalls) / count, 4),
+                    "mrr": round(sum(reciprocal_ranks) / count, 4),
+                    "avg_context_chars": round(sum(context_sizes) / count, 1),
+                    "avg_latency_ms": round(sum(latencies) / count, 2),
+                    "p95_latency_ms": round(percentile(latencies, 95), 2)
+                })
+
+    # 召回优先，其次耗时
+    rows.sort(key=lambda r: (-r["recall_at_k"], -r["mrr"], r["avg_latency_ms"]))
+
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump({"question_count": len(dataset), "results": rows}, f, ensure_ascii=False, indent=4)
+
+    print_sweep_report(rows)
+    print(f"\n评估报告已导出到：{report_path}")
+    return rows
+
+def print_sweep_report(rows):
+    """格式化打印参数扫描结果"""
+    print("="*108)
+    print(f"{'模式':<8}{'扩展':<6}{'n_results':>10}{'top_k':>7}{'阈值':>7}{'recall@k':>10}{'MRR':>8}"
+          f"{'上下文字数':>12}{'平均耗时ms':>12}{'P95耗时ms':>12}")
+    print("-"*108)
+    for r in rows:
+        print(f"{r['mode']:<8}{'开' if r['use_expansion'] else '关':<6}{r['n_results']:>10}{r['top_k']:>7}"
+              f"{r['similarity_threshold']:>7.2f}{r['recall_at_k']:>10.2%}{r['mrr']:>8.3f}"
+              f"{r['avg_context_chars']:>12.1f}{r['avg_latency_ms']:>12.2f}{r['p95_latency_ms']:>12.2f}")
+    print("="*108)
+
+def run_router_eval(dataset=None, top_chapters_grid=None, top_specs=None, report_path=None):
+    """
+    评估规范/章质心路由：对比全库检索与不同路由章数下的检索效果
+    router_recall为期望条文所在章被路由选中的比例（路由的召回上限），
+    scored_fraction为实际计算相似度的chunk占全库的比例
+    """
+    if dataset is None:
+        dataset = load_golden_dataset()
+    if top_chapters_grid is None:
+        top_chapters_grid = EVAL_ROUTER_TOP_CHAPTERS
+    if top_specs is None:
+        top_specs = ROUTING_TOP_SPECS
+    if report_path is None:
+        report_path = EVAL_ROUTER_REPORT_PATH
+
+    handle = index_manager.current()
+    router = handle.router.get()
+    total_rows = max(len(router.ids), 1)
+    print("准备查询向量...")
+    prepared = []
+    for item in dataset:
+        question = item["question"]
+        query = f"{question} {generate_keywords(question, cache=False)}" if QUERY_EXPANSION_ENABLED else question
+        prepared.append((item, _embed_uncached([query])[0]))
+
+    rows = []
+    for top_chapters in [None] + list(top_chapters_grid):
+        router_recalls, recalls, reciprocal_ranks, scored, latencies = [], [], [], [], []
+        for item, query_embedding in prepared:
+            start = time.perf_counter()
+            if top_chapters is None:
+                candidates = vector_search(query_embedding, RETRIEVE_N_RESULTS, handle)
+                routes = router.groups
+            else:
+                results = router.query([query_embedding], RETRIEVE_N_RESULTS, top_specs, top_chapters)
+                candidates = _parse_query_results(results)
+                routes = results["routes"][0]
+            latencies.append((time.perf_counter() - start) * 1000)
+
+            routed = set(routes)
+            expected = [(e["spec_abbr"], e["article_id"]) for e in item["expected"]]
+            router_recalls.append(sum(bool(router.groups_of_article.get(key, set()) & routed) for key in expected) / len(expected))
+            recall, reciprocal_rank = _score(filter_candidates(candidates, SIMILARITY_THRESHOLD, RETRIEVE_TOP_K), item["expected"])
+            recalls.append(recall)
+            reciprocal_ranks.append(reciprocal_rank)
+            scored.append(sum(len(router.group_rows[router.group_index[g]]) for g in routes) / total_rows)
+
+        count = len(prepared)
+        rows.append({
+            "top_chapters": top_chapters if top_chapters is not None else "全库",
+            "router_recall": round(sum(router_recalls) / count, 4),
+            "recall_at_k": round(sum(recalls) / count, 4),
+            "mrr": round(sum(reciprocal_ranks) / count, 4),
+            "scored_fraction": round(sum(scored) / count, 4),
+            "avg_search_ms": round(sum(latencies) / count, 2),
+            "p95_search_ms": round(percentile(latencies, 95), 2)
+        })
+
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump({"question_count": len(dataset), "top_specs": top_specs, "chapter_count": len(router.groups),
+                   "results": rows}, f, ensure_ascii=False, indent=4)
+
+    print_router_report(rows)
+    print(f"\n路由评估报告已导出到：{report_path}")
+    return rows
+
+def print_router_report(rows):
+    """格式化打印质心路由评估结果"""
+    print("="*84)
+    print(f"{'路由章数':>8}{'路由召回':>10}{'recall@k':>10}{'MRR':>8}{'计算比例':>10}{'平均耗时ms':>12}{'P95耗时ms':>12}")
+    print("-"*84)
+    for r in rows:
+        print(f"{r['top_chapters']:>8}{r['router_recall']:>10.2%}{r['recall_at_k']:>10.2%}{r['mrr']:>8.3f}"
+              f"{r['scored_fraction']:>10.2%}{r['avg_search_ms']:>12.2f}{r['p95_search_ms']:>12.2f}")
+    print("="*84)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="检索参数扫描 / 质心路由评估")
+    parser.add_argument("--router", action="store_true", help="评估规范/章质心路由的召回与检索开销")
+    args = parser.parse_args()
+    if args.router:
+        run_router_eval()
+    else:
+        run_parameter_sweep()
@@ -7,6 +7,8 @@ from .embedding import get_embedding
 from .retriever import retrieve
 from .qa_chain import qa_chain
 from .prompt_builder import build_prompt
+from .normalize import normalize_question
+from .query_log import log_query
 
 # 明确对外暴露的接口
-__all__ = ["get_embedding", "retrieve", "qa_chain", "build_prompt"]
\ No newline at end of file
+__all__ = ["get_embedding", "retrieve", "qa_chain", "build_prompt", "normalize_question", "log_query"]
\ No newline at end of file
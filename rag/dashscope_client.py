@@ -0,0 +1,313 @@
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from http import HTTPStatus
+import dashscope
+import requests
+from requests.adapters import HTTPAdapter
+from dashscope import Generation, TextEmbedding
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from config import (
+    EMBEDDING_MODEL,
+    GENERATION_MODEL,
+    DASHSCOPE_MAX_CONCURRENCY,
+    DASHSCOPE_POOL_SIZE,
+    DASHSCOPE_RATE_LIMITS,
+    DASHSCOPE_DEFAULT_RATE_LIMIT,
+    DASHSCOPE_RETRYABLE_STATUS,
+    EMBEDDING_TIMEOUT,
+    GENERATION_TIMEOUT,
+    DASHSCOPE_HEDGE_ENABLED,
+    DASHSCOPE_HEDGE_PERCENTILE,
+    DASHSCOPE_HEDGE_MIN_DELAY,
+    DASHSCOPE_HEDGE_WINDOW,
+    DASHSCOPE_HEDGE_MIN_SAMPLES,
+    DASHSCOPE_HEDGE_BUDGET,
+    DASHSCOPE_HEDGE_BURST,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_WAIT_MULTIPLIER,
+    RETRY_WAIT_MIN,
+    RETRY_WAIT_MAX
+)
+from .deadline import DeadlineExceeded
+
+# 初始化API Key（所有DashScope调用统一在此初始化；首次调用时才检查，离线工具和测试无需配置Key即可导入）
+dashscope.api_key = os.getenv("DASHSCOPE_API_KEY")
+
+# 日志
+logger = logging.getLogger(__name__)
+
+
+class DashScopeError(Exception):
+    """DashScope调用失败（不可重试：参数错误、鉴权失败、内容审核等）"""
+    def __init__(self, message, status_code=None, code=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = code
+
+
+class RetryableDashScopeError(DashScopeError):
+    """DashScope调用失败（可重试：限流、服务端错误、超时、连接异常）"""
+
+
+class TokenBucket:
+    """令牌桶限流：rate为每秒补充的令牌数，capacity为突发容量"""
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """阻塞直到获取一个令牌；timeout秒内无法获取时返回False（不消耗令牌）"""
+        give_up_at = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if give_up_at is not None and now + wait > give_up_at:
+                return False
+            time.sleep(wait)
+
+
+class LatencyTracker:
+    """单个模型近期成功调用的延迟窗口，用于计算对冲延迟"""
+    def __init__(self, window):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p):
+        """近期延迟的p分位数（最近邻法）；样本不足DASHSCOPE_HEDGE_MIN_SAMPLES时返回None"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < DASHSCOPE_HEDGE_MIN_SAMPLES:
+            return None
+        return samples[max(math.ceil(p / 100 * len(samples)) - 1, 0)]
+
+
+class HedgeBudget:
+    """全局对冲预算：每次调用积累ratio个令牌，每次对冲消耗一个，对冲数不超过调用数的ratio比例"""
+    def __init__(self, ratio, capacity):
+        self.ratio = ratio
+        self.capacity = capacity
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+
+    def record_call(self):
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + self.ratio)
+
+    def try_acquire(self):
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class _HedgeCancelled(Exception):
+    """对冲中落败的一方在发出请求前被取消"""
+
+
+# 全局并发上限（所有模型共享）
+_concurrency = threading.BoundedSemaphore(DASHSCOPE_MAX_CONCURRENCY)
+
+# 每个模型一个令牌桶
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+# 每个线程复用一个HTTP连接池（requests.Session非严格线程安全，按线程隔离）
+_local = threading.local()
+
+# 对冲请求：每个模型的近期延迟、全局对冲预算、执行请求的线程池（各线程同样有独立的Session）
+_latencies = {}
+_hedge_budget = HedgeBudget(DASHSCOPE_HEDGE_BUDGET, DASHSCOPE_HEDGE_BURST)
+_hedge_executor = ThreadPoolExecutor(max_workers=DASHSCOPE_MAX_CONCURRENCY * 2, thread_name_prefix="dashscope-hedge")
+_hedge_counts = {"calls": 0, "hedged": 0, "hedge_won": 0}
+
+
+def _get_bucket(model):
+    with _buckets_lock:
+        if model not in _buckets:
+            rate, capacity = DASHSCOPE_RATE_LIMITS.get(model, DASHSCOPE_DEFAULT_RATE_LIMIT)
+            _buckets[model] = TokenBucket(rate, capacity)
+        return _buckets[model]
+
+
+def _get_latency_tracker(model):
+    with _buckets_lock:
+        if model not in _latencies:
+            _latencies[model] = LatencyTracker(DASHSCOPE_HEDGE_WINDOW)
+        return _latencies[model]
+
+
+def hedge_stats():
+    """对冲请求统计：调用次数、发出的对冲数、对冲先返回的次数"""
+    with _buckets_lock:
+        return dict(_hedge_counts)
+
+
+def _count(name):
+    with _buckets_lock:
+        _hedge_counts[name] += 1
+
+
+def _get_session():
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=DASHSCOPE_POOL_SIZE, pool_maxsize=DASHSCOPE_POOL_SIZE)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _local.session = session
+    return session
+
+
+def _check_response(response):
+    """DashScope SDK以status_code返回失败而不抛异常，这里按状态码分类为可重试/不可重试异常"""
+    if response.status_code == HTTPStatus.OK:
+        return response
+    message = f"DashScope调用失败：status={response.status_code} code={response.code} message={response.message}"
+    if response.status_code in DASHSCOPE_RETRYABLE_STATUS:
+        raise RetryableDashScopeError(message, response.status_code, response.code)
+    raise DashScopeError(message, response.status_code, response.code)
+
+
+def _send_once(api, model, timeout, deadline=None, cancelled=None, **kwargs):
+    """
+    限流 → 并发控制 → 调用（连接复用+超时，超时不超过请求剩余的延迟预算）→ 校验响应
+    等待限流令牌和并发槽位同样受延迟预算限制，预算内等不到时抛出DeadlineExceeded
+    """
+    wait_timeout = deadline.wait_timeout() if deadline is not None else None
+    if not _get_bucket(model).acquire(timeout=wait_timeout):
+        raise DeadlineExceeded(f"等待{model}限流令牌超出延迟预算")
+    wait_timeout = deadline.wait_timeout() if deadline is not None else None
+    if not _concurrency.acquire(timeout=wait_timeout):
+        raise DeadlineExceeded("等待DashScope并发槽位超出延迟预算")
+    try:
+        # 对冲中已落败的请求不再发出，不占用配额
+        if cancelled is not None and cancelled.is_set():
+            raise _HedgeCancelled()
+        if deadline is not None:
+            timeout = deadline.timeout(timeout)
+        start = time.perf_counter()
+        try:
+            response = api.call(
+                model=model,
+                session=_get_session(),
+                request_timeout=timeout,
+                **kwargs
+            )
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            raise RetryableDashScopeError(f"DashScope请求超时或连接异常：{e}") from e
+    finally:
+        _concurrency.release()
+    response = _check_response(response)
+    _get_latency_tracker(model).record(time.perf_counter() - start)
+    return response
+
+
+def _send_hedged(api, model, timeout, deadline=None, **kwargs):
+    """
+    对冲调用：请求超过该模型近期延迟的DASHSCOPE_HEDGE_PERCENTILE分位数仍未返回时，
+    在对冲预算允许的情况下再发一份相同请求，先成功返回者为准
+    落败的一方若尚未发出则直接取消；已发出的HTTP请求无法中途中止，其结果被丢弃
+    """
+    _hedge_budget.record_call()
+    _count("calls")
+    delay = _get_latency_tracker(model).percentile(DASHSCOPE_HEDGE_PERCENTILE)
+
+    primary_cancelled = threading.Event()
+    primary = _hedge_executor.submit(_send_once, api, model, timeout, deadline, primary_cancelled, **kwargs)
+    if delay is None:
+        return primary.result()
+    done, _ = wait([primary], timeout=max(delay, DASHSCOPE_HEDGE_MIN_DELAY))
+    if done or not _hedge_budget.try_acquire():
+        return primary.result()
+
+    _count("hedged")
+    hedge_cancelled = threading.Event()
+    hedge = _hedge_executor.submit(_send_once, api, model, timeout, deadline, hedge_cancelled, **kwargs)
+    attempts = {primary: primary_cancelled, hedge: hedge_cancelled}
+
+    pending, error = set(attempts), None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                response = future.result()
+            except Exception as e:
+                # 一方失败时等待另一方；两方都失败时抛出最后一个异常（交由重试策略处理）
+                error = e
+                continue
+            for other in pending:
+                attempts[other].set()
+                other.cancel()
+            if future is hedge:
+                _count("hedge_won")
+            return response
+    raise error
+
+
+def _send(api, model, timeout, deadline=None, **kwargs):
+    if not dashscope.api_key:
+        raise ValueError("API Key不能为空！")
+    if DASHSCOPE_HEDGE_ENABLED:
+        return _send_hedged(api, model, timeout, deadline, **kwargs)
+    return _send_once(api, model, timeout, deadline, **kwargs)
+
+
+# 重试退避时间（指数增长，只取决于已尝试次数）
+_retry_wait = wait_exponential(multiplier=RETRY_WAIT_MULTIPLIER, min=RETRY_WAIT_MIN, max=RETRY_WAIT_MAX)
+
+
+def _deadline_exhausted(retry_state):
+    """请求剩余的延迟预算不够本次退避的等待时间时停止重试（deadline需以关键字参数传入）"""
+    deadline = retry_state.kwargs.get("deadline")
+    return deadline is not None and not deadline.allows(_retry_wait(retry_state))
+
+
+# 仅对可重试异常进行指数退避重试；超出延迟预算（DeadlineExceeded）不重试
+_retry_policy = retry(
+    stop=stop_after_attempt(RETRY_MAX_ATTEMPTS) | _deadline_exhausted,
+    wait=_retry_wait,
+    retry=retry_if_exception_type(RetryableDashScopeError),
+    reraise=True,
+    before_sleep=lambda retry_state: logger.warning(
+        f"API调用失败，即将重试（第{retry_state.attempt_number}次）：{retry_state.outcome.exception()}"
+    )
+)
+
+
+@_retry_policy
+def call_generation(prompt, temperature, model=None, timeout=None, deadline=None):
+    """调用生成模型，返回DashScope响应（response.output.text为生成文本）；deadline为请求的延迟预算"""
+    if model is None:
+        model = GENERATION_MODEL
+    if timeout is None:
+        timeout = GENERATION_TIMEOUT
+    return _send(Generation, model, timeout, deadline, prompt=prompt, temperature=temperature)
+
+
+@_retry_policy
+def call_embedding(texts, model=None, timeout=None, deadline=None):
+    """调用嵌入模型（texts可为单条文本或文本列表，单次调用最多EMBEDDING_BATCH_SIZE条）"""
+    if model is None:
+        model = EMBEDDING_MODEL
+    if timeout is None:
+        timeout = EMBEDDING_TIMEOUT
+    return _send(TextEmbedding, model, timeout, deadline, input=texts, result_format="float")
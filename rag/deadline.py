@@ -0,0 +1,47 @@
+import time
+
+
+class DeadlineExceeded(Exception):
+    """请求的延迟预算已用完"""
+
+
+class Deadline:
+    """
+    单次请求的端到端延迟预算：各阶段按剩余时间决定是否降级，上游调用以剩余时间作为超时上限
+    budget为None时不限制（剩余时间视为无穷大，不做任何降级）
+    """
+    def __init__(self, budget=None):
+        self.budget = budget
+        self._start = time.monotonic()
+        # 按发生顺序记录已采取的降级措施
+        self.degradations = []
+
+    def elapsed(self):
+        return time.monotonic() - self._start
+
+    def remaining(self):
+        if self.budget is None:
+            return float("inf")
+        return self.budget - self.elapsed()
+
+    def allows(self, seconds):
+        """剩余时间是否还够seconds秒"""
+        return self.remaining() >= seconds
+
+    def timeout(self, limit):
+        """上游调用的超时：不超过limit和剩余时间；预算已用完时抛出DeadlineExceeded"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"延迟预算（{self.budget}秒）已用完")
+        return min(limit, remaining)
+
+    def wait_timeout(self):
+        """阻塞等待（限流令牌、并发槽位、合并请求的结果）的超时：不限制预算时为None，预算已用完时为0"""
+        if self.budget is None:
+            return None
+        return max(self.remaining(), 0)
+
+    def degrade(self, name):
+        """记录一次降级（同一降级只记录一次）"""
+        if name not in self.degradations:
+            self.degradations.append(name)
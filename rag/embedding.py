@@ -1,21 +1,9 @@
 import logging
-import os
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
-import dashscope
-from dashscope import TextEmbedding
 from config import (
-    EMBEDDING_MODEL,
     EMBEDDING_DIMENSION,
-    RETRY_MAX_ATTEMPTS,
-    RETRY_WAIT_MULTIPLIER,
-    RETRY_WAIT_MIN,
-    RETRY_WAIT_MAX
+    EMBEDDING_BATCH_SIZE
 )
-
-# 初始化API Key
-dashscope.api_key = os.getenv("DASHSCOPE_API_KEY")
-if not dashscope.api_key:
-    raise ValueError("API Key不能为空！")
+from .dashscope_client import call_embedding
 
 # 日志
 logger = logging.getLogger(__name__)
@@ -23,17 +11,8 @@ logger = logging.getLogger(__name__)
 # 新增：嵌入缓存（和原代码一致）
 embedding_cache = {}
 
-# 保留原重试逻辑，补充缓存
-@retry(
-    stop=stop_after_attempt(RETRY_MAX_ATTEMPTS),
-    wait=wait_exponential(multiplier=RETRY_WAIT_MULTIPLIER, min=RETRY_WAIT_MIN, max=RETRY_WAIT_MAX),
-    retry=retry_if_exception_type(Exception),
-    before_sleep=lambda retry_state: logger.warning(
-        f"API调用失败，即将重试（第{retry_state.attempt_number}次）：{retry_state.outcome.exception()}"
-    )
-)
-def get_embedding(text: str) -> list[float]:
-    """生成文本向量（带重试+缓存机制）"""
+def get_embedding(text: str, deadline=None) -> list[float]:
+    """生成文本向量（带缓存；限流、超时与重试由dashscope_client统一处理，deadline为请求的延迟预算）"""
     # 新增：缓存逻辑（和原代码一致）
     if text in embedding_cache:
         return embedding_cache[text]
@@ -43,11 +22,7 @@ def get_embedding(text: str) -> list[float]:
         return []
     
     try:
-        response = TextEmbedding.call(
-            model=EMBEDDING_MODEL,
-            input=text,
-            result_format="float"
-        )
+        response = call_embedding(text, deadline=deadline)
         embedding = response.output["embeddings"][0]["embedding"]
         if len(embedding) != EMBEDDING_DIMENSION:
             logger.error(f"向量维度异常：{len(embedding)}，预期{EMBEDDING_DIMENSION}")
@@ -58,4 +33,32 @@ def get_embedding(text: str) -> list[float]:
         return embedding
     except Exception as e:
         logger.error(f"生成向量失败（文本：{text[:20]}...）：{e}")
-        raise
\ No newline at end of file
+        raise
+
+def get_embeddings(texts: list[str], deadline=None, cache=True) -> list[list[float]]:
+    """
+    批量生成文本向量：未命中缓存的文本按EMBEDDING_BATCH_SIZE分批，每批一次TextEmbedding调用
+    返回与texts一一对应的向量列表（空文本或维度异常的条目为[]）
+    cache为False时不读写嵌入缓存（规范入库等一次性的大批文本，避免常驻进程的缓存无限增长）
+    """
+    store = embedding_cache if cache else {}
+    pending = list(dict.fromkeys(
+        text for text in texts
+        if text and text.strip() and text not in store
+    ))
+
+    for start in range(0, len(pending), EMBEDDING_BATCH_SIZE):
+        batch = pending[start:start + EMBEDDING_BATCH_SIZE]
+        try:
+            response = call_embedding(batch, deadline=deadline)
+        except Exception as e:
+            logger.error(f"批量生成向量失败（{len(batch)}条，首条：{batch[0][:20]}...）：{e}")
+            raise
+        for item in response.output["embeddings"]:
+            embedding = item["embedding"]
+            if len(embedding) != EMBEDDING_DIMENSION:
+                logger.error(f"向量维度异常：{len(embedding)}，预期{EMBEDDING_DIMENSION}")
+                continue
+            store[batch[item["text_index"]]] = embedding
+
+    return [store.get(text, []) for text in texts]
@@ -0,0 +1,114 @@
+import logging
+import threading
+from config import INDEX_WATCH_INTERVAL
+from vector_store.index import active_version, open_active_index
+from .mmr import load_embedding_matrix
+from .lexical import load_lexical_index
+from .tables import load_table_rows
+from .routing import load_router
+
+# 日志
+logger = logging.getLogger(__name__)
+
+class LazyLoader:
+    """线程安全的懒加载：首次使用（或启动预热）时从索引加载一次，之后复用"""
+    def __init__(self, loader):
+        self._loader = loader
+        self._value = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    self._value = self._loader()
+        return self._value
+
+    def reset(self):
+        """丢弃已加载的数据（下次使用时重新加载）"""
+        with self._lock:
+            self._value = None
+
+class IndexHandle:
+    """
+    某一版本的检索索引及其派生的内存结构（均在首次使用时加载）：
+    chunk向量矩阵（MMR）、关键词倒排索引（降级检索）、表格行分组（还原完整表格）、规范/章质心路由
+    请求开始时取得handle，整个请求期间使用同一版本
+    """
+    def __init__(self, version, index):
+        self.version = version
+        self.index = index
+        self.embedding_matrix = LazyLoader(lambda: load_embedding_matrix(index))
+        self.lexical_index = LazyLoader(lambda: load_lexical_index(index))
+        self.table_rows = LazyLoader(lambda: load_table_rows(index))
+        self.router = LazyLoader(lambda: load_router(index, self.embedding_matrix.get()))
+
+class IndexManager:
+    """
+    管理当前生效的索引版本：后台线程定期检查版本指针，发现新版本时先完整加载，再原子替换handle
+    进行中的请求继续持有旧handle直至结束，新请求使用新版本；切换后通知监听者（如清空回答缓存）
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handle = None
+        self._listeners = []
+        self._watcher = None
+        self._stop = threading.Event()
+
+    def current(self):
+        """当前生效版本的handle（首次调用时加载）"""
+        if self._handle is None:
+            with self._lock:
+                if self._handle is None:
+                    self._handle = IndexHandle(*open_active_index())
+                    logger.info(f"已加载索引版本：{self._handle.version}")
+        return self._handle
+
+    def add_swap_listener(self, listener):
+        """注册切换回调：listener(old_version, new_version)"""
+        self._listeners.append(listener)
+
+    def check_for_update(self):
+        """检查版本指针（分片模式下为分片登记表），有新版本时加载并切换；返回是否发生了切换"""
+        current = self.current()
+        if active_version() == current.version:
+            return False
+
+        # 在切换前完成全部加载（含内存向量矩阵），切换本身只是一次引用赋值；未变化的分片直接复用
+        version, index = open_active_index(previous=current.index)
+        handle = IndexHandle(version, index)
+        handle.embedding_matrix.get()
+        with self._lock:
+            old = self._handle
+            self._handle = handle
+        logger.info(f"索引已热切换：{old.version} → {handle.version}")
+
+        for listener in self._listeners:
+            try:
+                listener(old.version, handle.version)
+            except Exception as e:
+                logger.error(f"索引切换回调执行失败：{e}")
+        return True
+
+    def start_watcher(self, interval=None):
+        """启动后台线程定期检查版本指针（重复调用无副作用）"""
+        if interval is None:
+            interval = INDEX_WATCH_INTERVAL
+        if self._watcher is not None:
+            return
+
+        def watch():
+            while not self._stop.wait(interval):
+                try:
+                    self.check_for_update()
+                except Exception as e:
+                    logger.error(f"检查索引版本失败，继续使用当前版本：{e}")
+
+        self._watcher = threading.Thread(target=watch, name="index-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+
+# 进程内唯一的索引管理器
+index_manager = IndexManager()
@@ -0,0 +1,58 @@
+import logging
+import math
+from collections import defaultdict
+from common import tokenize
+from vector_store.versions import read_all
+
+# 日志
+logger = logging.getLogger(__name__)
+
+class LexicalIndex:
+    """
+    内存倒排索引（检索词 → 条文行号），作为向量检索不可用时的降级检索
+    得分为命中检索词的IDF之和占查询检索词IDF总和的比例（0~1）
+    """
+    def __init__(self, ids, documents, metadatas):
+        self.ids = list(ids)
+        self.documents = list(documents)
+        self.metadatas = list(metadatas)
+        self.postings = defaultdict(list)
+        for row, doc in enumerate(self.documents):
+            for term in tokenize(doc or ""):
+                self.postings[term].append(row)
+        total = max(len(self.ids), 1)
+        self.idf = {term: math.log(1 + total / len(rows)) for term, rows in self.postings.items()}
+
+    def search(self, query, n_results):
+        """返回与向量检索结构一致的候选列表（similarity为关键词得分，distance = 1 - similarity）"""
+        terms = [term for term in tokenize(query) if term in self.postings]
+        # 查询中未出现在任何条文里的检索词也计入总权重（按最大IDF计）
+        max_idf = max(self.idf.values(), default=1.0)
+        total_weight = sum(self.idf.get(term, max_idf) for term in tokenize(query)) or 1.0
+
+        scores = defaultdict(float)
+        for term in terms:
+            for row in self.postings[term]:
+                scores[row] += self.idf[term]
+
+        top = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:n_results]
+        candidates = []
+        for row, score in top:
+            similarity = score / total_weight
+            metadata = self.metadatas[row] or {}
+            candidates.append({
+                "chunk_id": self.ids[row],
+                "distance": 1 - similarity,
+                "similarity": similarity,
+                "article_id": metadata.get("article_id"),
+                "spec_name": metadata.get("spec_name"),
+                "spec_abbr": metadata.get("spec_abbr"),
+                "content": self.documents[row]
+            })
+        return candidates
+
+def load_lexical_index(index):
+    """从检索索引分页读取全部条文，构建倒排索引（首次降级检索时加载一次）"""
+    ids, documents, metadatas = read_all(index, include=["documents", "metadatas"])
+    logger.info(f"已加载{len(ids)}条条文到关键词倒排索引")
+    return LexicalIndex(ids, documents, metadatas)
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from config import LLM_CACHE_ENABLED, LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES, GENERATION_MODEL
+from .dashscope_client import call_generation
+from .tracing import record_usage
+
+# 日志
+logger = logging.getLogger(__name__)
+
+# 超过上限时一次淘汰到上限的该比例，避免每次写入都触发淘汰
+EVICT_TO_RATIO = 0.9
+
+def template_version(template):
+    """Prompt模板的版本（模板文本的哈希），模板修改后旧版本的缓存失效"""
+    return hashlib.sha1(template.encode("utf-8")).hexdigest()[:12]
+
+def cache_key(model, temperature, prompt):
+    """精确匹配的缓存key：hash(模型, 温度, 完整Prompt)"""
+    payload = json.dumps([model, temperature, prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class LLMCache:
+    """
+    磁盘持久化的LLM回答缓存（SQLite，WAL模式）：同一主机上的多个worker进程共享，服务重启后仍然有效
+    每条记录属于一个阶段（如expand_query、generate）及其命名空间（模型 + 模板版本）；
+    进程内首次访问某阶段（读或写）时删除该阶段旧命名空间的全部记录；
+    条数超过max_entries时按最近使用时间淘汰
+    读写失败只记录日志并按未命中处理，不影响请求
+    """
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._active_namespaces = {}
+        self._lock = threading.Lock()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, stage TEXT NOT NULL, namespace TEXT NOT NULL, "
+                "text TEXT NOT NULL, usage TEXT, created_at REAL NOT NULL, last_used_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used_at)")
+            self._local.conn = conn
+        return conn
+
+    def activate(self, stage, namespace):
+        """每个进程每个阶段只执行一次：清除该阶段其他命名空间（旧模型/旧模板）的记录"""
+        with self._lock:
+            if self._active_namespaces.get(stage) == namespace:
+                return
+            self._active_namespaces[stage] = namespace
+        try:
+            deleted = self._conn().execute(
+                "DELETE FROM llm_cache WHERE stage = ? AND namespace != ?", (stage, namespace)
+            ).rowcount
+        except sqlite3.Error as e:
+            logger.warning(f"清除LLM缓存旧记录失败：{e}")
+            return
+        if deleted:
+            logger.info(f"LLM缓存：{stage}的模型或模板已变化，清除{deleted}条旧记录")
+
+    def get(self, key, stage=None, namespace=None):
+        """返回缓存的(文本, token用量)，未命中返回None；传入stage和namespace时先清除该阶段的旧记录"""
+        if stage is not None:
+            self.activate(stage, namespace)
+        try:
+            conn = self._conn()
+            row = conn.execute("SELECT text, usage FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE llm_cache SET last_used_at = ? WHERE key = ?", (time.time(), key))
+            return row[0], json.loads(row[1]) if row[1] else None
+        except sqlite3.Error as e:
+            logger.warning(f"读取LLM缓存失败，按未命中处理：{e}")
+            return None
+
+    def put(self, key, stage, namespace, text, usage=None):
+        self.activate(stage, namespace)
+        try:
+            conn = self._conn()
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, stage, namespace, text, usage, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, stage, namespace, text, json.dumps(usage) if usage else None, now, now)
+            )
+            count = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_used_at LIMIT ?)",
+                    (count - int(self.max_entries * EVICT_TO_RATIO),)
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"写入LLM缓存失败：{e}")
+
+    def clear(self):
+        self._conn().execute("DELETE FROM llm_cache")
+
+    def stats(self):
+        """各阶段、各命名空间的缓存条数"""
+        rows = self._conn().execute(
+            "SELECT stage, namespace, COUNT(*) FROM llm_cache GROUP BY stage, namespace"
+        ).fetchall()
+        return [{"stage": stage, "namespace": namespace, "count": count} for stage, namespace, count in rows]
+
+# 进程内唯一的缓存实例（多个进程通过同一SQLite文件共享）
+llm_cache = LLMCache(LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES)
+
+def cached_generation(prompt, temperature, stage, template, trace=None, deadline=None, model=None, cache=True):
+    """
+    带持久化缓存的生成调用：相同（模型, 温度, 完整Prompt）直接返回缓存文本，不调用上游
+    Args:
+        stage: 调用阶段（expand_query / generate），用于trace记录和按阶段失效
+        template: 生成Prompt所用的模板文本，模板修改后该阶段的旧缓存失效
+        cache: 为False时不读写缓存，直接调用上游（评估等需要测得真实调用耗时的场景）
+    Returns:
+        str: 生成文本
+    """
+    if model is None:
+        model = GENERATION_MODEL
+    if not LLM_CACHE_ENABLED or not cache:
+        response = call_generation(prompt, temperature, model, deadline=deadline)
+        record_usage(trace, stage, response)
+        return response.output.text
+
+    key = cache_key(model, temperature, prompt)
+    namespace = f"{model}|{template_version(template)}"
+    cached = llm_cache.get(key, stage, namespace)
+    if cached is not None:
+        if trace is not None:
+            trace.setdefault("llm_cache_hits", []).append(stage)
+        return cached[0]
+
+    response = call_generation(prompt, temperature, model, deadline=deadline)
+    record_usage(trace, stage, response)
+    usage = getattr(response, "usage", None)
+    llm_cache.put(key, stage, namespace, response.output.text, dict(usage) if usage else None)
+    return response.output.text
@@ -0,0 +1,76 @@
+import logging
+import numpy as np
+from vector_store.versions import read_all
+
+# 日志
+logger = logging.getLogger(__name__)
+
+class EmbeddingMatrix:
+    """
+    chunk向量的内存矩阵：按行L2归一化的float32矩阵 + chunk_id→行号映射
+    两行的点积即余弦相似度，MMR的两两相似度计算只需一次矩阵乘法
+    """
+    def __init__(self, ids, embeddings, normalized=False):
+        self.ids = list(ids)
+        self.row_of = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+        # 已归一化的向量（如mmap快照）直接引用，不复制
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.size == 0:
+            matrix = matrix.reshape(0, 0)
+        elif not normalized:
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.maximum(norms, 1e-12)
+        self.matrix = matrix
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rows(self, chunk_ids):
+        """返回chunk_ids对应的行号（不在矩阵中的返回None）"""
+        return [self.row_of.get(chunk_id) for chunk_id in chunk_ids]
+
+def load_embedding_matrix(collection):
+    """从Chroma集合分页读取全部chunk向量，构建内存矩阵（仅在启动/索引切换时调用一次）"""
+    # mmap快照中的向量已归一化，直接引用共享的只读映射
+    if getattr(collection, "manifest", {}).get("normalized"):
+        return EmbeddingMatrix(collection.ids, collection.embeddings, normalized=True)
+
+    ids, embeddings = read_all(collection, include=["embeddings"])
+    logger.info(f"已加载{len(ids)}个chunk向量到内存矩阵")
+    return EmbeddingMatrix(ids, embeddings)
+
+def mmr_select(candidates, top_k, mmr_lambda, embedding_matrix):
+    """
+    最大边际相关（MMR）选择：每步选取 λ·相关度 − (1−λ)·与已选条文的最大相似度 最高的候选
+    相关度使用候选与查询的相似度；候选间相似度取自内存矩阵（不在矩阵中的候选视为与其他候选无冗余）
+    返回选中的候选（按选择顺序）
+    """
+    if len(candidates) <= 1 or top_k <= 0:
+        return candidates[:top_k]
+
+    relevance = np.array([item["similarity"] for item in candidates], dtype=np.float32)
+    rows = embedding_matrix.rows([item["chunk_id"] for item in candidates])
+    known = np.array([row is not None for row in rows])
+    if not known.all():
+        logger.warning(f"{int((~known).sum())}个候选不在内存向量矩阵中，按无冗余处理")
+
+    vectors = np.zeros((len(candidates), embedding_matrix.matrix.shape[1]), dtype=np.float32)
+    if known.any():
+        vectors[known] = embedding_matrix.matrix[[row for row in rows if row is not None]]
+    pairwise = vectors @ vectors.T
+
+    selected = [int(np.argmax(relevance))]
+    # 每个候选与已选集合的最大相似度
+    max_sim = pairwise[selected[0]].copy()
+    remaining = np.ones(len(candidates), dtype=bool)
+    remaining[selected[0]] = False
+
+    while len(selected) < min(top_k, len(candidates)):
+        scores = mmr_lambda * relevance - (1 - mmr_lambda) * max_sim
+        scores[~remaining] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        remaining[best] = False
+        max_sim = np.maximum(max_sim, pairwise[best])
+
+    return [candidates[i] for i in selected]
@@ -0,0 +1,7 @@
+import json
+from common import normalize_question
+
+def request_key(question, **options):
+    """由归一化问题和检索参数/过滤条件生成请求key（参数为None视为使用默认值）"""
+    filters = {k: v for k, v in options.items() if v is not None}
+    return normalize_question(question) + "|" + json.dumps(filters, sort_keys=True, ensure_ascii=False)
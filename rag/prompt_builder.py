@@ -1,14 +1,5 @@
-def build_prompt(docs, question):
-    """构建问答Prompt - 核心逻辑完全不变"""
-    context = ""
-    for item in docs:
-        context += (
-            f"【规范名称：{item['spec_name']} "
-            f"| 条文编号：{item['article_id']}】\n"
-            f"{item['content']}\n\n"
-        )
-
-    prompt = f"""
+# 问答Prompt模板（修改后LLM缓存中旧模板生成的回答自动失效）
+ANSWER_PROMPT_TEMPLATE = """
 你是一名建筑设计规范助手。
 请严格依据以下规范条文回答问题，不允许编造。
 
@@ -23,4 +14,15 @@ def build_prompt(docs, question):
    （依据《规范名称》第X.X.X条）
 3. 若规范未明确说明，回答“规范中未明确规定”
 """
-    return prompt
\ No newline at end of file
+
+def build_prompt(docs, question):
+    """构建问答Prompt - 核心逻辑完全不变"""
+    context = ""
+    for item in docs:
+        context += (
+            f"【规范名称：{item['spec_name']} "
+            f"| 条文编号：{item['article_id']}】\n"
+            f"{item['content']}\n\n"
+        )
+
+    return ANSWER_PROMPT_TEMPLATE.format(context=context, question=question)
\ No newline at end of file
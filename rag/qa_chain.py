@@ -1,32 +1,134 @@
-import dashscope
-import os
-from dashscope import Generation
 from config import (
-    GENERATION_MODEL,
-    ANSWER_GENERATE_TEMPERATURE
+    ANSWER_GENERATE_TEMPERATURE,
+    QA_SINGLE_FLIGHT_ENABLED,
+    ANSWER_CACHE_ENABLED,
+    ANSWER_CACHE_MAX_ITEMS,
+    DEADLINE_SHORT_CONTEXT,
+    DEADLINE_SHORT_CONTEXT_TOP_K,
+    DEADLINE_MIN_GENERATION,
+    DEADLINE_MIN_EXPANSION,
+    DEADLINE_MIN_EMBEDDING
 )
 from .retriever import retrieve
-from .prompt_builder import build_prompt
+from .prompt_builder import build_prompt, ANSWER_PROMPT_TEMPLATE
+from .normalize import request_key
+from .singleflight import SingleFlight, WaitTimeout
+from .lru_cache import LRUCache
+from .dashscope_client import RetryableDashScopeError
+from .deadline import DeadlineExceeded
+from .index_manager import index_manager
+from .llm_cache import cached_generation
+from .tracing import stage_timer
 
-# 初始化API Key
-dashscope.api_key = os.getenv("DASHSCOPE_API_KEY")
+# 超出延迟预算、只返回检索条文时的回答
+REFERENCES_ONLY_ANSWER = "回答生成超出响应时间预算，以下为检索到的相关条文，请直接查阅"
 
-def qa_chain(question):
-    """RAG主流程：检索 → 构建Prompt → 生成回答"""
+# 进行中的问答请求合并（归一化问题+检索参数相同的并发请求共享一次上游调用）
+_in_flight = SingleFlight()
+
+# 已完成的回答缓存（key含索引版本；索引切换后旧版本的回答全部清空）
+answer_cache = LRUCache(ANSWER_CACHE_MAX_ITEMS)
+index_manager.add_swap_listener(lambda old_version, new_version: answer_cache.clear())
+
+# 各阶段的降级阈值（秒）：有预算的请求按剩余预算越过的阈值个数分档合并
+DEADLINE_THRESHOLDS = (DEADLINE_MIN_EMBEDDING, DEADLINE_MIN_GENERATION, DEADLINE_SHORT_CONTEXT, DEADLINE_MIN_EXPANSION)
+
+def _flight_key(key, deadline):
+    """
+    请求合并的key：不限时的请求（如启动预热）按原key合并；有预算的请求附加预算档位，
+    只与开始时剩余预算相近（降级路径相同）的请求合并，短预算请求的降级回答不会交给长预算的请求
+    """
+    if deadline is None or deadline.budget is None:
+        return key
+    remaining = deadline.remaining()
+    return f"{key}|tier{sum(remaining >= threshold for threshold in DEADLINE_THRESHOLDS)}"
+
+def qa_chain(question, trace=None, deadline=None, **retrieve_options):
+    """
+    RAG主流程：检索 → 构建Prompt → 生成回答
+    Args:
+        question: 用户问题
+        trace: 可选的调试信息字典，传入时记录各阶段耗时、候选条文、Prompt长度和token用量
+        deadline: 可选的延迟预算（Deadline）；预算不足时各阶段依次降级，
+                  所采取的降级记录在deadline.degradations中
+        retrieve_options: 透传给retrieve的检索参数（n_results/top_k/similarity_threshold/use_expansion）
+    """
+    # 调试请求需要独立的trace，不读缓存、不参与合并
+    if trace is not None:
+        answer, docs, degradations = _run_qa_chain(question, trace, deadline, **retrieve_options)
+        trace["degradations"] = degradations
+        _merge_degradations(deadline, degradations)
+        return answer, docs
+
+    # 索引切换后的新请求不命中、也不与切换前的计算合并
+    key = request_key(question, index_version=index_manager.current().version, **retrieve_options)
+    if ANSWER_CACHE_ENABLED:
+        cached = answer_cache.get(key)
+        if cached is not None:
+            return cached
+
+    if QA_SINGLE_FLIGHT_ENABLED:
+        # 合并的请求共享首个请求的计算（按预算档位分开合并），
+        # 等待者最多等到自身预算用完，之后按自身（已耗尽的）预算降级计算
+        try:
+            answer, docs, degradations = _in_flight.do(
+                _flight_key(key, deadline), _run_qa_chain, question, None, deadline,
+                wait_timeout=deadline.wait_timeout() if deadline is not None else None,
+                **retrieve_options
+            )
+        except WaitTimeout:
+            answer, docs, degradations = _run_qa_chain(question, None, deadline, **retrieve_options)
+    else:
+        answer, docs, degradations = _run_qa_chain(question, None, deadline, **retrieve_options)
+
+    _merge_degradations(deadline, degradations)
+    # 降级产生的回答不缓存，预算充足时的请求会重新计算完整回答
+    if ANSWER_CACHE_ENABLED and not degradations:
+        answer_cache.put(key, (answer, docs))
+    return answer, docs
+
+def _merge_degradations(deadline, degradations):
+    """将（可能由合并请求中的首个请求产生的）降级记录到本次请求的deadline"""
+    if deadline is not None:
+        for name in degradations:
+            deadline.degrade(name)
+
+def _run_qa_chain(question, trace=None, deadline=None, **retrieve_options):
+    """单次完整的问答计算，返回（回答, 条文, 降级列表）"""
     # 1. 检索相关条文
-    docs = retrieve(question)
+    with stage_timer(trace, "retrieve"):
+        docs = retrieve(question, trace, deadline=deadline, **retrieve_options)
+    degradations = deadline.degradations if deadline is not None else []
     if not docs:
-        return "未检索到相关条文", []
-    
+        return "未检索到相关条文", [], degradations
+
+    # 剩余预算不足以生成回答时只返回检索到的条文
+    if deadline is not None and not deadline.allows(DEADLINE_MIN_GENERATION):
+        deadline.degrade("references_only")
+        return REFERENCES_ONLY_ANSWER, docs, degradations
+
+    # 剩余预算紧张时缩短上下文，减少Prompt长度和生成耗时
+    context_docs = docs
+    if deadline is not None and not deadline.allows(DEADLINE_SHORT_CONTEXT):
+        deadline.degrade("short_context")
+        context_docs = docs[:DEADLINE_SHORT_CONTEXT_TOP_K]
+
     # 2. 构建Prompt
-    prompt = build_prompt(docs, question)
-    
-    # 3. 生成回答（和原代码一致）
-    response = Generation.call(
-        model=GENERATION_MODEL,
-        prompt=prompt,
-        temperature=ANSWER_GENERATE_TEMPERATURE
-    )
-    answer = response.output.text
+    with stage_timer(trace, "build_prompt"):
+        prompt = build_prompt(context_docs, question)
+    if trace is not None:
+        trace["prompt_length"] = len(prompt)
     
-    return answer, docs
\ No newline at end of file
+    # 3. 生成回答（和原代码一致；相同Prompt命中LLM缓存时不调用上游；生成超时且设置了预算时只返回检索到的条文）
+    try:
+        with stage_timer(trace, "generate"):
+            answer = cached_generation(
+                prompt, ANSWER_GENERATE_TEMPERATURE, "generate", ANSWER_PROMPT_TEMPLATE, trace, deadline
+            )
+    except (DeadlineExceeded, RetryableDashScopeError):
+        if deadline is None:
+            raise
+        deadline.degrade("references_only")
+        return REFERENCES_ONLY_ANSWER, docs, degradations
+
+    return answer, docs, degradations
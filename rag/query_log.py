@@ -0,0 +1,76 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from config import QUERY_LOG_ENABLED, QUERY_LOG_PATH, QUERY_LOG_MAX_BYTES, QUERY_LOG_BACKUPS
+from .normalize import normalize_question
+
+# 日志
+logger = logging.getLogger(__name__)
+
+# 多个请求线程追加写同一文件
+_write_lock = threading.Lock()
+
+def _rotate(log_path):
+    """日志文件超过QUERY_LOG_MAX_BYTES时轮转：log → log.1 → … → log.N，最旧的文件被覆盖"""
+    if not os.path.exists(log_path) or os.path.getsize(log_path) < QUERY_LOG_MAX_BYTES:
+        return
+    if QUERY_LOG_BACKUPS <= 0:
+        os.remove(log_path)
+        return
+    for i in range(QUERY_LOG_BACKUPS - 1, 0, -1):
+        if os.path.exists(f"{log_path}.{i}"):
+            os.replace(f"{log_path}.{i}", f"{log_path}.{i + 1}")
+    os.replace(log_path, f"{log_path}.1")
+
+def log_files(log_path=None):
+    """当前日志及轮转文件（从旧到新，只返回存在的文件）"""
+    if log_path is None:
+        log_path = QUERY_LOG_PATH
+    paths = [f"{log_path}.{i}" for i in range(QUERY_LOG_BACKUPS, 0, -1)] + [log_path]
+    return [path for path in paths if os.path.exists(path)]
+
+def log_query(question, filters=None, latency_ms=None, degradations=None, reference_count=None):
+    """
+    记录一次问答请求（JSON Lines）：归一化问题、检索参数/过滤条件（仅记录非默认值）、耗时与降级情况
+    文件按大小轮转，总大小不超过(QUERY_LOG_BACKUPS + 1) * QUERY_LOG_MAX_BYTES；写入失败只记录日志，不影响请求
+    """
+    if not QUERY_LOG_ENABLED:
+        return
+    record = {
+        "ts": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "question": normalize_question(question),
+        "filters": {k: v for k, v in (filters or {}).items() if v is not None},
+        "latency_ms": latency_ms,
+        "degradations": degradations or [],
+        "reference_count": reference_count
+    }
+    try:
+        with _write_lock:
+            os.makedirs(os.path.dirname(QUERY_LOG_PATH), exist_ok=True)
+            _rotate(QUERY_LOG_PATH)
+            with open(QUERY_LOG_PATH, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError as e:
+        logger.error(f"写入查询日志失败：{e}")
+
+def top_queries(n, log_path=None):
+    """
+    查询日志（含轮转文件）中出现次数最多的前n个（归一化问题, 过滤条件）组合
+    Returns:
+        list: [(question, filters, count)]
+    """
+    counts = Counter()
+    for path in log_files(log_path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("question"):
+                    counts[(record["question"], json.dumps(record.get("filters") or {}, sort_keys=True))] += 1
+
+    return [(question, json.loads(filters), count) for (question, filters), count in counts.most_common(n)]
@@ -1,33 +1,38 @@
-import dashscope
-import os
-from dashscope import Generation
-import chromadb
 from config import (
-    CHROMA_DB_PATH,
-    CHROMA_COLLECTION_NAME,
-    GENERATION_MODEL,
     QUERY_EXPAND_TEMPERATURE,
+    QUERY_EXPANSION_ENABLED,
+    RETRIEVE_MODE,
     RETRIEVE_N_RESULTS,
     RETRIEVE_TOP_K,
     SIMILARITY_THRESHOLD,
-    CHROMA_COLLECTION_METADATA
+    MULTI_QUERY_FUSION,
+    RRF_K,
+    EMBEDDING_BATCH_SIZE,
+    MMR_ENABLED,
+    MMR_LAMBDA,
+    MMR_FETCH_MULTIPLIER,
+    RETRIEVE_FULL_TABLES,
+    ROUTING_ENABLED,
+    DEADLINE_MIN_EXPANSION,
+    DEADLINE_MIN_EMBEDDING,
+    KEYWORD_CACHE_MAX_ITEMS
 )
-from rag.embedding import get_embedding
+from rag.dashscope_client import RetryableDashScopeError
+from rag.deadline import DeadlineExceeded
+from rag.embedding import get_embedding, get_embeddings, embedding_cache
+from rag.index_manager import index_manager
+from rag.llm_cache import cached_generation
+from rag.lru_cache import LRUCache
+from rag.mmr import mmr_select
+from rag.tables import expand_tables
+from rag.tracing import stage_timer
+from vector_store.shards import ShardedIndex
 
-# 初始化API Key
-dashscope.api_key = os.getenv("DASHSCOPE_API_KEY")
+# 查询扩展关键词缓存（问题 → 关键词，进程内有效，LRU淘汰；其后为跨进程持久化的LLM缓存）
+keyword_cache = LRUCache(KEYWORD_CACHE_MAX_ITEMS)
 
-# 初始化Chroma客户端（和原代码一致）
-client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
-collection = client.get_or_create_collection(
-    name=CHROMA_COLLECTION_NAME,
-    embedding_function=None,
-    metadata=CHROMA_COLLECTION_METADATA
-)
-
-def expand_query(question):
-    """查询扩展（LLM自动生成关键词）- 核心逻辑不变"""
-    prompt = f"""
+# 查询扩展Prompt模板（修改后LLM缓存中旧模板生成的关键词自动失效）
+KEYWORD_PROMPT_TEMPLATE = """
 请为以下建筑规范问题生成5个用于语义检索的关键词，
 只返回关键词，用空格分隔，不要解释。
 
@@ -35,46 +40,315 @@ def expand_query(question):
 {question}
 """
 
-    response = Generation.call(
-        model=GENERATION_MODEL,  # 替换为配置中的模型名
-        prompt=prompt,
-        temperature=QUERY_EXPAND_TEMPERATURE  # 替换为配置中的温度
-    )
+def generate_keywords(question, trace=None, deadline=None, cache=True):
+    """
+    LLM自动生成检索关键词（空格分隔的字符串，带缓存）
+    cache为False时不读写关键词缓存和LLM缓存（评估时测得真实的扩展调用耗时）
+    """
+    if cache:
+        keywords = keyword_cache.get(question)
+        if keywords is not None:
+            return keywords
 
-    keywords = response.output.text.strip()
+    prompt = KEYWORD_PROMPT_TEMPLATE.format(question=question)
+    keywords = cached_generation(
+        prompt, QUERY_EXPAND_TEMPERATURE, "expand_query", KEYWORD_PROMPT_TEMPLATE, trace, deadline, cache=cache
+    ).strip()
+    if cache:
+        keyword_cache.put(question, keywords)
+    return keywords
+
+def expand_query(question, trace=None, deadline=None):
+    """查询扩展（LLM自动生成关键词）- 核心逻辑不变"""
+    keywords = generate_keywords(question, trace, deadline)
     return question + " " + keywords
 
-def retrieve(question):
-    """检索相关条文 - 核心逻辑不变，仅替换硬编码参数"""
-    expanded_query = expand_query(question)
-    query_embedding = get_embedding(expanded_query)
-
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=RETRIEVE_N_RESULTS,  # 替换为配置中的初始检索条数
-        include=["documents", "metadatas", "distances"]
-    )
-
-    structured = []
-    for doc, metadata, distance in zip(
-        results["documents"][0],
-        results["metadatas"][0],
-        results["distances"][0]
+def _keywords_within_deadline(question, trace, deadline):
+    """生成扩展关键词；剩余预算不足或扩展调用超时时跳过扩展（返回空字符串）"""
+    if deadline is not None and not deadline.allows(DEADLINE_MIN_EXPANSION):
+        deadline.degrade("skip_expansion")
+        return ""
+    try:
+        with stage_timer(trace, "expand_query"):
+            return generate_keywords(question, trace, deadline)
+    except (DeadlineExceeded, RetryableDashScopeError):
+        if deadline is None:
+            raise
+        deadline.degrade("skip_expansion")
+        return ""
+
+def build_sub_queries(question, keywords):
+    """
+    多查询模式的子查询：原问题、关键词组合、每个关键词与原问题的组合
+    （去重后保持顺序，数量不超过单次TextEmbedding调用上限）
+    """
+    sub_queries = [question]
+    if keywords:
+        sub_queries.append(keywords)
+        sub_queries.extend(f"{question} {kw}" for kw in keywords.split())
+    return list(dict.fromkeys(sub_queries))[:EMBEDDING_BATCH_SIZE]
+
+def _parse_query_results(results, query_index=0):
+    """将collection.query的第query_index组结果转换为候选列表（按距离排序）"""
+    candidates = []
+    for chunk_id, doc, metadata, distance in zip(
+        results["ids"][query_index],
+        results["documents"][query_index],
+        results["metadatas"][query_index],
+        results["distances"][query_index]
     ):
         # 相似度计算（和原代码一致）
         similarity = 1 - distance if distance <= 1 else 0
-        # 替换阈值为配置中的值
-        if similarity < SIMILARITY_THRESHOLD:
-            continue
-        structured.append({
+        candidates.append({
+            "chunk_id": chunk_id,
+            "distance": distance,
             "similarity": similarity,
             "article_id": metadata.get("article_id"),
             "spec_name": metadata.get("spec_name"),
             "spec_abbr": metadata.get("spec_abbr"),
             "content": doc
         })
+    return candidates
+
+def vector_search(query_embedding, n_results=None, handle=None, routing=False, trace=None):
+    """
+    向量检索：返回按距离排序的全部候选（附相似度，未经阈值过滤）
+    Args:
+        query_embedding: 查询向量
+        n_results: 初始检索条数（默认使用配置中的值）
+        handle: 索引版本handle（默认使用当前生效版本）
+        routing: 是否先按规范/章质心路由，只在选中章内检索
+        trace: 可选的调试信息字典，路由时记录每个查询选中的章
+    """
+    return vector_search_multi([query_embedding], n_results, handle, routing, trace)[0]
+
+def vector_search_multi(query_embeddings, n_results=None, handle=None, routing=False, trace=None):
+    """
+    多个查询向量在一次collection.query（或一次质心路由检索）中检索，返回每个查询各自的候选列表
+    分片索引启用路由时按规范质心选出规范，只检索这些规范的分片（各查询选中规范的并集）
+    """
+    if n_results is None:
+        n_results = RETRIEVE_N_RESULTS
+    if handle is None:
+        handle = index_manager.current()
+
+    if routing and isinstance(handle.index, ShardedIndex):
+        router = handle.router.get()
+        spec_abbrs = sorted(set().union(*(router.route_specs(e, min_rows=n_results) for e in query_embeddings)))
+        if trace is not None:
+            trace["routed_specs"] = spec_abbrs
+        results = handle.index.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            include=["documents", "metadatas", "distances"],
+            spec_abbrs=spec_abbrs
+        )
+    elif routing:
+        results = handle.router.get().query(query_embeddings, n_results)
+        if trace is not None:
+            trace["routed_chapters"] = [[f"{spec}:{chapter}" for spec, chapter in routes] for routes in results["routes"]]
+    else:
+        results = handle.index.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            include=["documents", "metadatas", "distances"]
+        )
+    return [_parse_query_results(results, i) for i in range(len(query_embeddings))]
+
+def fuse_candidates(candidate_lists, method=None):
+    """
+    融合多个子查询的候选列表：
+    - rrf：倒数排名融合，fusion_score = Σ 1/(RRF_K + rank)
+    - max：取各子查询中的最大相似度
+    融合后每个chunk保留其最大相似度（用于阈值过滤和展示），按fusion_score降序返回
+    """
+    if method is None:
+        method = MULTI_QUERY_FUSION
+    if method not in ("rrf", "max"):
+        raise ValueError(f"不支持的融合方式：{method}（可选rrf/max）")
+
+    fused = {}
+    for candidates in candidate_lists:
+        for rank, item in enumerate(candidates, 1):
+            current = fused.get(item["chunk_id"])
+            if current is None:
+                current = dict(item, fusion_score=0.0)
+                fused[item["chunk_id"]] = current
+            elif item["similarity"] > current["similarity"]:
+                current.update(similarity=item["similarity"], distance=item["distance"])
+
+            if method == "rrf":
+                current["fusion_score"] += 1 / (RRF_K + rank)
+            else:
+                current["fusion_score"] = current["similarity"]
+
+    return sorted(fused.values(), key=lambda x: x["fusion_score"], reverse=True)
+
+def filter_candidates(candidates, similarity_threshold=None, top_k=None):
+    """按相似度阈值过滤候选并排序，返回前top_k条结构化条文"""
+    if similarity_threshold is None:
+        similarity_threshold = SIMILARITY_THRESHOLD
+    if top_k is None:
+        top_k = RETRIEVE_TOP_K
+
+    passed = [item for item in candidates if item["similarity"] >= similarity_threshold]
+    # 排序（和原代码一致；多查询融合结果按融合得分排序）
+    passed.sort(key=lambda x: x.get("fusion_score", x["similarity"]), reverse=True)
+
+    return [
+        {
+            "similarity": item["similarity"],
+            "article_id": item["article_id"],
+            "spec_name": item["spec_name"],
+            "spec_abbr": item["spec_abbr"],
+            "content": item["content"]
+        }
+        for item in passed[:top_k]
+    ]
+
+def mmr_rerank(candidates, similarity_threshold, top_k=None, mmr_lambda=None, handle=None):
+    """对通过阈值的候选做MMR去冗余，返回选中的top_k条候选（避免同一条文的多个切片/跨规范重复条文占满上下文）"""
+    if handle is None:
+        handle = index_manager.current()
+    if top_k is None:
+        top_k = RETRIEVE_TOP_K
+    if mmr_lambda is None:
+        mmr_lambda = MMR_LAMBDA
+
+    passed = [item for item in candidates if item["similarity"] >= similarity_threshold]
+    return mmr_select(passed, top_k, mmr_lambda, handle.embedding_matrix.get())
+
+def _search_single(question, trace, n_results, use_expansion, handle, deadline=None, routing=False):
+    """单查询模式：扩展后的问题作为一个向量检索"""
+    keywords = _keywords_within_deadline(question, trace, deadline) if use_expansion else ""
+    expanded_query = question + " " + keywords if keywords else question
+    with stage_timer(trace, "embedding"):
+        query_embedding = get_embedding(expanded_query, deadline)
+
+    with stage_timer(trace, "vector_search"):
+        candidates = vector_search(query_embedding, n_results, handle, routing, trace)
+
+    if trace is not None:
+        trace["expanded_query"] = expanded_query
+    return candidates
+
+def _search_multi(question, trace, n_results, use_expansion, handle, deadline=None, routing=False):
+    """多查询模式：子查询批量embedding（一次调用）+ 一次collection.query + 融合排序"""
+    keywords = _keywords_within_deadline(question, trace, deadline) if use_expansion else ""
+    sub_queries = build_sub_queries(question, keywords)
+
+    with stage_timer(trace, "embedding"):
+        query_embeddings = get_embeddings(sub_queries, deadline)
+    # 跳过生成失败的子查询向量
+    query_embeddings = [emb for emb in query_embeddings if emb]
+    if not query_embeddings:
+        return []
+
+    with stage_timer(trace, "vector_search"):
+        candidate_lists = vector_search_multi(query_embeddings, n_results, handle, routing, trace)
+    with stage_timer(trace, "fusion"):
+        candidates = fuse_candidates(candidate_lists)
+
+    if trace is not None:
+        trace["sub_queries"] = sub_queries
+    return candidates
+
+def _search_fallback(question, trace, n_results, handle, deadline, routing=False):
+    """
+    降级检索（不调用DashScope）：问题向量已缓存时直接向量检索，否则使用关键词倒排索引
+    依次查找单查询模式缓存的扩展查询向量（问题+已缓存的关键词）和多查询模式缓存的原问题向量
+    Returns:
+        (候选列表, 是否为关键词检索)
+    """
+    keywords = keyword_cache.get(question)
+    cache_keys = ([question + " " + keywords] if keywords else []) + [question]
+    query_embedding = next((embedding_cache[k] for k in cache_keys if embedding_cache.get(k)), None)
+    if query_embedding:
+        deadline.degrade("cached_retrieval")
+        with stage_timer(trace, "vector_search"):
+            return vector_search(query_embedding, n_results, handle, routing, trace), False
+
+    deadline.degrade("lexical_retrieval")
+    with stage_timer(trace, "lexical_search"):
+        return handle.lexical_index.get().search(question, n_results or RETRIEVE_N_RESULTS), True
+
+def retrieve(question, trace=None, n_results=None, top_k=None,
+             similarity_threshold=None, use_expansion=None, mode=None,
+             mmr=None, mmr_lambda=None, full_tables=None, routing=None, deadline=None):
+    """
+    检索相关条文 - 核心逻辑不变，检索参数可按次覆盖（默认使用配置中的值）
+    Args:
+        question: 用户问题
+        trace: 可选的调试信息字典，传入时记录扩展查询、各阶段耗时和全部候选条文
+        n_results: 初始检索条数（多查询模式下为每个子查询的检索条数）
+        top_k: 最终返回条数
+        similarity_threshold: 相似度阈值
+        use_expansion: 是否进行查询扩展
+        mode: 检索模式，single（扩展后单向量）或 multi（多子查询融合）
+        mmr: 是否启用MMR去冗余重排（启用时按MMR_FETCH_MULTIPLIER倍扩大初始检索条数）
+        mmr_lambda: MMR相关度权重（1为纯相关度，越小越强调多样性）
+        full_tables: 命中表格行时是否还原为完整表格（默认只返回命中的行，上下文更短）
+        routing: 是否先按规范/章质心路由到最相关的几章，只对这些章内的chunk计算相似度
+        deadline: 请求的延迟预算（Deadline）；预算不足时依次跳过查询扩展、改用缓存向量/关键词检索，
+                  所采取的降级记录在deadline.degradations中
+    """
+    if use_expansion is None:
+        use_expansion = QUERY_EXPANSION_ENABLED
+    if similarity_threshold is None:
+        similarity_threshold = SIMILARITY_THRESHOLD
+    if mode is None:
+        mode = RETRIEVE_MODE
+    if mmr is None:
+        mmr = MMR_ENABLED
+    if full_tables is None:
+        full_tables = RETRIEVE_FULL_TABLES
+    if routing is None:
+        routing = ROUTING_ENABLED
+    if mmr:
+        n_results = (n_results or RETRIEVE_N_RESULTS) * MMR_FETCH_MULTIPLIER
+
+    # 整个请求使用同一索引版本（检索期间发生热切换不影响本次请求）
+    handle = index_manager.current()
+    if trace is not None:
+        trace["index_version"] = handle.version
+
+    if mode not in ("single", "multi"):
+        raise ValueError(f"不支持的检索模式：{mode}（可选single/multi）")
+    search = _search_single if mode == "single" else _search_multi
+
+    lexical = False
+    if deadline is not None and not deadline.allows(DEADLINE_MIN_EMBEDDING):
+        candidates, lexical = _search_fallback(question, trace, n_results, handle, deadline, routing)
+    else:
+        try:
+            candidates = search(question, trace, n_results, use_expansion, handle, deadline, routing)
+        except (DeadlineExceeded, RetryableDashScopeError):
+            if deadline is None:
+                raise
+            candidates, lexical = _search_fallback(question, trace, n_results, handle, deadline, routing)
+    # 关键词得分与余弦相似度不可比，降级为关键词检索时不使用相似度阈值
+    if lexical:
+        similarity_threshold = 0
+
+    if trace is not None:
+        trace["candidates"] = [
+            {
+                "chunk_id": item["chunk_id"],
+                "article_id": item["article_id"],
+                "spec_abbr": item["spec_abbr"],
+                "distance": item["distance"],
+                "similarity": item["similarity"],
+                "passed_threshold": item["similarity"] >= similarity_threshold
+            }
+            for item in candidates
+        ]
+
+    if mmr:
+        with stage_timer(trace, "mmr"):
+            candidates = mmr_rerank(candidates, similarity_threshold, top_k, mmr_lambda, handle)
 
-    # 排序（和原代码一致）
-    structured.sort(key=lambda x: x["similarity"], reverse=True)
-    # 替换返回条数为配置中的值
-    return structured[:RETRIEVE_TOP_K]
\ No newline at end of file
+    docs = filter_candidates(candidates, similarity_threshold, top_k)
+    if full_tables:
+        with stage_timer(trace, "expand_tables"):
+            docs = expand_tables(docs, handle.table_rows.get())
+    return docs
@@ -0,0 +1,132 @@
+import logging
+from collections import defaultdict
+import numpy as np
+from config import ROUTING_TOP_SPECS, ROUTING_TOP_CHAPTERS
+from vector_store.versions import read_all
+
+# 日志
+logger = logging.getLogger(__name__)
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+class CentroidRouter:
+    """
+    两级质心路由：按(spec_abbr, chapter)分组，预先计算每个规范、每章chunk向量的归一化均值
+    查询先与规范质心比较选出前ROUTING_TOP_SPECS个规范，再在其中按章质心选出前ROUTING_TOP_CHAPTERS章，
+    只对这些章内的chunk计算相似度；单次检索的开销随章数和命中章的大小增长，而不是随全库条数增长
+    """
+    def __init__(self, embedding_matrix, ids, documents, metadatas):
+        self.matrix = embedding_matrix.matrix
+        self.ids = embedding_matrix.ids
+        self.documents = [None] * len(self.ids)
+        self.metadatas = [None] * len(self.ids)
+
+        group_rows = defaultdict(list)
+        self.groups_of_article = defaultdict(set)
+        for chunk_id, doc, metadata in zip(ids, documents, metadatas):
+            row = embedding_matrix.row_of.get(chunk_id)
+            if row is None:
+                continue
+            metadata = metadata or {}
+            self.documents[row] = doc
+            self.metadatas[row] = metadata
+            group = (metadata.get("spec_abbr"), metadata.get("chapter") or "")
+            group_rows[group].append(row)
+            self.groups_of_article[(metadata.get("spec_abbr"), metadata.get("article_id"))].add(group)
+
+        self.groups = sorted(group_rows, key=lambda g: (str(g[0]), str(g[1])))
+        self.group_index = {group: i for i, group in enumerate(self.groups)}
+        self.group_rows = [np.array(group_rows[g], dtype=np.int64) for g in self.groups]
+        self.specs = sorted({spec for spec, _ in self.groups}, key=str)
+        spec_index = {spec: i for i, spec in enumerate(self.specs)}
+        self.spec_of_group = np.array([spec_index[spec] for spec, _ in self.groups], dtype=np.int64)
+        self.spec_sizes = np.zeros(len(self.specs), dtype=np.int64)
+        for i, rows in zip(self.spec_of_group, self.group_rows):
+            self.spec_sizes[i] += len(rows)
+
+        dimension = self.matrix.shape[1] if self.matrix.size else 0
+        self.chapter_centroids = np.zeros((len(self.groups), dimension), dtype=np.float32)
+        for i, rows in enumerate(self.group_rows):
+            self.chapter_centroids[i] = self.matrix[rows].mean(axis=0)
+        self.spec_centroids = np.zeros((len(self.specs), dimension), dtype=np.float32)
+        for i, spec in enumerate(self.specs):
+            rows = np.concatenate([r for g, r in zip(self.groups, self.group_rows) if g[0] == spec])
+            self.spec_centroids[i] = self.matrix[rows].mean(axis=0)
+        if dimension:
+            self.chapter_centroids = _normalize(self.chapter_centroids)
+            self.spec_centroids = _normalize(self.spec_centroids)
+
+    def route_specs(self, query_embedding, top_specs=None, min_rows=0):
+        """
+        只按规范质心选出前top_specs个规范（按相似度降序），分片索引据此只检索选中规范的分片
+        选中规范的chunk总数不足min_rows时继续按相似度补充后续规范
+        """
+        if top_specs is None:
+            top_specs = ROUTING_TOP_SPECS
+        if not self.specs:
+            return []
+
+        selected, row_count = [], 0
+        for i in np.argsort(-(self.spec_centroids @ _normalize(query_embedding))):
+            if len(selected) >= top_specs and row_count >= min_rows:
+                break
+            selected.append(self.specs[i])
+            row_count += int(self.spec_sizes[i])
+        return selected
+
+    def route(self, query_embedding, top_specs=None, top_chapters=None, min_rows=0):
+        """
+        返回路由选中的章（[(spec_abbr, chapter)]，按质心相似度降序）
+        选中章的chunk总数不足min_rows时继续按相似度补充后续章，保证能返回足够的候选
+        """
+        if top_specs is None:
+            top_specs = ROUTING_TOP_SPECS
+        if top_chapters is None:
+            top_chapters = ROUTING_TOP_CHAPTERS
+        if not self.groups:
+            return []
+
+        query = _normalize(query_embedding)
+        spec_order = np.argsort(-(self.spec_centroids @ query))
+        allowed = np.zeros(len(self.specs), dtype=bool)
+        allowed[spec_order[:top_specs]] = True
+        chapter_scores = self.chapter_centroids @ query
+        # 未选中规范的章排在所有选中规范的章之后（仅在候选不足时补充）
+        order = sorted(range(len(self.groups)), key=lambda i: (not allowed[self.spec_of_group[i]], -chapter_scores[i]))
+
+        selected, row_count = [], 0
+        for i in order:
+            if len(selected) >= top_chapters and row_count >= min_rows:
+                break
+            selected.append(i)
+            row_count += len(self.group_rows[i])
+        return [self.groups[i] for i in selected]
+
+    def query(self, query_embeddings, n_results=10, top_specs=None, top_chapters=None):
+        """
+        路由后只在选中章内做余弦检索，返回与collection.query相同结构的结果（distance = 1 - 余弦相似度），
+        另附"routes"：每个查询路由到的章
+        """
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": [], "routes": []}
+        for query_embedding in query_embeddings:
+            routes = self.route(query_embedding, top_specs, top_chapters, min_rows=n_results)
+            rows = np.concatenate([self.group_rows[self.group_index[g]] for g in routes]) if routes else np.array([], dtype=np.int64)
+            sims = self.matrix[rows] @ _normalize(query_embedding) if len(rows) else np.array([], dtype=np.float32)
+            k = min(n_results, len(rows))
+            top = np.argpartition(-sims, k - 1)[:k] if k else np.array([], dtype=np.int64)
+            top = top[np.argsort(-sims[top])]
+            results["ids"].append([self.ids[rows[i]] for i in top])
+            results["documents"].append([self.documents[rows[i]] for i in top])
+            results["metadatas"].append([self.metadatas[rows[i]] for i in top])
+            results["distances"].append([float(1 - sims[i]) for i in top])
+            results["routes"].append(routes)
+        return results
+
+def load_router(index, embedding_matrix):
+    """从检索索引分页读取条文的规范/章节信息，基于内存向量矩阵计算质心（首次启用路由时加载一次）"""
+    ids, documents, metadatas = read_all(index, include=["documents", "metadatas"])
+    router = CentroidRouter(embedding_matrix, ids, documents, metadatas)
+    logger.info(f"已计算{len(router.specs)}个规范、{len(router.groups)}个章的质心")
+    return router
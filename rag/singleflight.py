@@ -0,0 +1,66 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class _Call:
+    """一次进行中的计算：结果/异常及完成事件"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class WaitTimeout(Exception):
+    """等待进行中的计算超时（该计算继续执行，结果仍交给其他等待者）"""
+
+class SingleFlight:
+    """
+    请求合并（single-flight）：相同key的并发调用只执行一次，
+    其余调用阻塞等待并共享同一结果（或同一异常）；计算完成后key立即释放，不做结果缓存
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, *args, wait_timeout=None, **kwargs):
+        """
+        执行func或等待进行中的同key计算；作为等待者时最多等待wait_timeout秒（None为不限），
+        超时抛出WaitTimeout
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            if not call.done.wait(wait_timeout):
+                with self._lock:
+                    call.waiters -= 1
+                raise WaitTimeout(f"等待进行中的计算超过{wait_timeout}秒（key：{key[:40]}）")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            if call.waiters:
+                logger.info(f"请求合并：{call.waiters}个并发请求共享同一次计算（key：{key[:40]}）")
+            call.done.set()
+        return call.result
+
+    def in_flight(self):
+        """当前进行中的计算数"""
+        with self._lock:
+            return len(self._calls)
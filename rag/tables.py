@@ -0,0 +1,38 @@
+import logging
+from collections import defaultdict
+from data_pipeline.table_chunker import reassemble_table
+from vector_store.versions import read_all
+
+# 日志
+logger = logging.getLogger(__name__)
+
+def load_table_rows(index):
+    """从检索索引读取全部表格行分组chunk：{(spec_abbr, article_id): [{"content", "row_start"}]}"""
+    tables = defaultdict(list)
+    _, documents, metadatas = read_all(index, include=["documents", "metadatas"])
+    for doc, metadata in zip(documents, metadatas):
+        if metadata and metadata.get("row_start") is not None:
+            tables[(metadata.get("spec_abbr"), metadata.get("article_id"))].append(
+                {"content": doc, "row_start": metadata["row_start"]}
+            )
+    logger.info(f"已加载{len(tables)}个表格的行分组")
+    return dict(tables)
+
+def expand_tables(docs, table_rows):
+    """
+    将命中的表格行替换为完整表格（同一表格只保留一条，位置取其最先出现的行，相似度取最大值）
+    不是表格行分组的条文原样保留
+    """
+    expanded, seen = [], {}
+    for item in docs:
+        key = (item["spec_abbr"], item["article_id"])
+        rows = table_rows.get(key)
+        if not rows:
+            expanded.append(item)
+            continue
+        if key in seen:
+            seen[key]["similarity"] = max(seen[key]["similarity"], item["similarity"])
+            continue
+        seen[key] = dict(item, content=reassemble_table(rows))
+        expanded.append(seen[key])
+    return expanded
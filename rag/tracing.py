@@ -0,0 +1,45 @@
+import cProfile
+import io
+import pstats
+import time
+from contextlib import contextmanager
+
+# cProfile摘要默认展示的函数条数
+PROFILE_TOP_N = 25
+
+
+@contextmanager
+def stage_timer(trace, stage):
+    """记录单个阶段的耗时（毫秒）到trace["timings"]；trace为None时不做任何记录"""
+    if trace is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        trace.setdefault("timings", {})[stage] = round(elapsed_ms, 2)
+
+
+def record_usage(trace, stage, response):
+    """记录DashScope响应中的token用量（input/output/total tokens）"""
+    if trace is None:
+        return
+    usage = getattr(response, "usage", None)
+    trace.setdefault("token_usage", {})[stage] = dict(usage) if usage else None
+
+
+def profile_call(func, *args, top_n=None, **kwargs):
+    """用cProfile运行函数，返回（函数结果, 按累计耗时排序的文本摘要）"""
+    if top_n is None:
+        top_n = PROFILE_TOP_N
+
+    profiler = cProfile.Profile()
+    result = profiler.runcall(func, *args, **kwargs)
+
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.strip_dirs().sort_stats("cumulative").print_stats(top_n)
+    return result, stream.getvalue()
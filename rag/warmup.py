@@ -0,0 +1,112 @@
+import argparse
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import EXAMPLES_PATH, WARMUP_TOP_N, WARMUP_CONCURRENCY
+from .normalize import normalize_question, request_key
+from .query_log import top_queries
+
+# 日志
+logger = logging.getLogger(__name__)
+
+def load_examples(examples_path=None):
+    """读取示例问题（每行一个，忽略空行）"""
+    if examples_path is None:
+        examples_path = EXAMPLES_PATH
+    if not os.path.exists(examples_path):
+        return []
+    with open(examples_path, 'r', encoding='utf-8') as f:
+        return [line for line in (normalize_question(line) for line in f) if line]
+
+def warmup_queries(top_n=None, examples_path=None):
+    """
+    预热回放的（问题, 检索参数）列表：查询日志中出现次数最多的前top_n个，加上示例问题（按默认参数）
+    归一化问题与参数都相同的只保留一个
+    """
+    if top_n is None:
+        top_n = WARMUP_TOP_N
+
+    queries = {}
+    for question, filters, _ in top_queries(top_n):
+        queries.setdefault(request_key(question, **filters), (question, filters))
+    for question in load_examples(examples_path):
+        queries.setdefault(request_key(question), (question, {}))
+    return list(queries.values())
+
+def warm_up(queries=None, concurrency=None):
+    """
+    以有界并发回放问题，填充嵌入、查询扩展关键词和回答缓存（回放请求不写入查询日志）
+    查询扩展和回答生成的结果同时写入持久化LLM缓存，单独运行时同一主机上的服务进程也能复用
+    单个问题失败只记录日志，不中断预热
+    Returns:
+        dict: {"total", "succeeded", "failed", "elapsed_ms"}
+    """
+    from .qa_chain import qa_chain
+
+    if queries is None:
+        queries = warmup_queries()
+    if concurrency is None:
+        concurrency = WARMUP_CONCURRENCY
+
+    def replay(query):
+        question, filters = query
+        try:
+            qa_chain(question, **filters)
+            return True
+        except Exception as e:
+            logger.error(f"预热失败（{question[:20]}...）：{e}")
+            return False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="warmup") as executor:
+        results = list(executor.map(replay, queries))
+    summary = {
+        "total": len(results),
+        "succeeded": sum(results),
+        "failed": len(results) - sum(results),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2)
+    }
+    logger.info(f"缓存预热完成：{summary}")
+    return summary
+
+class WarmupState:
+    """服务的预热状态：预热完成前副本不就绪；索引切换后在后台重新预热（不影响就绪状态）"""
+    def __init__(self):
+        self.ready = threading.Event()
+        self.last_summary = None
+        self._lock = threading.Lock()
+
+    def run(self):
+        """执行一次预热（同一时间只运行一个）；首次完成后标记就绪"""
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self.last_summary = warm_up()
+        except Exception as e:
+            logger.error(f"缓存预热异常：{e}")
+        finally:
+            self._lock.release()
+            self.ready.set()
+
+    def start(self):
+        """在后台线程中预热"""
+        threading.Thread(target=self.run, name="cache-warmup", daemon=True).start()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="回放高频历史问题与示例问题，预热缓存")
+    parser.add_argument("--top-n", type=int, default=WARMUP_TOP_N, help="回放查询日志中的前N个问题")
+    parser.add_argument("--concurrency", type=int, default=WARMUP_CONCURRENCY)
+    parser.add_argument("--list", action="store_true", help="只列出将要回放的问题")
+    args = parser.parse_args(argv)
+
+    queries = warmup_queries(args.top_n)
+    if args.list:
+        for question, filters in queries:
+            print(f"{question}  {filters or ''}")
+        return
+    print(warm_up(queries, args.concurrency))
+
+if __name__ == "__main__":
+    main()
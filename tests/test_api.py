@@ -0,0 +1,33 @@
+import threading
+from fastapi.testclient import TestClient
+import api
+from rag import warmup
+from rag.warmup import WarmupState
+
+
+class _Handle:
+    version = "test"
+
+
+def test_ready_returns_503_until_warmup_finishes(monkeypatch):
+    release = threading.Event()
+
+    def slow_warm_up():
+        release.wait(5)
+        return {"total": 1, "succeeded": 1, "failed": 0, "elapsed_ms": 1.0}
+
+    monkeypatch.setattr(warmup, "warm_up", slow_warm_up)
+    monkeypatch.setattr(api, "warmup_state", WarmupState())
+    monkeypatch.setattr(api.index_manager, "current", lambda: _Handle())
+    # 不进入lifespan：只测试就绪检查本身
+    client = TestClient(api.app)
+
+    api.warmup_state.start()
+    assert client.get("/ready").status_code == 503
+    assert client.get("/health").status_code == 200
+
+    release.set()
+    assert api.warmup_state.ready.wait(5)
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["warmup"]["succeeded"] == 1
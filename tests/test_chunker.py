@@ -0,0 +1,15 @@
+from concurrent.futures import ThreadPoolExecutor
+from data_pipeline.chunker import load_ingested_specs, register_ingested_spec
+
+
+def test_concurrent_registrations_are_all_kept(tmp_path):
+    registry_path = str(tmp_path / "ingested_specs.json")
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for i in range(32):
+            executor.submit(register_ingested_spec, f"规范{i}", f"spec_{i}.txt", f"spec_{i}", registry_path)
+
+    registry = load_ingested_specs(registry_path)
+    assert len(registry) == 32
+    assert registry["规范7"] == ("spec_7.txt", "spec_7")
+    assert [p.name for p in tmp_path.iterdir()] == ["ingested_specs.json"]
@@ -0,0 +1,233 @@
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from rag import dashscope_client
+from rag.dashscope_client import (
+    HedgeBudget,
+    LatencyTracker,
+    RetryableDashScopeError,
+    TokenBucket,
+    _HedgeCancelled,
+    _deadline_exhausted,
+    _send_hedged,
+    _send_once
+)
+from rag.deadline import Deadline, DeadlineExceeded
+
+
+def test_token_bucket_allows_burst_up_to_capacity():
+    bucket = TokenBucket(rate=1, capacity=5)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - start < 0.05
+
+
+def test_token_bucket_blocks_until_refilled():
+    bucket = TokenBucket(rate=20, capacity=1)
+    bucket.acquire()
+    start = time.monotonic()
+    bucket.acquire()
+    # 令牌耗尽后按rate补充，约1/20秒
+    assert 0.03 <= time.monotonic() - start < 0.5
+
+
+def test_token_bucket_refill_is_capped_at_capacity():
+    bucket = TokenBucket(rate=10, capacity=2)
+    # 空闲0.3秒可补充3个令牌，但最多保留capacity个
+    time.sleep(0.3)
+    bucket.acquire()
+    bucket.acquire()
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.05
+
+
+def test_token_bucket_gives_up_after_timeout():
+    bucket = TokenBucket(rate=1, capacity=1)
+    bucket.acquire()
+    start = time.monotonic()
+    assert bucket.acquire(timeout=0.05) is False
+    assert time.monotonic() - start < 0.5
+
+
+def test_send_raises_when_concurrency_slot_not_free_within_deadline(monkeypatch):
+    concurrency = threading.BoundedSemaphore(1)
+    concurrency.acquire()
+    monkeypatch.setattr(dashscope_client, "_concurrency", concurrency)
+
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        _send_once(None, "test-model", 10, Deadline(0.1))
+    assert time.monotonic() - start < 1
+
+
+def test_retry_stops_when_next_backoff_exceeds_remaining_budget():
+    deadline = Deadline(3)
+    # 第1次退避2秒（RETRY_WAIT_MIN），第3次退避4秒
+    assert not _deadline_exhausted(SimpleNamespace(kwargs={"deadline": deadline}, attempt_number=1))
+    assert _deadline_exhausted(SimpleNamespace(kwargs={"deadline": deadline}, attempt_number=3))
+    assert not _deadline_exhausted(SimpleNamespace(kwargs={}, attempt_number=3))
+
+
+def test_latency_percentile_uses_nearest_rank_after_min_samples(monkeypatch):
+    monkeypatch.setattr(dashscope_client, "DASHSCOPE_HEDGE_MIN_SAMPLES", 20)
+    tracker = LatencyTracker(window=100)
+    for i in range(1, 20):
+        tracker.record(i / 100)
+    assert tracker.percentile(95) is None
+
+    tracker.record(0.20)
+    assert tracker.percentile(95) == 0.19
+    assert tracker.percentile(50) == 0.10
+    assert tracker.percentile(100) == 0.20
+
+
+def test_latency_window_keeps_recent_samples(monkeypatch):
+    monkeypatch.setattr(dashscope_client, "DASHSCOPE_HEDGE_MIN_SAMPLES", 1)
+    tracker = LatencyTracker(window=2)
+    for seconds in [5.0, 0.1, 0.2]:
+        tracker.record(seconds)
+    assert tracker.percentile(100) == 0.2
+
+
+def test_hedge_budget_allows_ratio_of_calls_up_to_capacity():
+    budget = HedgeBudget(ratio=0.5, capacity=2)
+    assert not budget.try_acquire()
+
+    budget.record_call()
+    budget.record_call()
+    assert budget.try_acquire()
+    assert not budget.try_acquire()
+
+    for _ in range(10):
+        budget.record_call()
+    assert budget.try_acquire()
+    assert budget.try_acquire()
+    assert not budget.try_acquire()
+
+
+def test_cancelled_attempt_is_not_sent():
+    cancelled = threading.Event()
+    cancelled.set()
+    # api为None：若请求真的发出会抛AttributeError
+    with pytest.raises(_HedgeCancelled):
+        _send_once(None, "test-model", 10, cancelled=cancelled)
+
+
+# 对冲测试中近期延迟的分位数（所有样本相同）
+HEDGE_DELAY = 0.1
+
+
+@pytest.fixture
+def hedging(monkeypatch):
+    """
+    以假的_send_once执行对冲：attempts[i](cancelled)为第i次请求的行为，
+    返回的calls记录每次请求的发出时间和取消标志
+    """
+    tracker = LatencyTracker(window=100)
+    for _ in range(dashscope_client.DASHSCOPE_HEDGE_MIN_SAMPLES):
+        tracker.record(HEDGE_DELAY)
+    monkeypatch.setattr(dashscope_client, "_latencies", {"test-model": tracker})
+    monkeypatch.setattr(dashscope_client, "_hedge_budget", HedgeBudget(ratio=1, capacity=5))
+    monkeypatch.setattr(dashscope_client, "_hedge_counts", {"calls": 0, "hedged": 0, "hedge_won": 0})
+    monkeypatch.setattr(dashscope_client, "DASHSCOPE_HEDGE_MIN_DELAY", 0)
+
+    calls = []
+    attempts = []
+
+    def fake_send_once(api, model, timeout, deadline=None, cancelled=None, **kwargs):
+        calls.append((time.monotonic(), cancelled))
+        return attempts[len(calls) - 1](cancelled)
+
+    monkeypatch.setattr(dashscope_client, "_send_once", fake_send_once)
+    return calls, attempts
+
+
+def test_no_hedge_when_primary_returns_before_delay(hedging):
+    calls, attempts = hedging
+    attempts.append(lambda cancelled: "primary")
+
+    assert _send_hedged(None, "test-model", 10) == "primary"
+    assert len(calls) == 1
+    assert dashscope_client.hedge_stats() == {"calls": 1, "hedged": 0, "hedge_won": 0}
+
+
+def test_hedge_is_sent_after_percentile_delay_and_loser_is_cancelled(hedging):
+    calls, attempts = hedging
+    release = threading.Event()
+    attempts.append(lambda cancelled: release.wait(5) and "primary")
+    attempts.append(lambda cancelled: "hedge")
+
+    start = time.monotonic()
+    try:
+        assert _send_hedged(None, "test-model", 10) == "hedge"
+    finally:
+        release.set()
+
+    assert len(calls) == 2
+    assert calls[1][0] - start >= HEDGE_DELAY
+    # 落败的首个请求被标记取消
+    assert calls[0][1].is_set()
+    assert not calls[1][1].is_set()
+    assert dashscope_client.hedge_stats() == {"calls": 1, "hedged": 1, "hedge_won": 1}
+
+
+def test_no_hedge_when_budget_is_exhausted(hedging, monkeypatch):
+    calls, attempts = hedging
+    monkeypatch.setattr(dashscope_client, "_hedge_budget", HedgeBudget(ratio=0, capacity=5))
+    attempts.append(lambda cancelled: time.sleep(HEDGE_DELAY * 2) or "primary")
+
+    assert _send_hedged(None, "test-model", 10) == "primary"
+    assert len(calls) == 1
+    assert dashscope_client.hedge_stats()["hedged"] == 0
+
+
+def test_hedge_result_is_used_when_primary_fails(hedging):
+    calls, attempts = hedging
+    hedge_sent = threading.Event()
+
+    def primary(cancelled):
+        hedge_sent.wait(5)
+        raise RetryableDashScopeError("primary failed")
+
+    def hedge(cancelled):
+        hedge_sent.set()
+        time.sleep(0.05)
+        return "hedge"
+
+    attempts.extend([primary, hedge])
+    assert _send_hedged(None, "test-model", 10) == "hedge"
+    assert dashscope_client.hedge_stats()["hedge_won"] == 1
+
+
+def test_primary_result_is_used_when_hedge_fails(hedging):
+    calls, attempts = hedging
+    hedge_failed = threading.Event()
+
+    def hedge(cancelled):
+        hedge_failed.set()
+        raise RetryableDashScopeError("hedge failed")
+
+    attempts.extend([lambda cancelled: hedge_failed.wait(5) and "primary", hedge])
+    assert _send_hedged(None, "test-model", 10) == "primary"
+    assert dashscope_client.hedge_stats() == {"calls": 1, "hedged": 1, "hedge_won": 0}
+
+
+def test_error_is_raised_when_both_attempts_fail(hedging):
+    calls, attempts = hedging
+    hedge_failed = threading.Event()
+
+    def primary(cancelled):
+        hedge_failed.wait(5)
+        raise RetryableDashScopeError("primary failed")
+
+    def hedge(cancelled):
+        hedge_failed.set()
+        raise RetryableDashScopeError("hedge failed")
+
+    attempts.extend([primary, hedge])
+    with pytest.raises(RetryableDashScopeError):
+        _send_hedged(None, "test-model", 10)
+    assert len(calls) == 2
@@ -0,0 +1,34 @@
+import subprocess
+import sys
+import numpy as np
+from config import PROJECT_ROOT
+from evaluation.fake_dashscope import fake_embedding
+
+
+def _cosine(a, b):
+    a, b = np.asarray(a), np.asarray(b)
+    return float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+def test_fake_embedding_is_deterministic():
+    assert fake_embedding("疏散楼梯的净宽度") == fake_embedding("疏散楼梯的净宽度")
+
+
+def test_texts_sharing_terms_are_more_similar():
+    query = fake_embedding("住宅疏散楼梯的净宽度要求")
+    related = fake_embedding("住宅建筑疏散楼梯的净宽度不应小于1.10m")
+    unrelated = fake_embedding("汽车库的防火分区最大允许建筑面积")
+
+    assert _cosine(query, related) > 0.5
+    assert _cosine(query, related) > _cosine(query, unrelated) + 0.3
+
+
+def test_fake_server_and_load_test_do_not_import_rag():
+    # 新进程中导入，避免受本进程其他测试已加载模块的影响
+    code = (
+        "import sys, evaluation.fake_dashscope, evaluation.load_test; "
+        "print([m for m in sys.modules if m.split('.')[0] in ('rag', 'vector_store', 'dashscope')])"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True)
+
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,66 @@
+import os
+import sys
+import pytest
+import vector_store.ingest as ingest
+from config import SPEC_FILES
+from vector_store.ingest import IngestJobManager
+
+# data_pipeline包导出了同名的chunker函数，需从sys.modules取模块本身
+chunker = sys.modules["data_pipeline.chunker"]
+
+SPEC_TEXT = "1 总则\n1.0.1 为规范测试制定本规范。\n1.0.2 本规范适用于测试。\n"
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, "PROCESSED_SPECS_DIR", str(tmp_path / "processed"))
+    monkeypatch.setattr(chunker, "INGESTED_SPECS_PATH", str(tmp_path / "ingested_specs.json"))
+    monkeypatch.setattr(IngestJobManager, "_embed", lambda self, job, chunks: [[1.0, 0.0]] * len(chunks))
+    return IngestJobManager(max_workers=1)
+
+
+def _job(manager):
+    job = manager.submit("测试规范", "cs", SPEC_TEXT)
+    return manager._jobs[job["job_id"]]
+
+
+def test_submit_rejects_builtin_name_and_abbr(manager):
+    name, (_, abbr) = next(iter(SPEC_FILES.items()))
+    with pytest.raises(ValueError):
+        manager.submit(name, "new_abbr", SPEC_TEXT)
+    with pytest.raises(ValueError):
+        manager.submit("新规范", abbr, SPEC_TEXT)
+
+
+def test_submit_rejects_abbr_of_other_ingested_spec(manager):
+    chunker.register_ingested_spec("已上传规范", "x.txt", "ysc")
+    with pytest.raises(ValueError):
+        manager.submit("另一规范", "ysc", SPEC_TEXT)
+    manager.submit("已上传规范", "ysc", SPEC_TEXT)
+
+
+def test_failed_upsert_leaves_no_file_or_registration(manager, monkeypatch):
+    def failing_upsert(self, job, chunks, embeddings):
+        raise RuntimeError("publish failed")
+    monkeypatch.setattr(IngestJobManager, "_upsert", failing_upsert)
+    manager._executor.submit = lambda *args, **kwargs: None
+
+    job = _job(manager)
+    manager._run(job, SPEC_TEXT, {})
+
+    assert job["status"] == "failed"
+    assert os.listdir(ingest.PROCESSED_SPECS_DIR) == []
+    assert chunker.load_ingested_specs() == {}
+
+
+def test_successful_upsert_renames_and_registers(manager, monkeypatch):
+    monkeypatch.setattr(IngestJobManager, "_upsert", lambda self, job, chunks, embeddings: "v1")
+    manager._executor.submit = lambda *args, **kwargs: None
+
+    job = _job(manager)
+    manager._run(job, SPEC_TEXT, {})
+
+    file_path = os.path.join(ingest.PROCESSED_SPECS_DIR, "测试规范.txt")
+    assert job["status"] == "succeeded"
+    assert os.listdir(ingest.PROCESSED_SPECS_DIR) == ["测试规范.txt"]
+    assert chunker.load_ingested_specs() == {"测试规范": (file_path, "cs")}
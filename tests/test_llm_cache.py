@@ -0,0 +1,57 @@
+import sys
+from types import SimpleNamespace
+from rag.llm_cache import LLMCache, cache_key, cached_generation
+
+llm_cache_module = sys.modules["rag.llm_cache"]
+
+
+def test_stale_namespace_is_purged_on_first_lookup(tmp_path):
+    path = str(tmp_path / "llm_cache.sqlite3")
+    old_process = LLMCache(path, max_entries=100)
+    old_process.put(cache_key("m", 0.1, "旧模板"), "generate", "m|v1", "旧回答")
+    old_process.put(cache_key("m", 0.1, "扩展"), "expand_query", "m|v1", "关键词")
+
+    # 模板更新后的新进程：只读不写也会清除该阶段旧模板的记录，其他阶段不受影响
+    new_process = LLMCache(path, max_entries=100)
+    assert new_process.get(cache_key("m", 0.1, "新模板"), "generate", "m|v2") is None
+
+    assert new_process.stats() == [{"stage": "expand_query", "namespace": "m|v1", "count": 1}]
+
+
+def test_hit_returns_text_and_usage(tmp_path):
+    cache = LLMCache(str(tmp_path / "llm_cache.sqlite3"), max_entries=100)
+    key = cache_key("m", 0.1, "prompt")
+    cache.put(key, "generate", "m|v1", "回答", {"input_tokens": 3})
+
+    assert cache.get(key, "generate", "m|v1") == ("回答", {"input_tokens": 3})
+
+
+def test_eviction_keeps_most_recently_used(tmp_path):
+    cache = LLMCache(str(tmp_path / "llm_cache.sqlite3"), max_entries=10)
+    keys = [cache_key("m", 0.1, f"prompt-{i}") for i in range(11)]
+    for key in keys:
+        cache.put(key, "generate", "m|v1", "回答")
+
+    assert sum(row["count"] for row in cache.stats()) == 9
+    assert cache.get(keys[0]) is None
+    assert cache.get(keys[-1]) is not None
+
+
+def test_uncached_generation_bypasses_cache(tmp_path, monkeypatch):
+    cache = LLMCache(str(tmp_path / "llm_cache.sqlite3"), max_entries=100)
+    monkeypatch.setattr(llm_cache_module, "llm_cache", cache)
+    monkeypatch.setattr(llm_cache_module, "LLM_CACHE_ENABLED", True)
+    calls = []
+
+    def fake_call_generation(prompt, temperature, model, deadline=None):
+        calls.append(prompt)
+        return SimpleNamespace(output=SimpleNamespace(text=f"回答{len(calls)}"), usage=None)
+
+    monkeypatch.setattr(llm_cache_module, "call_generation", fake_call_generation)
+
+    assert cached_generation("prompt", 0.1, "generate", "模板", model="m") == "回答1"
+    assert cached_generation("prompt", 0.1, "generate", "模板", model="m") == "回答1"
+    # 不读取已缓存的结果，也不写入新结果
+    assert cached_generation("prompt", 0.1, "generate", "模板", model="m", cache=False) == "回答2"
+    assert cached_generation("prompt", 0.1, "generate", "模板", model="m") == "回答1"
+    assert len(calls) == 2
@@ -0,0 +1,39 @@
+from rag.mmr import EmbeddingMatrix, mmr_select
+
+
+def _candidate(chunk_id, similarity):
+    return {"chunk_id": chunk_id, "similarity": similarity}
+
+
+MATRIX = EmbeddingMatrix(["a", "a2", "b"], [[1, 0], [1, 0.01], [0, 1]])
+
+
+def test_mmr_skips_near_duplicate_of_selected_candidate():
+    candidates = [_candidate("a", 0.9), _candidate("a2", 0.89), _candidate("b", 0.7)]
+
+    selected = mmr_select(candidates, top_k=2, mmr_lambda=0.5, embedding_matrix=MATRIX)
+
+    assert [item["chunk_id"] for item in selected] == ["a", "b"]
+
+
+def test_mmr_with_lambda_one_keeps_relevance_order():
+    candidates = [_candidate("b", 0.7), _candidate("a", 0.9), _candidate("a2", 0.89)]
+
+    selected = mmr_select(candidates, top_k=3, mmr_lambda=1.0, embedding_matrix=MATRIX)
+
+    assert [item["chunk_id"] for item in selected] == ["a", "a2", "b"]
+
+
+def test_candidates_missing_from_matrix_are_not_redundant():
+    candidates = [_candidate("a", 0.9), _candidate("a2", 0.89), _candidate("unknown", 0.5)]
+
+    selected = mmr_select(candidates, top_k=2, mmr_lambda=0.5, embedding_matrix=MATRIX)
+
+    assert [item["chunk_id"] for item in selected] == ["a", "unknown"]
+
+
+def test_top_k_bounds_selection():
+    candidates = [_candidate("a", 0.9), _candidate("b", 0.7)]
+
+    assert mmr_select(candidates, top_k=0, mmr_lambda=0.5, embedding_matrix=MATRIX) == []
+    assert len(mmr_select(candidates, top_k=5, mmr_lambda=0.5, embedding_matrix=MATRIX)) == 2
@@ -0,0 +1,69 @@
+import pytest
+from data_pipeline import pipeline
+from data_pipeline.pipeline import resolve_order, run_pipeline, stage_fingerprint
+
+
+def test_resolve_order_expands_dependencies_once():
+    assert resolve_order(["index"]) == ["chunk", "sanitize", "validate", "index"]
+    assert resolve_order(["validate", "sanitize"]) == ["chunk", "validate", "sanitize"]
+
+
+def test_resolve_order_rejects_unknown_stage_and_cycles(monkeypatch):
+    with pytest.raises(ValueError, match="未知阶段"):
+        resolve_order(["deploy"])
+
+    monkeypatch.setitem(pipeline.STAGES, "a", {"deps": ["b"]})
+    monkeypatch.setitem(pipeline.STAGES, "b", {"deps": ["a"]})
+    with pytest.raises(ValueError, match="环"):
+        resolve_order(["a"])
+
+
+@pytest.fixture
+def copy_stage(tmp_path, monkeypatch):
+    """单个测试阶段：将input.txt复制为output.txt，params可在测试中修改"""
+    source, target = tmp_path / "input.txt", tmp_path / "output.txt"
+    source.write_text("v1", encoding="utf-8")
+    params = {"mode": "copy"}
+    runs = []
+
+    def run():
+        runs.append(1)
+        target.write_text(source.read_text(encoding="utf-8"), encoding="utf-8")
+
+    monkeypatch.setitem(pipeline.STAGES, "copy", {
+        "deps": [],
+        "inputs": lambda: [str(source)],
+        "params": lambda: dict(params),
+        "code": ["data_pipeline/pipeline.py"],
+        "outputs": lambda: [str(target)],
+        "run": run
+    })
+    return source, target, params, runs, str(tmp_path / "state.json")
+
+
+def test_fingerprint_changes_with_inputs_and_params(copy_stage):
+    source, _, params, _, _ = copy_stage
+    original = stage_fingerprint("copy")
+
+    source.write_text("v2", encoding="utf-8")
+    changed_input = stage_fingerprint("copy")
+    params["mode"] = "move"
+
+    assert changed_input != original
+    assert stage_fingerprint("copy") not in (original, changed_input)
+
+
+def test_unchanged_stage_is_skipped_until_input_or_output_changes(copy_stage):
+    source, target, _, runs, state_path = copy_stage
+
+    assert run_pipeline(["copy"], state_path=state_path) == {"copy": "ran"}
+    assert run_pipeline(["copy"], state_path=state_path) == {"copy": "skipped"}
+
+    target.write_text("edited", encoding="utf-8")
+    assert run_pipeline(["copy"], state_path=state_path) == {"copy": "ran"}
+
+    source.write_text("v2", encoding="utf-8")
+    assert run_pipeline(["copy"], dry_run=True, state_path=state_path) == {"copy": "pending"}
+    assert run_pipeline(["copy"], force=False, state_path=state_path) == {"copy": "ran"}
+    assert run_pipeline(["copy"], force=True, state_path=state_path) == {"copy": "ran"}
+    assert len(runs) == 4
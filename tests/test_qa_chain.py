@@ -0,0 +1,61 @@
+import sys
+import threading
+import time
+import pytest
+from rag.deadline import Deadline
+from rag.qa_chain import qa_chain
+
+# rag包导出了同名的qa_chain函数，需从sys.modules取模块本身
+qa_chain_module = sys.modules["rag.qa_chain"]
+
+
+class _Handle:
+    version = "test"
+
+
+@pytest.fixture
+def slow_chain(monkeypatch):
+    """记录每次实际计算所用预算的慢速问答计算（模拟上游调用耗时，便于并发请求合并）"""
+    budgets = []
+
+    def run(question, trace=None, deadline=None, **retrieve_options):
+        budgets.append(deadline.budget)
+        time.sleep(0.2)
+        if deadline.budget < 1:
+            deadline.degrade("references_only")
+        return f"answer-{deadline.budget}", [], deadline.degradations
+
+    monkeypatch.setattr(qa_chain_module.index_manager, "current", lambda: _Handle())
+    monkeypatch.setattr(qa_chain_module, "_run_qa_chain", run)
+    monkeypatch.setattr(qa_chain_module, "ANSWER_CACHE_ENABLED", False)
+    monkeypatch.setattr(qa_chain_module, "QA_SINGLE_FLIGHT_ENABLED", True)
+    return budgets
+
+
+def _concurrent(budgets):
+    answers = [None] * len(budgets)
+
+    def ask(i):
+        answers[i] = qa_chain("防火间距", deadline=Deadline(budgets[i]))[0]
+
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(len(budgets))]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join()
+    return answers
+
+
+def test_short_budget_leader_does_not_answer_long_budget_follower(slow_chain):
+    answers = _concurrent([0.5, 20])
+
+    assert sorted(slow_chain) == [0.5, 20]
+    assert answers == ["answer-0.5", "answer-20"]
+
+
+def test_requests_with_similar_budgets_share_one_computation(slow_chain):
+    answers = _concurrent([20, 19])
+
+    assert slow_chain == [20]
+    assert answers == ["answer-20", "answer-20"]
@@ -0,0 +1,34 @@
+import os
+import pytest
+from rag import query_log
+from rag.query_log import log_files, log_query, top_queries
+
+
+@pytest.fixture
+def log_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "query_log.jsonl")
+    monkeypatch.setattr(query_log, "QUERY_LOG_PATH", path)
+    monkeypatch.setattr(query_log, "QUERY_LOG_ENABLED", True)
+    monkeypatch.setattr(query_log, "QUERY_LOG_MAX_BYTES", 300)
+    monkeypatch.setattr(query_log, "QUERY_LOG_BACKUPS", 2)
+    return path
+
+
+def test_log_rotates_and_keeps_bounded_backups(log_path):
+    for i in range(50):
+        log_query(f"问题{i}", latency_ms=i)
+
+    assert [os.path.basename(p) for p in log_files()] == ["query_log.jsonl.2", "query_log.jsonl.1", "query_log.jsonl"]
+    assert not os.path.exists(f"{log_path}.3")
+    # 每个文件超过上限后才轮转，写入前不超过上限
+    assert all(os.path.getsize(p) < 300 + 200 for p in log_files())
+
+
+def test_top_queries_counts_across_rotated_files(log_path):
+    for _ in range(6):
+        log_query("防火间距是多少")
+    for _ in range(3):
+        log_query("楼梯宽度", filters={"top_k": 3})
+
+    assert len(log_files()) > 1
+    assert top_queries(2) == [("防火间距是多少", {}, 6), ("楼梯宽度", {"top_k": 3}, 3)]
@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+import rag.embedding as embedding
+import rag.retriever as retriever
+from config import RRF_K, EMBEDDING_DIMENSION
+from rag.deadline import Deadline
+from rag.index_manager import IndexHandle
+from rag.retriever import fuse_candidates, retrieve
+from vector_store.snapshot import SnapshotIndex, write_snapshot
+
+
+def _candidate(chunk_id, similarity):
+    return {"chunk_id": chunk_id, "similarity": similarity, "distance": 1 - similarity}
+
+
+def test_rrf_sums_reciprocal_ranks_across_sub_queries():
+    fused = fuse_candidates([
+        [_candidate("a", 0.9), _candidate("b", 0.8)],
+        [_candidate("b", 0.85), _candidate("c", 0.7)]
+    ], method="rrf")
+
+    scores = {item["chunk_id"]: item["fusion_score"] for item in fused}
+    assert scores["b"] == pytest.approx(1 / (RRF_K + 2) + 1 / (RRF_K + 1))
+    assert scores["a"] == pytest.approx(1 / (RRF_K + 1))
+    assert [item["chunk_id"] for item in fused] == ["b", "a", "c"]
+
+
+def test_fusion_keeps_max_similarity_per_chunk():
+    fused = fuse_candidates([[_candidate("a", 0.6)], [_candidate("a", 0.9)]], method="rrf")
+
+    assert len(fused) == 1
+    assert fused[0]["similarity"] == 0.9
+    assert fused[0]["distance"] == pytest.approx(0.1)
+
+
+def test_max_fusion_orders_by_best_similarity():
+    fused = fuse_candidates([
+        [_candidate("a", 0.7), _candidate("b", 0.5)],
+        [_candidate("b", 0.95)]
+    ], method="max")
+
+    assert [item["chunk_id"] for item in fused] == ["b", "a"]
+    assert fused[0]["fusion_score"] == 0.95
+
+
+def test_unknown_fusion_method_is_rejected():
+    with pytest.raises(ValueError):
+        fuse_candidates([], method="sum")
+
+
+class _EmbeddingResponse:
+    def __init__(self, texts):
+        texts = [texts] if isinstance(texts, str) else texts
+        self.output = {"embeddings": [
+            {"text_index": i, "embedding": [1.0] + [0.0] * (EMBEDDING_DIMENSION - 1)} for i in range(len(texts))
+        ]}
+
+
+@pytest.fixture
+def warm_handle(tmp_path, monkeypatch):
+    """单条条文的快照索引 + 不调用DashScope的embedding/关键词生成"""
+    vector = np.zeros((1, EMBEDDING_DIMENSION), dtype=np.float32)
+    vector[0, 0] = 1
+    write_snapshot(str(tmp_path / "snapshot"), ["a1"], vector, ["doc-a1"], [{"spec_abbr": "a", "article_id": "1"}])
+    handle = IndexHandle("test", SnapshotIndex(str(tmp_path / "snapshot")))
+    monkeypatch.setattr(retriever.index_manager, "current", lambda: handle)
+    monkeypatch.setattr(embedding, "call_embedding", lambda texts, deadline=None: _EmbeddingResponse(texts))
+    monkeypatch.setattr(retriever, "cached_generation", lambda *args, **kwargs: "关键词一 关键词二")
+    embedding.embedding_cache.clear()
+    retriever.keyword_cache.clear()
+    yield handle
+    embedding.embedding_cache.clear()
+    retriever.keyword_cache.clear()
+
+
+@pytest.mark.parametrize("mode", ["single", "multi"])
+def test_warm_question_under_tight_budget_uses_cached_embedding(warm_handle, mode):
+    options = dict(mode=mode, use_expansion=True, mmr=False, routing=False, full_tables=False, similarity_threshold=0)
+    retrieve("防火间距", **options)
+
+    deadline = Deadline(0.5)
+    docs = retrieve("防火间距", deadline=deadline, **options)
+
+    assert deadline.degradations == ["cached_retrieval"]
+    assert [(doc["spec_abbr"], doc["article_id"]) for doc in docs] == [("a", "1")]
+
+
+def test_uncached_keywords_bypass_keyword_cache(monkeypatch):
+    calls = []
+
+    def fake_generation(*args, cache=True, **kwargs):
+        calls.append(cache)
+        return f"关键词{len(calls)}"
+
+    monkeypatch.setattr(retriever, "cached_generation", fake_generation)
+    monkeypatch.setattr(retriever, "keyword_cache", retriever.LRUCache(2))
+
+    assert retriever.generate_keywords("问题") == "关键词1"
+    assert retriever.generate_keywords("问题") == "关键词1"
+    assert retriever.generate_keywords("问题", cache=False) == "关键词2"
+    assert calls == [True, False]
+    assert retriever.keyword_cache.get("问题") == "关键词1"
+
+    for question in ["问题a", "问题b"]:
+        retriever.generate_keywords(question)
+    assert len(retriever.keyword_cache) == 2
+    assert retriever.keyword_cache.get("问题") is None
@@ -0,0 +1,53 @@
+import numpy as np
+from rag.mmr import EmbeddingMatrix
+from rag.routing import CentroidRouter
+from vector_store.snapshot import SnapshotIndex, write_snapshot
+
+# 两个规范、三章：(a,1)、(a,2)各2条，(b,1)1条
+IDS = ["a1_1", "a1_2", "a2_1", "a2_2", "b1_1"]
+VECTORS = [[1, 0, 0], [0.9, 0.1, 0], [0, 1, 0], [0.1, 0.9, 0], [0, 0, 1]]
+METADATAS = [
+    {"spec_abbr": "a", "chapter": "1"}, {"spec_abbr": "a", "chapter": "1"},
+    {"spec_abbr": "a", "chapter": "2"}, {"spec_abbr": "a", "chapter": "2"},
+    {"spec_abbr": "b", "chapter": "1"}
+]
+
+
+def _router():
+    return CentroidRouter(EmbeddingMatrix(IDS, VECTORS), IDS, [f"doc-{i}" for i in IDS], METADATAS)
+
+
+def test_route_picks_closest_chapter_of_closest_spec():
+    assert _router().route([1, 0.05, 0], top_specs=1, top_chapters=1) == [("a", "1")]
+    assert _router().route([0, 0.1, 1], top_specs=1, top_chapters=1) == [("b", "1")]
+
+
+def test_route_adds_chapters_until_min_rows_is_reached():
+    routes = _router().route([1, 0.05, 0], top_specs=1, top_chapters=1, min_rows=3)
+
+    assert routes == [("a", "1"), ("a", "2")]
+
+
+def test_route_falls_back_to_unselected_specs_when_candidates_are_short():
+    routes = _router().route([1, 0.05, 0], top_specs=1, top_chapters=1, min_rows=5)
+
+    # 选中规范的章全部用完后才补充其他规范的章
+    assert routes == [("a", "1"), ("a", "2"), ("b", "1")]
+
+
+def test_routing_to_all_chapters_matches_full_search(tmp_path):
+    write_snapshot(str(tmp_path / "snapshot"), IDS, np.array(VECTORS, dtype=np.float32),
+                   [f"doc-{i}" for i in IDS], METADATAS)
+    full = SnapshotIndex(str(tmp_path / "snapshot"))
+    query = [[0.6, 0.5, 0.2]]
+
+    routed = _router().query(query, n_results=4, top_specs=2, top_chapters=3)
+    expected = full.query(query, n_results=4)
+
+    assert routed["ids"] == expected["ids"]
+    np.testing.assert_allclose(routed["distances"], expected["distances"], atol=1e-6)
+
+
+def test_route_specs_adds_specs_until_min_rows_is_reached():
+    assert _router().route_specs([0, 0.1, 1], top_specs=1) == ["b"]
+    assert _router().route_specs([0, 0.1, 1], top_specs=1, min_rows=3) == ["b", "a"]
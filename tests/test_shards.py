@@ -0,0 +1,92 @@
+import numpy as np
+from vector_store.shards import ShardedIndex
+from vector_store.snapshot import write_snapshot
+
+
+def _sharded_index(tmp_path, shards):
+    """shards: {spec_abbr: [(chunk_id, 向量)]}，每个规范写成一个快照分片"""
+    registry = {}
+    for abbr, rows in shards.items():
+        location = str(tmp_path / abbr)
+        write_snapshot(location, [r[0] for r in rows], np.array([r[1] for r in rows], dtype=np.float32),
+                       [f"doc-{r[0]}" for r in rows], [{"spec_abbr": abbr} for _ in rows])
+        registry[abbr] = {"backend": "snapshot", "location": location, "count": len(rows)}
+    return ShardedIndex(registry)
+
+
+def test_query_merges_shards_into_global_top_k(tmp_path):
+    index = _sharded_index(tmp_path, {
+        "a": [("a1", [1, 0, 0]), ("a2", [0, 1, 0])],
+        "b": [("b1", [0.9, 0.1, 0]), ("b2", [0, 0, 1])]
+    })
+
+    results = index.query([[1, 0, 0], [0, 0, 1]], n_results=2)
+
+    assert results["ids"][0] == ["a1", "b1"]
+    assert results["ids"][1][0] == "b2"
+    assert results["distances"][0] == sorted(results["distances"][0])
+    assert results["metadatas"][0][1] == {"spec_abbr": "b"}
+
+
+def test_query_limits_n_results_to_shard_sizes(tmp_path):
+    index = _sharded_index(tmp_path, {"a": [("a1", [1, 0])], "b": [("b1", [0, 1])]})
+
+    results = index.query([[1, 0]], n_results=5)
+
+    assert results["ids"] == [["a1", "b1"]]
+
+
+def test_get_pages_across_shard_boundaries(tmp_path):
+    index = _sharded_index(tmp_path, {
+        "a": [("a1", [1, 0]), ("a2", [0, 1])],
+        "b": [("b1", [1, 0]), ("b2", [0, 1]), ("b3", [1, 1])]
+    })
+
+    pages = [index.get(limit=2, offset=offset)["ids"] for offset in range(0, index.count(), 2)]
+
+    assert index.count() == 5
+    assert pages == [["a1", "a2"], ["b1", "b2"], ["b3"]]
+    assert index.get(limit=2, offset=1)["documents"] == ["doc-a2", "doc-b1"]
+
+
+def test_query_only_searches_selected_shards(tmp_path):
+    index = _sharded_index(tmp_path, {
+        "a": [("a1", [1, 0])], "b": [("b1", [0.9, 0.1])], "c": [("c1", [0, 1])]
+    })
+    queried = []
+    for abbr, shard in index.shards.items():
+        original = shard.query
+        shard.query = lambda *args, _abbr=abbr, _original=original, **kwargs: queried.append(_abbr) or _original(*args, **kwargs)
+
+    results = index.query([[1, 0]], n_results=2, spec_abbrs=["a", "c"])
+
+    assert sorted(queried) == ["a", "c"]
+    assert results["ids"] == [["a1", "c1"]]
+
+
+def test_routed_vector_search_skips_unrouted_shards(tmp_path, monkeypatch):
+    import rag.routing
+    from rag.index_manager import IndexHandle
+    from rag.retriever import vector_search_multi
+
+    monkeypatch.setattr(rag.routing, "ROUTING_TOP_SPECS", 1)
+    index = _sharded_index(tmp_path, {
+        "a": [("a1", [1, 0, 0]), ("a2", [0.9, 0.1, 0])],
+        "b": [("b1", [0, 1, 0])],
+        "c": [("c1", [0, 0, 1])]
+    })
+    queried = []
+    for abbr, shard in index.shards.items():
+        original = shard.query
+        shard.query = lambda *args, _abbr=abbr, _original=original, **kwargs: queried.append(_abbr) or _original(*args, **kwargs)
+    handle = IndexHandle("test", index)
+    handle.embedding_matrix.get()
+    handle.router.get()
+    queried.clear()
+
+    trace = {}
+    candidates = vector_search_multi([[1, 0, 0]], n_results=2, handle=handle, routing=True, trace=trace)[0]
+
+    assert queried == ["a"]
+    assert trace["routed_specs"] == ["a"]
+    assert [c["chunk_id"] for c in candidates] == ["a1", "a2"]
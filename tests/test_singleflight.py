@@ -0,0 +1,70 @@
+import threading
+import time
+import pytest
+from rag.singleflight import SingleFlight, WaitTimeout
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        return "answer"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", compute)))
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=lambda: results.append(flight.do("k", compute))) for _ in range(4)]
+    for t in followers:
+        t.start()
+    for t in [leader] + followers:
+        t.join()
+
+    assert calls == [1]
+    assert results == ["answer"] * 5
+    assert flight.in_flight() == 0
+
+
+def test_error_is_shared_and_key_released():
+    flight = SingleFlight()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        flight.do("k", fail)
+    # 失败后key立即释放，下一次调用重新计算
+    assert flight.do("k", lambda: 42) == 42
+
+
+def test_different_keys_run_independently():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+
+
+def test_follower_gives_up_after_wait_timeout():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def compute():
+        started.set()
+        release.wait()
+        return "answer"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", compute)))
+    leader.start()
+    started.wait()
+    with pytest.raises(WaitTimeout):
+        flight.do("k", compute, wait_timeout=0.05)
+
+    release.set()
+    leader.join()
+    assert results == ["answer"]
+    assert flight.in_flight() == 0
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from vector_store.snapshot import SnapshotError, SnapshotIndex, export_collection, read_manifest, verify_snapshot, write_snapshot
+
+
+def _write(path, ids):
+    embeddings = np.eye(len(ids), 4, dtype=np.float32)
+    return write_snapshot(str(path), ids, embeddings, [f"doc-{i}" for i in ids], [{"spec_abbr": "GB"} for _ in ids])
+
+
+def test_overwrite_keeps_loaded_index_readable(tmp_path):
+    path = tmp_path / "snapshot"
+    _write(path, ["a", "b"])
+    old = SnapshotIndex(str(path))
+
+    _write(path, ["c", "d", "e"])
+    # 已加载的索引继续读取旧快照，新加载的索引读到新快照
+    assert old.get()["ids"] == ["a", "b"]
+    assert old.query([[1, 0, 0, 0]], n_results=1)["ids"] == [["a"]]
+    new = SnapshotIndex(str(path))
+    assert new.get()["ids"] == ["c", "d", "e"]
+    assert read_manifest(str(path))["count"] == 3
+
+
+def test_verify_detects_corrupted_file(tmp_path):
+    path = tmp_path / "snapshot"
+    _write(path, ["a", "b"])
+    verify_snapshot(str(path))
+    (path / "documents.json").write_text('["x","y"]', encoding="utf-8")
+    with pytest.raises(SnapshotError, match="校验失败"):
+        SnapshotIndex(str(path), verify=True)
+
+
+def test_empty_snapshot_loads_and_returns_empty_results(tmp_path):
+    path = tmp_path / "snapshot"
+    manifest = write_snapshot(str(path), [], np.zeros((0, 4), dtype=np.float32), [], [])
+    assert manifest["count"] == 0 and manifest["dimension"] == 4
+
+    index = SnapshotIndex(str(path), verify=True)
+    assert index.count() == 0
+    assert index.query([[1, 0, 0, 0], [0, 1, 0, 0]], n_results=3) == {
+        "ids": [[], []], "documents": [[], []], "metadatas": [[], []], "distances": [[], []]
+    }
+    assert index.get()["ids"] == []
+
+    # 没有向量可推断维度时维度记为0
+    assert write_snapshot(str(tmp_path / "empty"), [], [], [], [])["dimension"] == 0
+
+
+def test_export_collection_copies_all_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr("vector_store.versions.COPY_PAGE_SIZE", 2)
+    _write(tmp_path / "source", ["a", "b", "c"])
+    source = SnapshotIndex(str(tmp_path / "source"))
+    source.name = "source"
+
+    manifest = export_collection(source, str(tmp_path / "exported"))
+
+    exported = SnapshotIndex(str(tmp_path / "exported"))
+    assert manifest["source"] == "source"
+    assert exported.get()["ids"] == ["a", "b", "c"]
+    assert exported.get()["documents"] == source.get()["documents"]
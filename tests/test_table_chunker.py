@@ -0,0 +1,67 @@
+from data_pipeline.table_chunker import parse_table, reassemble_table, table_to_row_chunks
+from rag.tables import expand_tables
+
+TABLE = """===== 表格：表5.1.2 民用建筑的耐火等级 =====
+构件名称 | 耐火等级 | 耐火等级
+--- | --- | ---
+构件名称 | 一级 | 二级
+防火墙 | 3.00 | 3.00
+承重墙 | 3.00 | 2.50
+楼梯间的墙 | 2.00 | 2.00
+柱 | 3.00 | 2.50
+"""
+
+
+def test_parse_table_merges_multi_level_header():
+    table = parse_table(TABLE)
+
+    assert table["table_num"] == "5.1.2"
+    assert table["title"] == "民用建筑的耐火等级"
+    assert table["columns"] == ["构件名称", "耐火等级/一级", "耐火等级/二级"]
+    assert len(table["rows"]) == 4
+
+
+def test_row_chunks_repeat_heading_and_record_row_range():
+    chunks = table_to_row_chunks(TABLE, max_length=1000, max_rows=3)
+
+    assert [(c["row_start"], c["row_end"]) for c in chunks] == [(1, 3), (4, 4)]
+    for chunk in chunks:
+        assert chunk["content"].startswith("表5.1.2 民用建筑的耐火等级\n构件名称 | 耐火等级/一级 | 耐火等级/二级")
+    assert chunks[1]["content"].endswith("柱 | 3.00 | 2.50")
+
+
+def test_row_chunks_split_on_max_length_without_truncating_rows():
+    chunks = table_to_row_chunks(TABLE, max_length=60, max_rows=10)
+
+    assert all(c["row_start"] == c["row_end"] for c in chunks)
+    assert len(chunks) == 4
+
+
+def test_non_table_content_is_not_row_chunked():
+    assert table_to_row_chunks("5.1.2 普通条文内容。") is None
+
+
+def test_reassemble_restores_all_rows_in_order():
+    chunks = table_to_row_chunks(TABLE, max_length=1000, max_rows=2)
+
+    table = reassemble_table(list(reversed(chunks)))
+
+    lines = table.split("\n")
+    assert lines[2] == "--- | --- | ---"
+    assert [line.split(" | ")[0] for line in lines[3:]] == ["防火墙", "承重墙", "楼梯间的墙", "柱"]
+
+
+def test_expand_tables_keeps_one_full_table_per_hit():
+    chunks = table_to_row_chunks(TABLE, max_length=1000, max_rows=2)
+    table_rows = {("gb", "表5.1.2"): [{"content": c["content"], "row_start": c["row_start"]} for c in chunks]}
+    docs = [
+        {"spec_abbr": "gb", "article_id": "表5.1.2", "similarity": 0.6, "content": chunks[1]["content"]},
+        {"spec_abbr": "gb", "article_id": "5.1.1", "similarity": 0.55, "content": "条文"},
+        {"spec_abbr": "gb", "article_id": "表5.1.2", "similarity": 0.8, "content": chunks[0]["content"]}
+    ]
+
+    expanded = expand_tables(docs, table_rows)
+
+    assert [d["article_id"] for d in expanded] == ["表5.1.2", "5.1.1"]
+    assert expanded[0]["similarity"] == 0.8
+    assert expanded[0]["content"] == reassemble_table(table_rows[("gb", "表5.1.2")])
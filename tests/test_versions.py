@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from rag.index_manager import IndexManager
+from vector_store import versions
+from vector_store.versions import list_versions, prune_versions, publish_version, read_active_pointer, version_sort_key
+
+
+@pytest.fixture
+def versions_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(versions, "INDEX_VERSIONS_PATH", str(tmp_path / "versions"))
+    monkeypatch.setattr(versions, "ACTIVE_INDEX_POINTER", str(tmp_path / "ACTIVE.json"))
+    monkeypatch.setattr("vector_store.index.INDEX_SHARDED", False)
+    return tmp_path / "versions"
+
+
+def _publish(ids, activate_now=True):
+    embeddings = np.eye(len(ids), 4, dtype=np.float32)
+    return publish_version(ids, embeddings, [f"doc-{i}" for i in ids], [{"spec_abbr": "gb"} for _ in ids],
+                           backend="snapshot", activate_now=activate_now)
+
+
+def test_same_second_versions_sort_numerically():
+    names = ["v20260101000000_10", "v20260101000000_2", "v20260101000000", "v20251231235959_3"]
+
+    assert sorted(names, key=version_sort_key) == [
+        "v20251231235959_3", "v20260101000000", "v20260101000000_2", "v20260101000000_10"
+    ]
+
+
+def test_list_versions_orders_suffix_ten_after_two(versions_dir):
+    for name in ["v20260101000000", "v20260101000000_2", "v20260101000000_10"]:
+        (versions_dir / name).mkdir(parents=True)
+
+    assert list_versions() == ["v20260101000000", "v20260101000000_2", "v20260101000000_10"]
+
+
+def test_prune_keeps_active_and_previously_active_versions(versions_dir):
+    first = _publish(["a"])
+    second = _publish(["b"])
+    extra = [_publish([f"c{i}"], activate_now=False) for i in range(2)]
+
+    assert read_active_pointer()["previous"] == first
+    removed = prune_versions(keep=1)
+
+    assert removed == [extra[0]]
+    assert list_versions() == [first, second, extra[1]]
+
+
+def test_hot_swap_replaces_current_while_old_handle_stays_readable(versions_dir):
+    _publish(["a", "b"])
+    manager = IndexManager()
+    old = manager.current()
+    assert manager.check_for_update() is False
+
+    new_version = _publish(["c", "d", "e"])
+    swaps = []
+    manager.add_swap_listener(lambda old_version, version: swaps.append((old_version, version)))
+
+    assert manager.check_for_update() is True
+    assert manager.current().version == new_version
+    assert manager.current().index.count() == 3
+    assert swaps == [(old.version, new_version)]
+    # 切换前取得handle的请求继续读取旧版本
+    assert old.index.get()["ids"] == ["a", "b"]
+    assert old.index.query([[1, 0, 0, 0]], n_results=1)["ids"] == [["a"]]
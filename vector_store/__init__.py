@@ -0,0 +1,4 @@
+# vector_store/__init__.py
+"""
+Vector Store 模块：向量库构建。
+"""
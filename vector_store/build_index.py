@@ -0,0 +1,99 @@
+import json
+import logging
+import os
+import sys
+
+# 支持直接以脚本方式运行（python vector_store/build_index.py）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tqdm import tqdm
+from config import (
+    CHUNKS_OUTPUT_JSON,
+    CHUNKS_CLEANED_JSON,
+    BATCH_SIZE,
+    VECTOR_DB_LOG_PATH,
+    FAILED_CHUNKS_PATH
+)
+from rag.embedding import get_embeddings
+from vector_store.index import open_chroma_collection
+
+# 日志
+logger = logging.getLogger(__name__)
+
+# chunk中写入向量库metadata的字段
+METADATA_FIELDS = ["chunk_id", "article_id", "type", "chapter", "spec_name", "spec_abbr", "related_to", "row_start", "row_end"]
+
+def load_chunks(chunks_path=None, cleaned_path=None):
+    """
+    读取chunk列表：元数据取自chunks.json，正文优先使用chunks_cleaned.json中清理异常字符后的内容
+    """
+    if chunks_path is None:
+        chunks_path = CHUNKS_OUTPUT_JSON
+    if cleaned_path is None:
+        cleaned_path = CHUNKS_CLEANED_JSON
+
+    with open(chunks_path, 'r', encoding='utf-8') as f:
+        chunks = json.load(f)
+
+    if os.path.exists(cleaned_path):
+        with open(cleaned_path, 'r', encoding='utf-8') as f:
+            cleaned_content = {c["chunk_id"]: c["content"] for c in json.load(f)}
+        for chunk in chunks:
+            chunk["content"] = cleaned_content.get(chunk["chunk_id"], chunk["content"])
+    else:
+        logger.warning(f"未找到清洗后的chunk文件 {cleaned_path}，使用原始内容")
+
+    return chunks
+
+def chunk_metadata(chunk):
+    """提取写入向量库的metadata（Chroma不接受None值，缺失字段直接省略）"""
+    return {k: chunk[k] for k in METADATA_FIELDS if chunk.get(k) is not None}
+
+def build_index(chunks=None, batch_size=None):
+    """
+    批量生成向量并写入Chroma：每批BATCH_SIZE个chunk，embedding按EMBEDDING_BATCH_SIZE分批调用
+    生成失败的chunk写入FAILED_CHUNKS_PATH，便于单独重跑
+    """
+    if chunks is None:
+        chunks = load_chunks()
+    if batch_size is None:
+        batch_size = BATCH_SIZE
+
+    collection = open_chroma_collection()
+
+    failed_chunks = []
+    for start in tqdm(range(0, len(chunks), batch_size), desc="构建向量库"):
+        batch = chunks[start:start + batch_size]
+        try:
+            embeddings = get_embeddings([c["content"] for c in batch])
+        except Exception as e:
+            logger.error(f"第{start}~{start + len(batch)}个chunk生成向量失败：{e}")
+            failed_chunks.extend(batch)
+            continue
+
+        valid = [(c, emb) for c, emb in zip(batch, embeddings) if emb]
+        failed_chunks.extend(c for c, emb in zip(batch, embeddings) if not emb)
+        if not valid:
+            continue
+
+        collection.upsert(
+            ids=[c["chunk_id"] for c, _ in valid],
+            embeddings=[emb for _, emb in valid],
+            documents=[c["content"] for c, _ in valid],
+            metadatas=[chunk_metadata(c) for c, _ in valid]
+        )
+
+    with open(FAILED_CHUNKS_PATH, 'w', encoding='utf-8') as f:
+        json.dump(failed_chunks, f, ensure_ascii=False, indent=4)
+
+    logger.info(f"向量库构建完成：成功{len(chunks) - len(failed_chunks)}个，失败{len(failed_chunks)}个")
+    print(f"向量库构建完成！共{collection.count()}条，失败{len(failed_chunks)}个（详见 {FAILED_CHUNKS_PATH}）")
+    return collection
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        filename=VECTOR_DB_LOG_PATH,
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    build_index()
@@ -0,0 +1,77 @@
+from config import (
+    CHROMA_DB_PATH,
+    CHROMA_COLLECTION_NAME,
+    CHROMA_COLLECTION_METADATA,
+    INDEX_BACKEND,
+    INDEX_SHARDED,
+    SNAPSHOT_PATH
+)
+
+# 未发布过版本时使用的版本名（沿用CHROMA_COLLECTION_NAME集合或SNAPSHOT_PATH快照）
+DEFAULT_VERSION = "default"
+
+def _chroma_client():
+    import chromadb
+    return chromadb.PersistentClient(path=CHROMA_DB_PATH)
+
+def open_chroma_collection(name=None, create=True):
+    """打开Chroma集合（create为True时不存在则创建）"""
+    client = _chroma_client()
+    if not create:
+        return client.get_collection(name=name or CHROMA_COLLECTION_NAME, embedding_function=None)
+    return client.get_or_create_collection(
+        name=name or CHROMA_COLLECTION_NAME,
+        embedding_function=None,
+        metadata=CHROMA_COLLECTION_METADATA
+    )
+
+def delete_chroma_collection(name):
+    """删除Chroma集合（不存在时忽略）"""
+    from chromadb.errors import NotFoundError
+    try:
+        _chroma_client().delete_collection(name=name)
+    except NotFoundError:
+        pass
+
+def open_index(backend=None):
+    """
+    按后端打开检索索引（均提供query/get/count接口）：
+    - chroma：Chroma持久化目录（CHROMA_DB_PATH）
+    - snapshot：mmap只读快照（SNAPSHOT_PATH），新副本冷启动只需加载快照
+    """
+    if backend is None:
+        backend = INDEX_BACKEND
+
+    if backend == "chroma":
+        return open_chroma_collection()
+    if backend == "snapshot":
+        from .snapshot import SnapshotIndex
+        return SnapshotIndex(SNAPSHOT_PATH)
+    raise ValueError(f"不支持的索引后端：{backend}（可选chroma/snapshot）")
+
+def active_version():
+    """当前生效的索引版本号（分片模式下由分片登记表生成；未发布过版本时为DEFAULT_VERSION）"""
+    if INDEX_SHARDED:
+        from .shards import read_shard_registry, registry_version
+        return registry_version(read_shard_registry())
+
+    from .versions import read_active_pointer
+    pointer = read_active_pointer()
+    return pointer["version"] if pointer else DEFAULT_VERSION
+
+def open_active_index(previous=None):
+    """
+    打开当前生效版本的索引，返回（版本号, 索引）
+    - 分片模式（INDEX_SHARDED）：打开登记的全部分片，previous中未变化的分片直接复用
+    - 已发布过版本时按版本指针打开；否则回退到INDEX_BACKEND对应的默认索引
+    """
+    if INDEX_SHARDED:
+        from .shards import open_sharded_index
+        return open_sharded_index(previous)
+
+    from .versions import read_active_pointer, open_version
+
+    pointer = read_active_pointer()
+    if pointer is None:
+        return DEFAULT_VERSION, open_index()
+    return pointer["version"], open_version(pointer["backend"], pointer["version"])
@@ -0,0 +1,238 @@
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from config import (
+    PROCESSED_SPECS_DIR,
+    SPEC_FILES,
+    INGEST_MAX_WORKERS,
+    INGEST_MAX_JOBS_KEPT,
+    EMBEDDING_BATCH_SIZE,
+    INDEX_BACKEND,
+    INDEX_SHARDED
+)
+from data_pipeline.clean_text import clean_spec_text
+from data_pipeline.chunker import (
+    parse_construction_code,
+    articles_to_chunks,
+    load_ingested_specs,
+    register_ingested_spec
+)
+from data_pipeline.metadata_builder import sanitize_content
+from rag.embedding import get_embeddings
+from rag.tracing import stage_timer
+from .build_index import chunk_metadata
+from .index import open_index
+from .shards import publish_shard
+from .versions import open_version, publish_version, read_active_pointer, read_all
+
+# 日志
+logger = logging.getLogger(__name__)
+
+# 入库流水线各阶段（按执行顺序）
+INGEST_STAGES = ["clean", "chunk", "sanitize", "embed", "upsert"]
+
+# 规范缩写用作chunk_id前缀，规范名用作文件名
+SPEC_ABBR_PATTERN = re.compile(r'^[a-z0-9_]+$')
+INVALID_FILENAME_PATTERN = re.compile(r'[\\/:*?"<>|]')
+
+# 读取生效版本 + 发布新版本需串行，避免并发任务发布的版本互相遗漏
+_publish_lock = threading.Lock()
+
+
+def _check_collision(spec_name, spec_abbr):
+    """
+    内置规范（SPEC_FILES）的名称和缩写不可通过接口覆盖；
+    已上传的规范只能以相同的（名称, 缩写）重新上传，不能与其他规范交叉使用名称或缩写
+    """
+    for name, (_, abbr) in SPEC_FILES.items():
+        if name == spec_name or abbr == spec_abbr:
+            raise ValueError(f"规范名称或缩写与内置规范冲突：{name}（{abbr}）")
+    for name, (_, abbr) in load_ingested_specs().items():
+        if (name == spec_name) != (abbr == spec_abbr):
+            raise ValueError(f"规范名称或缩写与已上传的规范冲突：{name}（{abbr}）")
+
+
+class IngestJobManager:
+    """
+    规范入库后台任务：clean → chunk → sanitize → embed → upsert
+    任务在有界线程池中执行，不占用请求处理线程；upsert阶段基于生效版本发布新的不可变索引版本，
+    各worker通过版本指针热切换，查询服务不受影响
+    """
+    def __init__(self, max_workers=None):
+        if max_workers is None:
+            max_workers = INGEST_MAX_WORKERS
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, spec_name, spec_abbr, raw_content, chapter_titles=None):
+        """提交入库任务，立即返回任务状态"""
+        if not SPEC_ABBR_PATTERN.match(spec_abbr or ""):
+            raise ValueError(f"规范缩写只能包含小写字母、数字和下划线：{spec_abbr}")
+        if not spec_name or INVALID_FILENAME_PATTERN.search(spec_name):
+            raise ValueError(f"规范名称为空或包含非法字符：{spec_name}")
+        if not raw_content or not raw_content.strip():
+            raise ValueError("规范内容不能为空")
+        _check_collision(spec_name, spec_abbr)
+
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "spec_name": spec_name,
+            "spec_abbr": spec_abbr,
+            "status": "queued",
+            "stage": None,
+            "stages": {stage: "pending" for stage in INGEST_STAGES},
+            "timings": {},
+            "progress": {"embedded": 0, "total": 0},
+            "chunk_count": 0,
+            "index_version": None,
+            "error": None,
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "finished_at": None
+        }
+        with self._lock:
+            self._jobs[job["job_id"]] = job
+            self._evict_finished()
+        self._executor.submit(self._run, job, raw_content, chapter_titles or {})
+        return self.status(job["job_id"])
+
+    def status(self, job_id):
+        """任务状态快照（None表示任务不存在）"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {
+                **job,
+                "stages": dict(job["stages"]),
+                "timings": dict(job["timings"]),
+                "progress": dict(job["progress"])
+            }
+
+    def list_jobs(self):
+        with self._lock:
+            job_ids = list(self._jobs)
+        return [self.status(job_id) for job_id in job_ids]
+
+    def _evict_finished(self):
+        """只保留最近INGEST_MAX_JOBS_KEPT个任务记录（优先淘汰已结束的任务）"""
+        finished = [jid for jid, job in self._jobs.items() if job["status"] in ("succeeded", "failed")]
+        while len(self._jobs) > INGEST_MAX_JOBS_KEPT and finished:
+            del self._jobs[finished.pop(0)]
+
+    def _update(self, job, **fields):
+        with self._lock:
+            job.update(fields)
+
+    def _run_stage(self, job, stage, func, *args):
+        self._update(job, stage=stage)
+        with self._lock:
+            job["stages"][stage] = "running"
+        with stage_timer(job, stage):
+            result = func(*args)
+        with self._lock:
+            job["stages"][stage] = "done"
+        return result
+
+    def _run(self, job, raw_content, chapter_titles):
+        self._update(job, status="running")
+        tmp_path = None
+        try:
+            tmp_path = self._run_stage(job, "clean", self._clean, job, raw_content, chapter_titles)
+            chunks = self._run_stage(job, "chunk", self._chunk, job, tmp_path)
+            chunks = self._run_stage(job, "sanitize", self._sanitize, chunks)
+            embeddings = self._run_stage(job, "embed", self._embed, job, chunks)
+            version = self._run_stage(job, "upsert", self._upsert, job, chunks, embeddings)
+            # 发布成功后才替换正式的清洗文本并登记，失败的任务不影响已有的规范文件和登记表
+            file_path = os.path.join(PROCESSED_SPECS_DIR, f"{job['spec_name']}.txt")
+            os.replace(tmp_path, file_path)
+            tmp_path = None
+            register_ingested_spec(job["spec_name"], file_path, job["spec_abbr"])
+            self._update(job, status="succeeded", stage=None, index_version=version)
+            logger.info(f"规范入库完成：{job['spec_name']}（{len(chunks)}个chunk，版本{version}）")
+        except Exception as e:
+            with self._lock:
+                if job["stage"]:
+                    job["stages"][job["stage"]] = "failed"
+            self._update(job, status="failed", error=f"{type(e).__name__}: {e}")
+            logger.error(f"规范入库失败：{job['spec_name']}\n{traceback.format_exc()}")
+        finally:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            self._update(job, finished_at=time.strftime("%Y-%m-%d %H:%M:%S"))
+
+    def _clean(self, job, raw_content, chapter_titles):
+        """清洗原始文本并写入processed目录下该任务的临时文件（发布成功后才改名为正式文件）"""
+        final_text = clean_spec_text(raw_content.replace("\r\n", "\n"), chapter_titles)
+        os.makedirs(PROCESSED_SPECS_DIR, exist_ok=True)
+        tmp_path = os.path.join(PROCESSED_SPECS_DIR, f"{job['spec_name']}.{job['job_id']}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(final_text)
+        return tmp_path
+
+    def _chunk(self, job, file_path):
+        articles_list = parse_construction_code(file_path)
+        chunks = articles_to_chunks(articles_list, job["spec_name"], job["spec_abbr"])
+        if not chunks:
+            raise ValueError("未解析出任何条文，请检查规范文本格式（条文需以x.x.x编号开头）")
+        self._update(job, chunk_count=len(chunks))
+        return chunks
+
+    def _sanitize(self, chunks):
+        for chunk in chunks:
+            chunk["content"], _ = sanitize_content(chunk["content"])
+        return [c for c in chunks if c["content"].strip()]
+
+    def _embed(self, job, chunks):
+        """按EMBEDDING_BATCH_SIZE分批生成向量，逐批更新进度"""
+        self._update(job, progress={"embedded": 0, "total": len(chunks)})
+        embeddings = []
+        for start in range(0, len(chunks), EMBEDDING_BATCH_SIZE):
+            batch = chunks[start:start + EMBEDDING_BATCH_SIZE]
+            batch_embeddings = get_embeddings([c["content"] for c in batch], cache=False)
+            if not all(batch_embeddings):
+                raise ValueError(f"第{start}~{start + len(batch)}个chunk中有向量生成失败")
+            embeddings.extend(batch_embeddings)
+            self._update(job, progress={"embedded": len(embeddings), "total": len(chunks)})
+        return embeddings
+
+    def _upsert(self, job, chunks, embeddings):
+        """
+        在当前生效版本的数据中替换该规范的全部chunk，然后发布为新索引版本并切换
+        分片模式下只重建该规范的分片，其余分片不受影响
+        """
+        if INDEX_SHARDED:
+            return publish_shard(
+                job["spec_abbr"],
+                [c["chunk_id"] for c in chunks],
+                embeddings,
+                [c["content"] for c in chunks],
+                [chunk_metadata(c) for c in chunks]
+            )
+
+        # 以当前生效版本为基础在内存中替换该规范的chunk后发布新版本，不修改任何正在服务的集合
+        # （未发布过版本时生效的是默认集合/快照，同样只读取）
+        with _publish_lock:
+            pointer = read_active_pointer()
+            backend = pointer["backend"] if pointer else INDEX_BACKEND
+            index = open_version(backend, pointer["version"]) if pointer else open_index(backend)
+            rows = [
+                row for row in zip(*read_all(index))
+                if (row[3] or {}).get("spec_abbr") != job["spec_abbr"]
+            ]
+            rows.extend(zip(
+                [c["chunk_id"] for c in chunks],
+                embeddings,
+                [c["content"] for c in chunks],
+                [chunk_metadata(c) for c in chunks]
+            ))
+            ids, all_embeddings, documents, metadatas = (list(column) for column in zip(*rows))
+            return publish_version(ids, all_embeddings, documents, metadatas, backend=backend)
+
+# 进程内唯一的入库任务管理器
+ingest_jobs = IngestJobManager()
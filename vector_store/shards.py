@@ -0,0 +1,286 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+# 支持直接以脚本方式运行（python vector_store/shards.py）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import (
+    CHROMA_COLLECTION_NAME,
+    SHARD_BACKEND,
+    SHARDS_PATH,
+    SHARD_QUERY_MAX_WORKERS,
+    BATCH_SIZE
+)
+
+# 日志
+logger = logging.getLogger(__name__)
+
+# 分片登记表：{spec_abbr: {"backend", "location", "count", "built_at", "previous"}}
+SHARD_REGISTRY_FILE = "shards.json"
+
+# 分页读取分片数据
+COPY_PAGE_SIZE = 1000
+
+# 同一进程内串行修改登记表
+_registry_lock = threading.Lock()
+
+# 查询时并行检索各分片（全进程共享，避免每次查询创建线程池）
+_query_executor = ThreadPoolExecutor(max_workers=SHARD_QUERY_MAX_WORKERS, thread_name_prefix="shard-query")
+
+
+def shard_registry_path():
+    return os.path.join(SHARDS_PATH, SHARD_REGISTRY_FILE)
+
+
+def read_shard_registry():
+    """读取分片登记表（尚未构建任何分片时返回空字典）"""
+    if not os.path.exists(shard_registry_path()):
+        return {}
+    with open(shard_registry_path(), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_shard_registry(registry):
+    """原子写入登记表：先写临时文件再os.replace，读取方只会看到完整的登记表"""
+    os.makedirs(SHARDS_PATH, exist_ok=True)
+    tmp_path = shard_registry_path() + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(registry, f, ensure_ascii=False, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, shard_registry_path())
+
+
+def registry_version(registry):
+    """由登记表内容生成的索引版本号：任一分片重建后版本号随之变化，worker据此热切换"""
+    digest = hashlib.sha1(json.dumps(registry, sort_keys=True).encode("utf-8")).hexdigest()
+    return f"shards-{digest[:12]}"
+
+
+def shard_collection_name(spec_abbr, stamp):
+    return f"{CHROMA_COLLECTION_NAME}__shard_{spec_abbr}_{stamp}"
+
+
+def open_shard(entry):
+    """按登记信息打开单个分片（只读使用）"""
+    if entry["backend"] == "snapshot":
+        from .snapshot import SnapshotIndex
+        return SnapshotIndex(entry["location"])
+    if entry["backend"] == "chroma":
+        from .index import open_chroma_collection
+        return open_chroma_collection(entry["location"], create=False)
+    raise ValueError(f"不支持的分片后端：{entry['backend']}（可选chroma/snapshot）")
+
+
+def _delete_shard_location(backend, location):
+    if backend == "snapshot":
+        shutil.rmtree(location, ignore_errors=True)
+    else:
+        from .index import delete_chroma_collection
+        delete_chroma_collection(location)
+
+
+def publish_shard(spec_abbr, ids, embeddings, documents, metadatas, backend=None):
+    """
+    将一个规范的全部数据写入新的分片位置，然后更新登记表（其余分片不受影响）
+    上一份分片数据保留到下次重建时再删除，正在使用旧分片的请求不受影响
+    Returns:
+        str: 更新后的索引版本号
+    """
+    if backend is None:
+        backend = SHARD_BACKEND
+    stamp = time.strftime("%Y%m%d%H%M%S")
+
+    if backend == "snapshot":
+        from .snapshot import write_snapshot
+        location = os.path.join(SHARDS_PATH, spec_abbr, stamp)
+        write_snapshot(location, ids, embeddings, documents, metadatas, source=spec_abbr)
+    elif backend == "chroma":
+        from .index import open_chroma_collection
+        location = shard_collection_name(spec_abbr, stamp)
+        collection = open_chroma_collection(location)
+        for start in range(0, len(ids), COPY_PAGE_SIZE):
+            end = start + COPY_PAGE_SIZE
+            collection.upsert(
+                ids=list(ids[start:end]),
+                embeddings=[list(map(float, e)) for e in embeddings[start:end]],
+                documents=list(documents[start:end]),
+                metadatas=list(metadatas[start:end])
+            )
+    else:
+        raise ValueError(f"不支持的分片后端：{backend}（可选chroma/snapshot）")
+
+    with _registry_lock:
+        registry = read_shard_registry()
+        old = registry.get(spec_abbr)
+        registry[spec_abbr] = {
+            "backend": backend,
+            "location": location,
+            "count": len(ids),
+            "built_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "previous": {"backend": old["backend"], "location": old["location"]} if old else None
+        }
+        _write_shard_registry(registry)
+
+    if old and old.get("previous") and old["previous"]["location"] != location:
+        _delete_shard_location(**old["previous"])
+    logger.info(f"分片已发布：{spec_abbr}（{backend}，{len(ids)}条）")
+    return registry_version(registry)
+
+
+class ShardedIndex:
+    """
+    按spec_abbr分片的检索索引，接口与Chroma集合的query/get/count保持一致，可直接替换collection
+    查询时各分片并行检索，再按距离合并出全局top-k；分片可单独重建，重新加载时未变化的分片直接复用
+    """
+    def __init__(self, registry, previous=None):
+        self.registry = registry
+        self.spec_abbrs = sorted(registry)
+
+        reusable = {}
+        if isinstance(previous, ShardedIndex):
+            reusable = {
+                abbr: previous.shards[abbr] for abbr in previous.spec_abbrs
+                if abbr in registry and previous.registry[abbr]["location"] == registry[abbr]["location"]
+            }
+        to_open = [abbr for abbr in self.spec_abbrs if abbr not in reusable]
+        opened = _query_executor.map(lambda abbr: open_shard(registry[abbr]), to_open)
+        self.shards = {**reusable, **dict(zip(to_open, opened))}
+        if to_open:
+            logger.info(f"已加载分片：{to_open}（复用{len(reusable)}个未变化的分片）")
+
+    def count(self):
+        return sum(self.registry[abbr]["count"] for abbr in self.spec_abbrs)
+
+    def _query_shard(self, abbr, query_embeddings, n_results, include):
+        n_results = min(n_results, self.registry[abbr]["count"])
+        if n_results <= 0:
+            return None
+        return self.shards[abbr].query(query_embeddings=query_embeddings, n_results=n_results, include=include)
+
+    def query(self, query_embeddings, n_results=10, include=None, spec_abbrs=None):
+        """
+        并行检索各分片（spec_abbrs指定时只检索这些分片，如质心路由选中的规范），
+        每个查询按距离合并出全局前n_results条，返回与Chroma相同结构的结果
+        """
+        if include is None:
+            include = ["documents", "metadatas", "distances"]
+        targets = [abbr for abbr in self.spec_abbrs if spec_abbrs is None or abbr in spec_abbrs]
+        shard_results = [
+            result for result in _query_executor.map(
+                lambda abbr: self._query_shard(abbr, query_embeddings, n_results, include), targets
+            )
+            if result is not None
+        ]
+
+        fields = ["ids"] + [field for field in ["documents", "metadatas", "distances"] if field in include]
+        merged = {field: [] for field in fields}
+        for i in range(len(query_embeddings)):
+            rows = []
+            for result in shard_results:
+                rows.extend(zip(*(result[field][i] for field in fields)))
+            if "distances" in fields:
+                rows.sort(key=lambda row: row[fields.index("distances")])
+            rows = rows[:n_results]
+            for position, field in enumerate(fields):
+                merged[field].append([row[position] for row in rows])
+        return merged
+
+    def get(self, include=None, limit=None, offset=0):
+        """按分片顺序（spec_abbr升序）拼接后分页读取（与Chroma的collection.get参数一致）"""
+        if include is None:
+            include = ["documents", "metadatas"]
+        end = self.count() if limit is None else min(self.count(), offset + limit)
+        page = {"ids": [], **{field: [] for field in include}}
+
+        shard_start = 0
+        for abbr in self.spec_abbrs:
+            shard_end = shard_start + self.registry[abbr]["count"]
+            if shard_end > offset and shard_start < end:
+                local_offset = max(offset - shard_start, 0)
+                local_limit = min(end, shard_end) - shard_start - local_offset
+                part = self.shards[abbr].get(include=include, limit=local_limit, offset=local_offset)
+                for field in page:
+                    page[field].extend(part[field])
+            shard_start = shard_end
+        return page
+
+
+def open_sharded_index(previous=None):
+    """打开当前登记的全部分片，返回（版本号, 分片索引）"""
+    registry = read_shard_registry()
+    if not registry:
+        raise FileNotFoundError(f"未找到任何分片，请先运行 python -m vector_store.shards build（{shard_registry_path()}）")
+    return registry_version(registry), ShardedIndex(registry, previous)
+
+
+def build_shards(chunks=None, spec_abbrs=None, backend=None, batch_size=None):
+    """
+    按spec_abbr分组生成向量并逐个发布分片（spec_abbrs指定时只重建这些规范的分片）
+    生成向量失败的chunk跳过并记录日志
+    """
+    from rag.embedding import get_embeddings
+    from .build_index import load_chunks, chunk_metadata
+
+    if chunks is None:
+        chunks = load_chunks()
+    if batch_size is None:
+        batch_size = BATCH_SIZE
+
+    groups = defaultdict(list)
+    for chunk in chunks:
+        if spec_abbrs is None or chunk["spec_abbr"] in spec_abbrs:
+            groups[chunk["spec_abbr"]].append(chunk)
+
+    version = None
+    for abbr, shard_chunks in sorted(groups.items()):
+        valid = []
+        for start in range(0, len(shard_chunks), batch_size):
+            batch = shard_chunks[start:start + batch_size]
+            embeddings = get_embeddings([c["content"] for c in batch])
+            valid.extend((c, emb) for c, emb in zip(batch, embeddings) if emb)
+        if len(valid) < len(shard_chunks):
+            logger.error(f"分片{abbr}中有{len(shard_chunks) - len(valid)}个chunk生成向量失败，已跳过")
+        version = publish_shard(
+            abbr,
+            [c["chunk_id"] for c, _ in valid],
+            [emb for _, emb in valid],
+            [c["content"] for c, _ in valid],
+            [chunk_metadata(c) for c, _ in valid],
+            backend=backend
+        )
+        print(f"分片 {abbr} 构建完成：{len(valid)}条")
+    return version
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按规范分片构建/查看向量索引")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="由chunk文件构建分片（默认重建全部规范）")
+    build.add_argument("--spec", action="append", dest="spec_abbrs", help="只重建指定规范（可重复）")
+    build.add_argument("--backend", default=SHARD_BACKEND, choices=["chroma", "snapshot"])
+    subparsers.add_parser("list", help="列出已构建的分片")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        version = build_shards(spec_abbrs=args.spec_abbrs, backend=args.backend)
+        print(f"分片索引版本：{version}")
+    else:
+        registry = read_shard_registry()
+        for abbr in sorted(registry):
+            entry = registry[abbr]
+            print(f"{abbr}\t{entry['backend']}\t{entry['count']}条\t{entry['built_at']}")
+        print(f"分片索引版本：{registry_version(registry)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+
+# 支持直接以脚本方式运行（python vector_store/snapshot.py）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from config import SNAPSHOT_PATH, SNAPSHOT_VERIFY_ON_LOAD
+from vector_store.versions import read_all
+
+# 日志
+logger = logging.getLogger(__name__)
+
+# 快照格式（不兼容变更时递增）
+SNAPSHOT_FORMAT = "building-code-rag-snapshot"
+SNAPSHOT_FORMAT_VERSION = 1
+
+# 快照目录中的文件
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.f32"  # 行优先float32矩阵（按行L2归一化），可直接mmap
+IDS_FILE = "ids.json"
+DOCUMENTS_FILE = "documents.json"
+METADATAS_FILE = "metadatas.json"  # 列式存储：{字段名: [每行的值或null]}
+
+# 导入快照时每批写入Chroma的条数
+EXPORT_PAGE_SIZE = 1000
+
+# 覆盖写入时快照目录短暂不存在（两次改名之间），加载方的重试次数与间隔（秒）
+SWAP_RETRY_TIMES = 20
+SWAP_RETRY_INTERVAL = 0.05
+
+
+class SnapshotError(Exception):
+    """快照格式不兼容或校验失败"""
+
+
+class SnapshotDir:
+    """
+    固定到某一份快照目录的只读句柄：先打开目录，之后经目录句柄打开其中的文件
+    即使快照目录随后被改名替换，同一个SnapshotDir读到的仍是同一份快照的全部文件
+    （不支持按目录句柄打开文件的平台退化为按路径读取）
+    """
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+        if os.open not in os.supports_dir_fd:
+            return
+        for attempt in range(SWAP_RETRY_TIMES):
+            try:
+                self.fd = os.open(path, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+                return
+            except FileNotFoundError:
+                if attempt == SWAP_RETRY_TIMES - 1:
+                    raise
+                time.sleep(SWAP_RETRY_INTERVAL)
+
+    def open(self, name, mode='r'):
+        if self.fd is None:
+            return open(os.path.join(self.path, name), mode, encoding=None if 'b' in mode else 'utf-8')
+        fd = os.open(name, os.O_RDONLY, dir_fd=self.fd)
+        return os.fdopen(fd, mode, encoding=None if 'b' in mode else 'utf-8')
+
+    def exists(self, name):
+        try:
+            with self.open(name, 'rb'):
+                return True
+        except FileNotFoundError:
+            return False
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def _sha256(f):
+    digest = hashlib.sha256()
+    for block in iter(lambda: f.read(1 << 20), b""):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+def _file_sha256(file_path):
+    with open(file_path, 'rb') as f:
+        return _sha256(f)
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def _to_columns(metadatas):
+    """行式metadata → 列式（缺失字段记为null）"""
+    fields = sorted({k for m in metadatas for k in m})
+    return {field: [m.get(field) for m in metadatas] for field in fields}
+
+
+def _to_rows(columns, count):
+    """列式metadata → 行式（丢弃null，与Chroma返回的metadata一致）"""
+    rows = [{} for _ in range(count)]
+    for field, values in columns.items():
+        for row, value in zip(rows, values):
+            if value is not None:
+                row[field] = value
+    return rows
+
+
+def write_snapshot(output_dir, ids, embeddings, documents, metadatas, source=None):
+    """
+    写入快照：先写入临时目录，校验和写入manifest后再整体改名，避免读到写了一半的快照
+    允许写入空快照（0条）：加载后count为0，查询返回空结果
+    覆盖已有快照时先将旧目录改名为<output_dir>.old（保留到下次覆盖），
+    已打开旧快照的进程继续使用旧文件，改名间隙中加载的进程短暂重试后读到新快照
+    Returns:
+        dict: manifest
+    """
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    if matrix.size == 0 and matrix.ndim != 2:
+        matrix = matrix.reshape(0, 0)
+    matrix = _normalize_rows(matrix)
+    if matrix.ndim != 2 or matrix.shape[0] != len(ids):
+        raise SnapshotError(f"向量矩阵形状{matrix.shape}与id数量{len(ids)}不一致")
+
+    tmp_dir = output_dir.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    matrix.tofile(os.path.join(tmp_dir, EMBEDDINGS_FILE))
+    for file_name, data in [
+        (IDS_FILE, list(ids)),
+        (DOCUMENTS_FILE, list(documents)),
+        (METADATAS_FILE, _to_columns(metadatas))
+    ]:
+        with open(os.path.join(tmp_dir, file_name), 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "snapshot_id": time.strftime("%Y%m%d%H%M%S"),
+        "source": source,
+        "count": int(matrix.shape[0]),
+        "dimension": int(matrix.shape[1]),
+        "dtype": "float32",
+        "normalized": True,
+        "files": {
+            name: {"bytes": os.path.getsize(os.path.join(tmp_dir, name)), "sha256": _file_sha256(os.path.join(tmp_dir, name))}
+            for name in [EMBEDDINGS_FILE, IDS_FILE, DOCUMENTS_FILE, METADATAS_FILE]
+        }
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=4)
+
+    old_dir = output_dir.rstrip(os.sep) + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(output_dir):
+        os.replace(output_dir, old_dir)
+    os.replace(tmp_dir, output_dir)
+    logger.info(f"快照已写入 {output_dir}：{manifest['count']}条，维度{manifest['dimension']}")
+    return manifest
+
+
+def read_manifest(snapshot_dir):
+    """snapshot_dir可为目录路径或SnapshotDir"""
+    pinned = snapshot_dir if isinstance(snapshot_dir, SnapshotDir) else SnapshotDir(snapshot_dir)
+    try:
+        with pinned.open(MANIFEST_FILE) as f:
+            manifest = json.load(f)
+    finally:
+        if pinned is not snapshot_dir:
+            pinned.close()
+    if manifest.get("format") != SNAPSHOT_FORMAT or manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise SnapshotError(
+            f"不支持的快照格式：{manifest.get('format')} v{manifest.get('format_version')}"
+            f"（当前支持 {SNAPSHOT_FORMAT} v{SNAPSHOT_FORMAT_VERSION}）"
+        )
+    return manifest
+
+
+def verify_snapshot(snapshot_dir, manifest=None):
+    """校验快照各文件的大小与sha256，不一致时抛出SnapshotError；snapshot_dir可为目录路径或SnapshotDir"""
+    pinned = snapshot_dir if isinstance(snapshot_dir, SnapshotDir) else SnapshotDir(snapshot_dir)
+    try:
+        if manifest is None:
+            manifest = read_manifest(pinned)
+        for name, expected in manifest["files"].items():
+            file_path = os.path.join(pinned.path, name)
+            if not pinned.exists(name):
+                raise SnapshotError(f"快照缺少文件：{file_path}")
+            with pinned.open(name, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size != expected["bytes"] or _sha256(f) != expected["sha256"]:
+                    raise SnapshotError(f"快照文件校验失败：{file_path}")
+    finally:
+        if pinned is not snapshot_dir:
+            pinned.close()
+    return manifest
+
+
+class SnapshotIndex:
+    """
+    基于mmap快照的只读检索索引，接口与Chroma集合的query/get/count保持一致，可直接替换collection
+    向量矩阵以只读mmap方式打开：同一主机上的多个uvicorn worker共享操作系统页缓存，不各自持有副本
+    """
+    def __init__(self, snapshot_dir, verify=None):
+        if verify is None:
+            verify = SNAPSHOT_VERIFY_ON_LOAD
+
+        self.path = snapshot_dir
+        # 全部文件经同一目录句柄读取，加载期间快照被覆盖也不会混读新旧两份文件
+        pinned = SnapshotDir(snapshot_dir)
+        try:
+            self.manifest = verify_snapshot(pinned) if verify else read_manifest(pinned)
+            count, dimension = self.manifest["count"], self.manifest["dimension"]
+
+            if count:
+                with pinned.open(EMBEDDINGS_FILE, 'rb') as f:
+                    self.embeddings = np.memmap(f, dtype=np.float32, mode="r", shape=(count, dimension))
+            else:
+                self.embeddings = np.zeros((0, dimension), dtype=np.float32)
+            with pinned.open(IDS_FILE) as f:
+                self.ids = json.load(f)
+            with pinned.open(DOCUMENTS_FILE) as f:
+                self.documents = json.load(f)
+            with pinned.open(METADATAS_FILE) as f:
+                self.metadatas = _to_rows(json.load(f), count)
+        finally:
+            pinned.close()
+
+    def count(self):
+        return len(self.ids)
+
+    def query(self, query_embeddings, n_results=10, include=None):
+        """暴力余弦检索（矩阵乘法），返回与Chroma相同结构的结果（distance = 1 - 余弦相似度）"""
+        n_results = min(n_results, self.count())
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        # 空快照或n_results为0时每个查询返回空列表
+        if not n_results:
+            return {field: [[] for _ in query_embeddings] for field in results}
+
+        queries = _normalize_rows(np.asarray(query_embeddings, dtype=np.float32))
+        similarities = queries @ self.embeddings.T
+        for row_sims in similarities:
+            top = np.argpartition(-row_sims, n_results - 1)[:n_results]
+            top = top[np.argsort(-row_sims[top])]
+            results["ids"].append([self.ids[i] for i in top])
+            results["documents"].append([self.documents[i] for i in top])
+            results["metadatas"].append([self.metadatas[i] for i in top])
+            results["distances"].append([float(1 - row_sims[i]) for i in top])
+        return results
+
+    def get(self, include=None, limit=None, offset=0):
+        """按行分页读取（与Chroma的collection.get参数一致）"""
+        end = self.count() if limit is None else min(self.count(), offset + limit)
+        return {
+            "ids": self.ids[offset:end],
+            "embeddings": self.embeddings[offset:end],
+            "documents": self.documents[offset:end],
+            "metadatas": self.metadatas[offset:end]
+        }
+
+
+def export_collection(collection, output_dir=None):
+    """将Chroma集合导出为快照"""
+    if output_dir is None:
+        output_dir = SNAPSHOT_PATH
+
+    return write_snapshot(output_dir, *read_all(collection), source=collection.name)
+
+
+def import_snapshot(collection, snapshot_dir=None, batch_size=None):
+    """将快照写入Chroma集合（无需重新调用embedding接口）"""
+    if snapshot_dir is None:
+        snapshot_dir = SNAPSHOT_PATH
+    if batch_size is None:
+        batch_size = EXPORT_PAGE_SIZE
+
+    index = SnapshotIndex(snapshot_dir, verify=True)
+    for start in range(0, index.count(), batch_size):
+        page = index.get(limit=batch_size, offset=start)
+        collection.upsert(
+            ids=page["ids"],
+            embeddings=np.asarray(page["embeddings"]).tolist(),
+            documents=page["documents"],
+            metadatas=page["metadatas"]
+        )
+    return index.manifest
+
+
+def main(argv=None):
+    from vector_store.index import open_chroma_collection
+
+    parser = argparse.ArgumentParser(description="向量库快照导出/导入/校验")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for command, help_text in [
+        ("export", "将Chroma集合导出为快照"),
+        ("import", "将快照导入Chroma集合"),
+        ("verify", "校验快照完整性")
+    ]:
+        sub = subparsers.add_parser(command, help=help_text)
+        sub.add_argument("--path", default=SNAPSHOT_PATH, help="快照目录")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.command == "export":
+        manifest = export_collection(open_chroma_collection(), args.path)
+    elif args.command == "import":
+        manifest = import_snapshot(open_chroma_collection(), args.path)
+    else:
+        manifest = verify_snapshot(args.path)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"{args.command}完成：{args.path}（{manifest['count']}条，维度{manifest['dimension']}，耗时{elapsed_ms:.0f} ms）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+
+# 支持直接以脚本方式运行（python vector_store/versions.py）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import (
+    CHROMA_COLLECTION_NAME,
+    INDEX_BACKEND,
+    INDEX_VERSIONS_PATH,
+    ACTIVE_INDEX_POINTER,
+    INDEX_KEEP_VERSIONS
+)
+
+# 日志
+logger = logging.getLogger(__name__)
+
+# 分页复制集合数据
+COPY_PAGE_SIZE = 1000
+
+
+def new_version_id():
+    """按时间生成版本号（同一秒内重复发布时追加序号）"""
+    base = time.strftime("v%Y%m%d%H%M%S")
+    version, seq = base, 1
+    while os.path.exists(os.path.join(INDEX_VERSIONS_PATH, version)):
+        seq += 1
+        version = f"{base}_{seq}"
+    return version
+
+
+def version_sort_key(version):
+    """版本的时间顺序：先按时间部分，再按序号数值比较（_10排在_2之后）"""
+    base, _, seq = version.partition("_")
+    return base, int(seq) if seq.isdigit() else 1
+
+
+def version_collection_name(version):
+    """Chroma后端中某个版本对应的集合名"""
+    return f"{CHROMA_COLLECTION_NAME}__{version}"
+
+
+def version_backend(version):
+    """由版本目录推断后端：快照版本目录中有manifest，Chroma版本目录仅为占位"""
+    manifest_path = os.path.join(INDEX_VERSIONS_PATH, version, "manifest.json")
+    return "snapshot" if os.path.exists(manifest_path) else "chroma"
+
+
+def read_active_pointer(pointer_path=None):
+    """读取当前生效的索引版本指针：{"backend": ..., "version": ...}；未发布过版本时返回None"""
+    if pointer_path is None:
+        pointer_path = ACTIVE_INDEX_POINTER
+    if not os.path.exists(pointer_path):
+        return None
+    with open(pointer_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def activate(backend, version, pointer_path=None):
+    """
+    原子切换生效版本：先写临时文件再os.replace，读取方只会看到切换前或切换后的完整指针
+    指针中同时记录上一个生效版本（previous），清理旧版本时保留，切换前取得handle的进行中请求仍可读取
+    """
+    if pointer_path is None:
+        pointer_path = ACTIVE_INDEX_POINTER
+
+    # 确认目标版本存在、可打开且（快照版本）文件校验通过，避免指针指向不存在或损坏的版本
+    open_version(backend, version, verify=True)
+
+    old = read_active_pointer(pointer_path)
+    previous = old["version"] if old and old["version"] != version else (old or {}).get("previous")
+    pointer = {
+        "backend": backend,
+        "version": version,
+        "previous": previous,
+        "activated_at": time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+    tmp_path = pointer_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(pointer, f, ensure_ascii=False, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, pointer_path)
+    logger.info(f"索引生效版本已切换为 {backend}:{version}")
+    return pointer
+
+
+def open_version(backend, version, verify=None):
+    """打开指定版本的索引（只读使用）；verify为快照版本是否校验sha256（默认使用配置）"""
+    if backend == "snapshot":
+        from .snapshot import SnapshotIndex
+        return SnapshotIndex(os.path.join(INDEX_VERSIONS_PATH, version), verify=verify)
+    if backend == "chroma":
+        from .index import open_chroma_collection
+        return open_chroma_collection(version_collection_name(version), create=False)
+    raise ValueError(f"不支持的索引后端：{backend}（可选chroma/snapshot）")
+
+
+def publish_version(ids, embeddings, documents, metadatas, backend=None, activate_now=True):
+    """
+    将一份完整数据发布为新的不可变版本（写入完成后才切换指针，读取方不会看到写了一半的索引）
+    Returns:
+        str: 新版本号
+    """
+    if backend is None:
+        backend = INDEX_BACKEND
+    version = new_version_id()
+
+    if backend == "snapshot":
+        from .snapshot import write_snapshot
+        os.makedirs(INDEX_VERSIONS_PATH, exist_ok=True)
+        write_snapshot(os.path.join(INDEX_VERSIONS_PATH, version), ids, embeddings, documents, metadatas)
+    elif backend == "chroma":
+        from .index import open_chroma_collection
+        # 占位目录用于版本号去重和版本列表
+        os.makedirs(os.path.join(INDEX_VERSIONS_PATH, version), exist_ok=True)
+        collection = open_chroma_collection(version_collection_name(version))
+        for start in range(0, len(ids), COPY_PAGE_SIZE):
+            end = start + COPY_PAGE_SIZE
+            collection.upsert(
+                ids=list(ids[start:end]),
+                embeddings=[list(map(float, e)) for e in embeddings[start:end]],
+                documents=list(documents[start:end]),
+                metadatas=list(metadatas[start:end])
+            )
+    else:
+        raise ValueError(f"不支持的索引后端：{backend}（可选chroma/snapshot）")
+
+    logger.info(f"已发布索引版本 {backend}:{version}（{len(ids)}条）")
+    if activate_now:
+        activate(backend, version)
+    return version
+
+
+def read_all(index, include=("embeddings", "documents", "metadatas")):
+    """
+    分页读取索引中的全部数据
+    Returns:
+        tuple: (ids, *include中各字段)，默认为(ids, embeddings, documents, metadatas)
+    """
+    columns = {field: [] for field in ["ids", *include]}
+    for offset in range(0, index.count(), COPY_PAGE_SIZE):
+        page = index.get(include=list(include), limit=COPY_PAGE_SIZE, offset=offset)
+        for field, values in columns.items():
+            values.extend(page[field])
+    return tuple(columns.values())
+
+
+def list_versions():
+    """列出已发布的版本（按时间升序）"""
+    if not os.path.exists(INDEX_VERSIONS_PATH):
+        return []
+    return sorted(
+        (name for name in os.listdir(INDEX_VERSIONS_PATH)
+         if os.path.isdir(os.path.join(INDEX_VERSIONS_PATH, name)) and not name.endswith((".tmp", ".old"))),
+        key=version_sort_key
+    )
+
+
+def prune_versions(keep=None):
+    """删除旧版本，保留最近keep个、当前生效版本及上一个生效版本（其他worker可能仍在使用）"""
+    if keep is None:
+        keep = INDEX_KEEP_VERSIONS
+    pointer = read_active_pointer()
+    protected = {pointer["version"], pointer.get("previous")} if pointer else set()
+
+    removed = []
+    for version in list_versions()[:-keep] if keep else list_versions():
+        if version in protected:
+            continue
+        version_dir = os.path.join(INDEX_VERSIONS_PATH, version)
+        if version_backend(version) == "chroma":
+            from .index import delete_chroma_collection
+            delete_chroma_collection(version_collection_name(version))
+        shutil.rmtree(version_dir, ignore_errors=True)
+        removed.append(version)
+    return removed
+
+
+def main(argv=None):
+    from vector_store.index import open_chroma_collection
+
+    parser = argparse.ArgumentParser(description="索引版本管理：发布/切换/列出/清理")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    publish = subparsers.add_parser("publish", help="将构建用的Chroma集合（build_index.py的输出）发布为新版本并切换")
+    publish.add_argument("--backend", default=INDEX_BACKEND, choices=["chroma", "snapshot"])
+    publish.add_argument("--no-activate", action="store_true", help="只发布不切换")
+    switch = subparsers.add_parser("activate", help="切换到指定版本（可用于回滚）")
+    switch.add_argument("version")
+    switch.add_argument("--backend", choices=["chroma", "snapshot"], help="默认由版本目录推断")
+    subparsers.add_parser("list", help="列出已发布版本")
+    prune = subparsers.add_parser("prune", help="清理旧版本")
+    prune.add_argument("--keep", type=int, default=INDEX_KEEP_VERSIONS)
+    args = parser.parse_args(argv)
+
+    if args.command == "publish":
+        version = publish_version(
+            *read_all(open_chroma_collection()), backend=args.backend, activate_now=not args.no_activate
+        )
+        print(f"已发布版本：{args.backend}:{version}")
+    elif args.command == "activate":
+        backend = args.backend or version_backend(args.version)
+        activate(backend, args.version)
+        print(f"已切换到版本：{backend}:{args.version}")
+    elif args.command == "list":
+        pointer = read_active_pointer()
+        active = pointer["version"] if pointer else None
+        for version in list_versions():
+            print(f"{'*' if version == active else ' '} {version}")
+    else:
+        print(f"已清理版本：{prune_versions(args.keep)}")
+
+
+if __name__ == "__main__":
+    main()